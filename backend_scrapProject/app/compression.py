@@ -0,0 +1,220 @@
+"""
+Response compression: gzip, or brotli when the `brotli` package is installed
+and the client accepts it.
+
+- CompressionMiddleware compresses responses of compressible types (JSON,
+  NDJSON, CSV, text) of at least COMPRESSION_MIN_SIZE bytes, streaming
+  responses (the /products/export) included.
+- Responses that already carry a Content-Encoding pass through untouched:
+  the response cache (app.services.response_cache) stores the compressed
+  bodies of its entries and serves them as is, so hot responses are
+  compressed once instead of on every request. Those are compressed at a
+  higher level (CACHED_*), since the cost is paid once.
+
+The bytes and CPU time spent are exported through /metrics
+(response_compression_*).
+"""
+import gzip
+import os
+import time
+import zlib
+from typing import Optional
+
+from .metrics import Counter, register
+
+try:
+    import brotli
+except ImportError: # Optional: gzip only
+    brotli = None
+
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))
+GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", "6"))
+BROTLI_QUALITY = int(os.getenv("BROTLI_QUALITY", "4"))
+CACHED_GZIP_LEVEL = int(os.getenv("CACHED_GZIP_LEVEL", "9"))
+CACHED_BROTLI_QUALITY = int(os.getenv("CACHED_BROTLI_QUALITY", "9"))
+
+COMPRESSIBLE_TYPES = ("application/json", "application/x-ndjson", "text/")
+
+input_bytes = register(Counter(
+    "response_compression_input_bytes_total",
+    "Response bytes before compression.",
+    ("encoding", "source"),
+))
+output_bytes = register(Counter(
+    "response_compression_output_bytes_total",
+    "Response bytes after compression.",
+    ("encoding", "source"),
+))
+cpu_seconds = register(Counter(
+    "response_compression_seconds_total",
+    "Time spent compressing responses.",
+    ("encoding", "source"),
+))
+
+
+def available_encodings():
+    return ("br", "gzip") if brotli is not None else ("gzip",)
+
+
+def choose_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    """
+    The encoding to use for an Accept-Encoding header: br if accepted and
+    available, else gzip, else None.
+    """
+    if not accept_encoding:
+        return None
+    accepted = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[name.strip().lower()] = quality
+    for encoding in available_encodings():
+        if accepted.get(encoding, accepted.get("*", 0.0)) > 0:
+            return encoding
+    return None
+
+
+def compress(body: bytes, encoding: str, cached: bool = False) -> bytes:
+    """
+    One-shot compression of a whole body. `cached` uses the higher levels
+    meant for bodies that are compressed once and served many times.
+    """
+    start = time.process_time()
+    if encoding == "br":
+        result = brotli.compress(body, quality=CACHED_BROTLI_QUALITY if cached else BROTLI_QUALITY)
+    else:
+        # mtime=0 so the same body always gives the same bytes
+        result = gzip.compress(body, compresslevel=CACHED_GZIP_LEVEL if cached else GZIP_LEVEL, mtime=0)
+    source = "cached" if cached else "dynamic"
+    cpu_seconds.inc(time.process_time() - start, encoding=encoding, source=source)
+    input_bytes.inc(len(body), encoding=encoding, source=source)
+    output_bytes.inc(len(result), encoding=encoding, source=source)
+    return result
+
+
+class _StreamCompressor:
+    def __init__(self, encoding: str):
+        self.encoding = encoding
+        if encoding == "br":
+            self._compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+        else:
+            self._compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def _run(self, fn, *args) -> bytes:
+        start = time.process_time()
+        result = fn(*args)
+        cpu_seconds.inc(time.process_time() - start, encoding=self.encoding, source="stream")
+        output_bytes.inc(len(result), encoding=self.encoding, source="stream")
+        return result
+
+    def compress(self, chunk: bytes) -> bytes:
+        input_bytes.inc(len(chunk), encoding=self.encoding, source="stream")
+        if self.encoding == "br":
+            # Flushed per chunk so every batch of the export reaches the client right away
+            return self._run(lambda data: self._compressor.process(data) + self._compressor.flush(), chunk)
+        return self._run(lambda data: self._compressor.compress(data) + self._compressor.flush(zlib.Z_SYNC_FLUSH), chunk)
+
+    def finish(self) -> bytes:
+        return self._run(self._compressor.finish if self.encoding == "br" else self._compressor.flush)
+
+
+def _is_compressible(headers) -> bool:
+    content_type = headers.get(b"content-type", b"").decode("latin-1")
+    return any(content_type.startswith(prefix) for prefix in COMPRESSIBLE_TYPES)
+
+
+class CompressionMiddleware:
+    """
+    ASGI middleware. Bodies under `minimum_size` are sent as is, since the
+    headers and CPU would cost more than the bytes saved.
+    """
+
+    def __init__(self, app, minimum_size: int = COMPRESSION_MIN_SIZE):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        request_headers = dict(scope["headers"])
+        encoding = choose_encoding(request_headers.get(b"accept-encoding", b"").decode("latin-1"))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start_message = None
+        stream: Optional[_StreamCompressor] = None
+        passthrough = False
+
+        async def send_compressed(message):
+            nonlocal start_message, stream, passthrough
+            if message["type"] == "http.response.start":
+                headers = dict(message.get("headers", []))
+                if b"content-encoding" in headers or not _is_compressible(headers):
+                    passthrough = True
+                    await send(message)
+                else:
+                    # Held back until the first body chunk tells whether it is worth it
+                    start_message = message
+                return
+            if passthrough or message["type"] != "http.response.body":
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            if start_message is not None:
+                start, start_message = start_message, None
+                if not more_body and len(body) < self.minimum_size:
+                    passthrough = True
+                    await send(start)
+                    await send(message)
+                    return
+                headers = [
+                    (name, value) for name, value in start.get("headers", [])
+                    if name.lower() not in (b"content-length", b"etag")
+                ]
+                headers += [(b"content-encoding", encoding.encode()), (b"vary", b"Accept-Encoding")]
+                etag = dict(start.get("headers", [])).get(b"etag")
+                if etag:
+                    headers.append((b"etag", encoded_etag(etag.decode("latin-1"), encoding).encode("latin-1")))
+                if not more_body:
+                    compressed = compress(body, encoding)
+                    headers.append((b"content-length", str(len(compressed)).encode()))
+                    await send({**start, "headers": headers})
+                    await send({"type": "http.response.body", "body": compressed})
+                    return
+                stream = _StreamCompressor(encoding)
+                await send({**start, "headers": headers})
+
+            chunk = stream.compress(body) if body else b""
+            if not more_body:
+                chunk += stream.finish()
+            await send({"type": "http.response.body", "body": chunk, "more_body": more_body})
+
+        await self.app(scope, receive, send_compressed)
+
+
+def encoded_etag(etag: str, encoding: str) -> str:
+    """
+    Each content coding is a different representation, so it gets its own
+    (strong) ETag: "abc" -> "abc-gzip".
+    """
+    if etag.endswith('"'):
+        return etag[:-1] + "-" + encoding + '"'
+    return etag
+
+
+def decoded_etag(etag: str) -> str:
+    for encoding in ("br", "gzip"):
+        suffix = "-" + encoding + '"'
+        if etag.endswith(suffix):
+            return etag[:-len(suffix)] + '"'
+    return etag
@@ -1,19 +1,192 @@
+import asyncio
 import os
-from motor.motor_asyncio import AsyncIOMotorClient
+import time
+from typing import Dict, Optional
+from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorCollection, AsyncIOMotorDatabase
+from pymongo import monitoring
 from dotenv import load_dotenv
 
+from .metrics import command_metrics, pool_checkout_wait
+
 load_dotenv()
 
 MONGO_URI = os.getenv("MONGO_URI", "mongodb://localhost:27017")
 MONGO_DATABASE = os.getenv("MONGO_DATABASE", "hardware_db")
 MONGO_COLLECTION = os.getenv("MONGO_COLLECTION", "products")
+MONGO_BEST_OFFERS_COLLECTION = os.getenv("MONGO_BEST_OFFERS_COLLECTION", "best_offers")
+MONGO_HISTORY_COLLECTION = os.getenv("MONGO_HISTORY_COLLECTION", "price_history")
+MONGO_WATCHLIST_COLLECTION = os.getenv("MONGO_WATCHLIST_COLLECTION", "watchlist_rules")
+MONGO_ALERTS_COLLECTION = os.getenv("MONGO_ALERTS_COLLECTION", "price_alerts")
+MONGO_LEASES_COLLECTION = os.getenv("MONGO_LEASES_COLLECTION", "leases")
+
+# Connection pool (per server). Connections are opened up to MONGO_MIN_POOL_SIZE at
+# startup; a request that finds all MONGO_MAX_POOL_SIZE in use waits at most
+# MONGO_WAIT_QUEUE_TIMEOUT_MS for one to be checked in and then fails.
+MONGO_MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", "100"))
+MONGO_MIN_POOL_SIZE = int(os.getenv("MONGO_MIN_POOL_SIZE", "10"))
+MONGO_MAX_IDLE_TIME_MS = int(os.getenv("MONGO_MAX_IDLE_TIME_MS", "300000"))
+MONGO_WAIT_QUEUE_TIMEOUT_MS = int(os.getenv("MONGO_WAIT_QUEUE_TIMEOUT_MS", "5000"))
+MONGO_CONNECT_TIMEOUT_MS = int(os.getenv("MONGO_CONNECT_TIMEOUT_MS", "5000"))
+MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", "5000"))
+
+
+class PoolStats(monitoring.ConnectionPoolListener):
+    """
+    Counts connection pool events, since pymongo does not expose the pool state.
+    """
+
+    def __init__(self):
+        self.open = 0
+        self.in_use = 0
+        self.checkouts = 0
+        self.checkout_wait_ms = 0.0
+        self.checkout_failures = 0
+
+    def snapshot(self) -> Dict:
+        return {
+            "open": self.open,
+            "in_use": self.in_use,
+            "available": max(self.open - self.in_use, 0),
+            "max_size": MONGO_MAX_POOL_SIZE,
+            "min_size": MONGO_MIN_POOL_SIZE,
+            "checkouts": self.checkouts,
+            "avg_checkout_wait_ms": self.checkout_wait_ms / self.checkouts if self.checkouts else 0.0,
+            "checkout_failures": self.checkout_failures,
+        }
+
+    def connection_created(self, event):
+        self.open += 1
+
+    def connection_closed(self, event):
+        self.open -= 1
+
+    def connection_checked_out(self, event):
+        self.in_use += 1
+        self.checkouts += 1
+        wait = getattr(event, "duration", 0.0)
+        self.checkout_wait_ms += wait * 1000
+        pool_checkout_wait.observe(wait)
+
+    def connection_checked_in(self, event):
+        self.in_use -= 1
+
+    def connection_check_out_failed(self, event):
+        self.checkout_failures += 1
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_check_out_started(self, event):
+        pass
+
+
+pool_stats = PoolStats()
+
+client: Optional[AsyncIOMotorClient] = None
+
+
+def connect() -> AsyncIOMotorClient:
+    """
+    Creates the client (no I/O yet). Called by the app lifespan; scripts and
+    anything else get one created on first use.
+    """
+    global client
+    if client is None:
+        client = AsyncIOMotorClient(
+            MONGO_URI,
+            maxPoolSize=MONGO_MAX_POOL_SIZE,
+            minPoolSize=MONGO_MIN_POOL_SIZE,
+            maxIdleTimeMS=MONGO_MAX_IDLE_TIME_MS,
+            waitQueueTimeoutMS=MONGO_WAIT_QUEUE_TIMEOUT_MS,
+            connectTimeoutMS=MONGO_CONNECT_TIMEOUT_MS,
+            serverSelectionTimeoutMS=MONGO_SERVER_SELECTION_TIMEOUT_MS,
+            event_listeners=[pool_stats, command_metrics],
+        )
+    return client
+
+
+def close():
+    global client
+    if client is not None:
+        client.close()
+        client = None
+
+
+async def ping() -> float:
+    """
+    Round trip to MongoDB in milliseconds.
+    """
+    start = time.perf_counter()
+    await connect().admin.command("ping")
+    return (time.perf_counter() - start) * 1000
+
+
+async def warm_up() -> float:
+    """
+    Checks the server answers and opens MONGO_MIN_POOL_SIZE connections right
+    away (concurrent pings each need their own), so the first requests of a
+    new worker do not pay for connecting. Returns the ping round trip.
+    """
+    rtt = await ping()
+    if MONGO_MIN_POOL_SIZE > 1:
+        await asyncio.gather(*(ping() for _ in range(MONGO_MIN_POOL_SIZE)))
+    return rtt
+
+
+def mongo_db() -> AsyncIOMotorDatabase:
+    return connect()[MONGO_DATABASE]
+
+
+def products_collection() -> AsyncIOMotorCollection:
+    return mongo_db()[MONGO_COLLECTION]
+
+
+def best_offers_collection() -> AsyncIOMotorCollection:
+    return mongo_db()[MONGO_BEST_OFFERS_COLLECTION]
+
+
+def history_collection() -> AsyncIOMotorCollection:
+    return mongo_db()[MONGO_HISTORY_COLLECTION]
+
+
+def watchlist_collection() -> AsyncIOMotorCollection:
+    return mongo_db()[MONGO_WATCHLIST_COLLECTION]
+
+
+def alerts_collection() -> AsyncIOMotorCollection:
+    return mongo_db()[MONGO_ALERTS_COLLECTION]
+
+
+def leases_collection() -> AsyncIOMotorCollection:
+    return mongo_db()[MONGO_LEASES_COLLECTION]
 
-client = AsyncIOMotorClient(MONGO_URI)
-db = client[MONGO_DATABASE]
-collection = db[MONGO_COLLECTION]
 
 async def get_database():
-    return db
+    return mongo_db()
 
 async def get_collection():
-    return collection
+    return products_collection()
+
+async def get_best_offers_collection():
+    return best_offers_collection()
+
+async def get_history_collection():
+    return history_collection()
+
+async def get_watchlist_collection():
+    return watchlist_collection()
+
+async def get_alerts_collection():
+    return alerts_collection()
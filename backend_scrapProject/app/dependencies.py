@@ -1,4 +1,67 @@
-from .database import get_collection
+import asyncio
+import hmac
+import os
+from typing import Optional
+from fastapi import Header, HTTPException
+from .database import get_database, get_collection, get_best_offers_collection, get_history_collection, get_watchlist_collection, get_alerts_collection
+from .services.sheets_service import GoogleSheetsService, AsyncGoogleSheetsService
+from .services.catalog_snapshot import SharedSheetsService
+
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+
+# Google Sheets backend (the /sheets routes); disabled unless the three are set
+GOOGLE_CREDENTIALS_PATH = os.getenv("GOOGLE_CREDENTIALS_PATH")
+GOOGLE_SPREADSHEET_NAME = os.getenv("GOOGLE_SPREADSHEET_NAME")
+GOOGLE_SHEET_NAME = os.getenv("GOOGLE_SHEET_NAME")
+SHEETS_MAX_WORKERS = int(os.getenv("SHEETS_MAX_WORKERS", "4"))
+SHEETS_TIMEOUT = float(os.getenv("SHEETS_TIMEOUT", "30"))
+# With several workers: one of them downloads the sheet and all read this file (see catalog_snapshot)
+CATALOG_SNAPSHOT_PATH = os.getenv("CATALOG_SNAPSHOT_PATH")
+
+_sheets_service: Optional[AsyncGoogleSheetsService] = None
+_sheets_lock = asyncio.Lock()
 
 async def get_product_collection():
-    return await get_collection()
\ No newline at end of file
+    return await get_collection()
+
+async def get_best_offer_collection():
+    return await get_best_offers_collection()
+
+async def get_price_history_collection():
+    return await get_history_collection()
+
+async def get_watchlist_rule_collection():
+    return await get_watchlist_collection()
+
+async def get_price_alert_collection():
+    return await get_alerts_collection()
+
+async def get_db():
+    return await get_database()
+
+async def require_admin(x_admin_token: Optional[str] = Header(default=None)):
+    # Admin endpoints are disabled unless ADMIN_TOKEN is set
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Admin endpoints are disabled: ADMIN_TOKEN is not set")
+    if not hmac.compare_digest((x_admin_token or "").encode(), ADMIN_TOKEN.encode()):
+        raise HTTPException(status_code=403, detail="Forbidden")
+
+async def get_sheets_service() -> AsyncGoogleSheetsService:
+    global _sheets_service
+    if _sheets_service is None:
+        if not (GOOGLE_CREDENTIALS_PATH and GOOGLE_SPREADSHEET_NAME and GOOGLE_SHEET_NAME):
+            raise HTTPException(status_code=503, detail="Google Sheets no está configurado")
+        async with _sheets_lock:
+            if _sheets_service is None:
+                # Opening the spreadsheet is a network call, keep it off the event loop
+                if CATALOG_SNAPSHOT_PATH:
+                    service = await asyncio.to_thread(
+                        SharedSheetsService, GOOGLE_CREDENTIALS_PATH, GOOGLE_SPREADSHEET_NAME, GOOGLE_SHEET_NAME,
+                        snapshot_path=CATALOG_SNAPSHOT_PATH,
+                    )
+                else:
+                    service = await asyncio.to_thread(
+                        GoogleSheetsService, GOOGLE_CREDENTIALS_PATH, GOOGLE_SPREADSHEET_NAME, GOOGLE_SHEET_NAME
+                    )
+                _sheets_service = AsyncGoogleSheetsService(service, max_workers=SHEETS_MAX_WORKERS, timeout=SHEETS_TIMEOUT)
+    return _sheets_service
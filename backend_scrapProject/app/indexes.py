@@ -0,0 +1,297 @@
+from typing import Dict, List
+
+from motor.motor_asyncio import AsyncIOMotorCollection, AsyncIOMotorDatabase
+from pymongo import IndexModel, ASCENDING, DESCENDING, TEXT
+
+from .database import MONGO_COLLECTION, MONGO_BEST_OFFERS_COLLECTION, MONGO_HISTORY_COLLECTION, MONGO_WATCHLIST_COLLECTION, MONGO_ALERTS_COLLECTION
+from .services.change_feed import enable_pre_images
+from .services.price_history import ensure_price_history_collection, history_pipeline
+from .queries import batch_pipeline, comparison_filter, search_count_pipeline, search_pipeline
+
+# Full-text index used by /products/search, over best_offers.
+# default_language="spanish" enables stemming ("fuentes" -> "fuente") and
+# text index version 3 folds case and diacritics ("memória" == "memoria").
+# It also indexes the titles of every store (all_names), so a term that only
+# appears in another store's title still finds the product.
+# A collection can have a single text index.
+BEST_OFFER_TEXT_INDEX = IndexModel(
+    [("product_name", TEXT), ("all_names", TEXT)],
+    name="names_text",
+    default_language="spanish",
+    textIndexVersion=3,
+    # The title shown (the cheapest offer) ranks above the other stores' titles
+    weights={"product_name": 2, "all_names": 1},
+)
+
+PRODUCT_INDEXES = [
+    # One document per listing: the key of the ingestion upserts, also used
+    # by the /history and /compare lookups by product_id
+    IndexModel([("product_id", ASCENDING), ("store_name", ASCENDING)], name="product_id_store_unique", unique=True),
+    # /compare listings and best offer refreshes by canonical key (see app/services/canonical.py)
+    IndexModel([("canonical_key", ASCENDING), ("price_current", ASCENDING)], name="canonical_key_price"),
+    # Best offer refreshes of listings without a canonical key yet
+    IndexModel([("product_name", ASCENDING), ("price_current", ASCENDING)], name="product_name_price"),
+    # Listings of a store filtered or sorted by price
+    IndexModel([("store_name", ASCENDING), ("price_current", ASCENDING)], name="store_name_price"),
+]
+
+BEST_OFFER_INDEXES = [
+    BEST_OFFER_TEXT_INDEX,
+    # $merge target of the best offer refreshes
+    IndexModel([("canonical_key", ASCENDING)], name="canonical_key_unique", unique=True),
+    IndexModel([("product_name", ASCENDING)], name="product_name"),
+    IndexModel([("price_current", ASCENDING), ("_id", ASCENDING)], name="price_current_id"),
+    # Store and price filters of /products/search match inside the offers array
+    IndexModel([("offers.store_name", ASCENDING), ("offers.price_current", ASCENDING)], name="offers_store_price"),
+]
+
+PRICE_HISTORY_INDEXES = [
+    # /history reads one product over a time range
+    IndexModel([("meta.product_id", ASCENDING), ("ts", ASCENDING)], name="product_id_ts"),
+]
+
+WATCHLIST_INDEXES = [
+    # Rules of the products in a batch of price updates with a target the batch
+    # can reach (see app/services/watchlists.py), one index per kind of rule
+    IndexModel([("canonical_key", ASCENDING), ("target_price", ASCENDING)], name="canonical_key_target"),
+    IndexModel([("product_id", ASCENDING), ("target_price", ASCENDING)], name="product_id_target"),
+    IndexModel([("owner", ASCENDING), ("created_at", DESCENDING)], name="owner_created_at"),
+]
+
+ALERT_INDEXES = [
+    IndexModel([("owner", ASCENDING), ("created_at", DESCENDING)], name="owner_created_at"),
+    IndexModel([("rule_id", ASCENDING), ("created_at", DESCENDING)], name="rule_id_created_at"),
+]
+
+# Indexes the API relies on, by collection name
+REQUIRED_INDEXES: Dict[str, List[IndexModel]] = {
+    MONGO_COLLECTION: PRODUCT_INDEXES,
+    MONGO_BEST_OFFERS_COLLECTION: BEST_OFFER_INDEXES,
+    MONGO_HISTORY_COLLECTION: PRICE_HISTORY_INDEXES,
+    MONGO_WATCHLIST_COLLECTION: WATCHLIST_INDEXES,
+    MONGO_ALERTS_COLLECTION: ALERT_INDEXES,
+}
+
+# Indexes replaced by the ones above, dropped if they still exist
+OBSOLETE_INDEXES: Dict[str, List[str]] = {
+    # product_id is covered by the prefix of product_id_store_unique, and no
+    # query searches the text of products since /search reads best_offers
+    MONGO_COLLECTION: ["product_id", "product_name_text"],
+    # best_offers used to be grouped by exact product_name, and its text
+    # index used to cover only the top-level title
+    MONGO_BEST_OFFERS_COLLECTION: ["product_name_unique", "product_name_text"],
+}
+
+
+async def dedupe_listings(products: AsyncIOMotorCollection) -> int:
+    """
+    Keeps the newest document of each product_id + store_name and deletes
+    the rest, so the unique index can be built over listings that
+    concurrent loads inserted twice. Returns the number deleted.
+    """
+    cursor = products.aggregate([
+        {"$sort": {"scraped_at": -1, "_id": -1}},
+        {"$group": {
+            "_id": {"product_id": "$product_id", "store_name": "$store_name"},
+            "ids": {"$push": "$_id"},
+            "count": {"$sum": 1},
+        }},
+        {"$match": {"count": {"$gt": 1}}},
+    ], allowDiskUse=True)
+    stale = []
+    async for group in cursor:
+        stale += group["ids"][1:]
+    for start in range(0, len(stale), 1000):
+        await products.delete_many({"_id": {"$in": stale[start:start + 1000]}})
+    return len(stale)
+
+
+async def ensure_indexes(db: AsyncIOMotorDatabase):
+    """
+    Creates the indexes the API relies on. create_indexes is a no-op for
+    indexes that already exist with the same definition.
+    """
+    await ensure_price_history_collection(db, MONGO_HISTORY_COLLECTION)
+    for collection_name, index_names in OBSOLETE_INDEXES.items():
+        existing = await db[collection_name].index_information()
+        for index_name in index_names:
+            if index_name in existing:
+                await db[collection_name].drop_index(index_name)
+    # best_offers documents from before canonical_key cannot go into its unique
+    # index; they are derived data, so drop them and let the refresh rebuild them
+    await db[MONGO_BEST_OFFERS_COLLECTION].delete_many({"canonical_key": {"$exists": False}})
+    if "product_id_store_unique" not in await db[MONGO_COLLECTION].index_information():
+        await dedupe_listings(db[MONGO_COLLECTION])
+    for collection_name, indexes in REQUIRED_INDEXES.items():
+        await db[collection_name].create_indexes(indexes)
+    # After create_indexes, which creates the collection if it does not exist yet
+    await enable_pre_images(db, MONGO_COLLECTION)
+
+
+# Plan stages that read through an index. COLLSCAN is a full collection scan.
+_INDEX_STAGES = {
+    "IXSCAN", "EXPRESS_IXSCAN", "IDHACK", "EXPRESS_IDHACK",
+    "TEXT", "TEXT_MATCH", "TEXT_OR", "COUNT_SCAN", "DISTINCT_SCAN",
+}
+
+
+def canonical_queries(sample: Dict) -> List[Dict]:
+    """
+    The queries each endpoint sends, as explainable commands. Filters and
+    pipelines come from the same builders the endpoints use (app/queries.py).
+    `sample` is a product document used to fill realistic values.
+    """
+    product_id = sample.get("product_id") or ""
+    product_name = sample.get("product_name") or ""
+    store = sample.get("store_name") or ""
+    term = product_name.split()[0] if product_name.split() else "rtx"
+
+    text_pipeline, _, text_match = search_pipeline(q=term)
+    store_pipeline, _, store_match = search_pipeline(store=store, min_price=0)
+    return [
+        {
+            "endpoint": "GET /products/{product_id}/history",
+            "command": {"find": MONGO_COLLECTION, "filter": {"product_id": product_id}, "limit": 1},
+        },
+        {
+            "endpoint": "GET /products/{product_id}/history (points)",
+            "command": {
+                "aggregate": MONGO_HISTORY_COLLECTION,
+                "pipeline": history_pipeline(product_id),
+                "cursor": {},
+            },
+        },
+        {
+            "endpoint": "GET /products/{product_id}/compare",
+            "command": {
+                "find": MONGO_COLLECTION,
+                "filter": comparison_filter({**sample, "product_name": product_name}),
+            },
+        },
+        {
+            "endpoint": "POST /products/batch",
+            "command": {
+                "aggregate": MONGO_COLLECTION,
+                "pipeline": batch_pipeline(MONGO_COLLECTION, [product_id]),
+                "cursor": {},
+            },
+        },
+        {
+            "endpoint": "GET /products/",
+            "command": {"find": MONGO_COLLECTION, "filter": {}, "sort": {"_id": 1}, "limit": 21},
+        },
+        {
+            "endpoint": "GET /products/stats",
+            "command": {
+                "find": MONGO_BEST_OFFERS_COLLECTION,
+                "filter": {},
+                "sort": {"price_current": 1, "_id": 1},
+                "limit": 10,
+            },
+        },
+        {
+            "endpoint": "GET /products/search?q=",
+            "command": {"aggregate": MONGO_BEST_OFFERS_COLLECTION, "pipeline": text_pipeline, "cursor": {}},
+        },
+        {
+            "endpoint": "GET /products/search?q= (count)",
+            "command": {"aggregate": MONGO_BEST_OFFERS_COLLECTION, "pipeline": search_count_pipeline(text_match), "cursor": {}},
+        },
+        {
+            "endpoint": "GET /products/search?store=&min_price=",
+            "command": {"aggregate": MONGO_BEST_OFFERS_COLLECTION, "pipeline": store_pipeline, "cursor": {}},
+        },
+        {
+            "endpoint": "GET /products/search?store=&min_price= (count)",
+            "command": {"aggregate": MONGO_BEST_OFFERS_COLLECTION, "pipeline": search_count_pipeline(store_match), "cursor": {}},
+        },
+    ]
+
+
+def summarize_plan(explain: Dict) -> Dict:
+    """
+    Extracts the stages and indexes of the winning plan of an explain output.
+    Works for find and aggregate explains and for both query engines.
+    """
+    stages: List[str] = []
+    indexes: List[str] = []
+
+    def walk(node, in_winning_plan: bool):
+        if isinstance(node, dict):
+            for key, value in node.items():
+                if key == "rejectedPlans":
+                    continue
+                inside = in_winning_plan or key == "winningPlan"
+                if inside and key == "stage" and isinstance(value, str):
+                    stages.append(value)
+                elif inside and key == "indexName" and isinstance(value, str):
+                    indexes.append(value)
+                walk(value, inside)
+        elif isinstance(node, list):
+            for item in node:
+                walk(item, in_winning_plan)
+
+    walk(explain, False)
+    stages = list(dict.fromkeys(stages))
+    uses_index = "COLLSCAN" not in stages and any(stage in _INDEX_STAGES for stage in stages)
+    return {
+        "stages": stages,
+        "indexes": list(dict.fromkeys(indexes)),
+        "uses_index": uses_index,
+        # Answered from the index alone, without fetching documents
+        "covered": uses_index and "FETCH" not in stages,
+    }
+
+
+def summarize_execution(explain: Dict) -> Dict:
+    """
+    Work done by an explain("executionStats") run: documents and index keys
+    examined by the query and documents returned (by the last aggregation
+    stage when there are several). Sharded explains add up every shard.
+    """
+    totals = {"docs_examined": 0, "keys_examined": 0, "returned": 0, "execution_ms": 0}
+
+    def walk(node):
+        if isinstance(node, dict):
+            for key, value in node.items():
+                if key == "executionStats" and isinstance(value, dict):
+                    totals["docs_examined"] += value.get("totalDocsExamined", 0)
+                    totals["keys_examined"] += value.get("totalKeysExamined", 0)
+                    totals["returned"] += value.get("nReturned", 0)
+                    totals["execution_ms"] = max(totals["execution_ms"], value.get("executionTimeMillis", 0))
+                else:
+                    walk(value)
+        elif isinstance(node, list):
+            for item in node:
+                walk(item)
+
+    walk(explain)
+    stages = explain.get("stages")
+    if isinstance(stages, list) and stages and "nReturned" in stages[-1]:
+        # Documents that came out of the pipeline, not out of the initial query
+        totals["returned"] = stages[-1]["nReturned"]
+    return totals
+
+
+async def explain_canonical_queries(db: AsyncIOMotorDatabase) -> List[Dict]:
+    """
+    Runs explain() on every canonical query and reports whether it uses an index.
+    """
+    sample = await db[MONGO_COLLECTION].find_one(
+        {}, {"product_id": 1, "product_name": 1, "store_name": 1, "canonical_key": 1}
+    ) or {}
+
+    reports = []
+    for query in canonical_queries(sample):
+        command = query["command"]
+        report = {
+            "endpoint": query["endpoint"],
+            "collection": command.get("find") or command.get("aggregate"),
+        }
+        try:
+            explain = await db.command({"explain": command, "verbosity": "queryPlanner"})
+            report.update(summarize_plan(explain))
+        except Exception as e:
+            report.update({"stages": [], "indexes": [], "uses_index": False, "covered": False, "error": str(e)})
+        reports.append(report)
+    return reports
@@ -1,10 +1,116 @@
+import asyncio
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
-from .routers import products
+from .routers import products, admin, sheets, health, watchlists, metrics as metrics_router
+from . import dependencies
+from . import database
+from .database import mongo_db, products_collection, best_offers_collection, history_collection, watchlist_collection, alerts_collection, leases_collection
+from .indexes import ensure_indexes
+from .metrics import MetricsMiddleware
+from .compression import CompressionMiddleware
+from .services.best_offers import refresh_best_offers
+from .services.price_history import snapshot_prices
+from .services.change_feed import (
+    on_products_changed, on_products_changed_once, notify_products_changed, watch_products, set_lease, is_leader,
+)
+from .services.lease import Lease
+from .services.response_cache import response_cache
+from .services.canonical import assign_canonical_keys, assign_missing_canonical_keys
+from .services.suggest import suggest_index, build_suggest_index, refresh_suggest_index
+from .services.watchlists import evaluate_changed_products
+
+
+# Listeners that write to MongoDB run in one worker only (the change feed
+# lease holder), so a write is not processed once per uvicorn worker.
+
+# Registered first: the listeners below group listings by canonical_key
+@on_products_changed_once
+async def assign_changed_canonical_keys(names):
+    await assign_canonical_keys(products_collection(), names)
+
+
+@on_products_changed_once
+async def refresh_changed_best_offers(names):
+    await refresh_best_offers(products_collection(), best_offers_collection(), names)
+
+
+@on_products_changed_once
+async def record_changed_prices(names):
+    await snapshot_prices(products_collection(), history_collection(), names)
+
+
+@on_products_changed_once
+async def evaluate_watchlists(names):
+    await evaluate_changed_products(products_collection(), watchlist_collection(), alerts_collection(), names)
+
+
+# Every worker keeps its own typeahead index
+@on_products_changed
+async def refresh_suggestions(names):
+    await refresh_suggest_index(products_collection(), suggest_index, names)
+
+
+async def invalidate_response_cache(names):
+    # Cached responses are read from best_offers, so every worker clears its
+    # cache when best_offers changes: after the lease holder refreshed it
+    response_cache.invalidate()
+
+
+async def resync_products():
+    # Without the change stream (e.g. a standalone mongod) nothing says which
+    # products changed: fill the missing canonical keys and recompute everything
+    if is_leader():
+        await assign_missing_canonical_keys(products_collection())
+    await notify_products_changed(None)
+    response_cache.invalidate()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # The client is created (with the pool settings) and warmed up here, so the
+    # first requests of a new worker find open connections
+    database.connect()
+    try:
+        rtt = await database.warm_up()
+        print(f"MongoDB listo ({rtt:.1f} ms, {database.pool_stats.open} conexiones abiertas)")
+    except Exception as e:
+        print(f"Error al conectar con MongoDB: {e}")
+
+    collection = products_collection()
+    best_offers = best_offers_collection()
+    lease = Lease(leases_collection(), "change_feed")
+    set_lease(lease)
+    background = []
+    try:
+        await ensure_indexes(mongo_db())
+        await lease.acquire()
+        if lease.held and (await best_offers.estimated_document_count() == 0
+                or await best_offers.find_one({"all_names": {"$exists": False}}, {"_id": 1})):
+            # First run (or documents from before all_names): build the
+            # materialized collection without blocking startup
+            background.append(asyncio.create_task(refresh_best_offers(collection, best_offers)))
+    except Exception as e:
+        print(f"Error al preparar las colecciones de MongoDB: {e}")
+    # Typeahead index, answered with a 503 until it is loaded
+    background.append(asyncio.create_task(build_suggest_index(collection, suggest_index)))
+    background.append(asyncio.create_task(lease.keep()))
+    background.append(asyncio.create_task(watch_products(collection, resync=resync_products)))
+    background.append(asyncio.create_task(watch_products(best_offers, notify=invalidate_response_cache)))
+    yield
+    for task in background:
+        task.cancel()
+    # Let another worker take over right away instead of after the ttl
+    await lease.release()
+    if dependencies._sheets_service is not None:
+        dependencies._sheets_service.shutdown()
+    database.close()
+
 
 app = FastAPI(
     title="Hardware Prices API",
     description="API para consultar precios de hardware obtenidos por web scraping.",
     version="1.0.0",
+    lifespan=lifespan,
 )
 
 from fastapi.middleware.cors import CORSMiddleware
@@ -20,9 +126,19 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "ETag", "X-Cache"],
 )
+# Compresses what the routes send uncompressed (cached responses come already compressed)
+app.add_middleware(CompressionMiddleware)
+# Outermost, so the latency includes every other middleware
+app.add_middleware(MetricsMiddleware)
 
 app.include_router(products.router)
+app.include_router(admin.router)
+app.include_router(sheets.router)
+app.include_router(watchlists.router)
+app.include_router(health.router)
+app.include_router(metrics_router.router)
 
 @app.get("/")
 def read_root():
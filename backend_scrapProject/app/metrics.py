@@ -0,0 +1,283 @@
+"""
+Process metrics in the Prometheus text format, served by GET /metrics.
+
+- http_request_duration_seconds: per route template, method and status,
+  measured by MetricsMiddleware from the request to the last body byte.
+- http_request_stage_seconds: time spent in the named stages of a route
+  (e.g. /products/search "aggregate" and "serialize"), so a slow request
+  can be told apart from a slow query.
+- mongodb_command_*: every command sent by the driver, from CommandMetrics.
+- mongodb_pool_checkout_wait_seconds: time waiting for a free connection,
+  i.e. queueing on the pool (see app.database.PoolStats).
+
+Values read at scrape time from other components (pool state, cache
+counters) are registered as callbacks with `register_callback`.
+"""
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Sequence, Tuple
+
+from pymongo import monitoring
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Seconds. Covers cache hits (sub-millisecond) up to the 5 s wait queue timeout
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Label values are escaped as the text format requires
+_ESCAPES = str.maketrans({"\\": "\\\\", '"': '\\"', "\n": "\\n"})
+
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{name}="{str(value).translate(_ESCAPES)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        # Observations come from the event loop and from the driver threads
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+    def render(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, help, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            values = list(self._values.items())
+        return self.header() + [f"{self.name}{_labels(self.labelnames, key)} {_number(value)}" for key, value in values]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # labels -> (count per bucket, not cumulative; the last one is +Inf), sum
+        self._values: Dict[Tuple[str, ...], Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts, total = self._values.setdefault(key, ([0] * (len(self.buckets) + 1), [0.0]))
+            counts[index] += 1
+            total[0] += value
+
+    def count(self, **labels) -> int:
+        entry = self._values.get(self._key(labels))
+        return sum(entry[0]) if entry else 0
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            values = [(key, list(counts), total[0]) for key, (counts, total) in self._values.items()]
+        lines = self.header()
+        for key, counts, total in values:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = 'le="' + _number(bound) + '"'
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, key)} {_number(total)}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, key)} {cumulative}")
+        return lines
+
+
+class CallbackMetric(Metric):
+    """
+    A metric whose values are read when scraped. `callback` returns
+    {label values tuple: value}.
+    """
+
+    def __init__(self, name: str, help: str, kind: str, callback: Callable[[], Dict[Tuple[str, ...], float]], labelnames: Sequence[str] = ()):
+        super().__init__(name, help, labelnames)
+        self.kind = kind
+        self.callback = callback
+
+    def render(self) -> List[str]:
+        try:
+            values = self.callback()
+        except Exception as e:
+            print(f"Error al leer la métrica {self.name}: {e}")
+            return []
+        return self.header() + [f"{self.name}{_labels(self.labelnames, key)} {_number(value)}" for key, value in values.items()]
+
+
+_registry: Dict[str, Metric] = {}
+
+
+def register(metric: Metric) -> Metric:
+    _registry[metric.name] = metric
+    return metric
+
+
+def register_callback(name: str, help: str, kind: str, callback: Callable, labelnames: Sequence[str] = ()) -> CallbackMetric:
+    return register(CallbackMetric(name, help, kind, callback, labelnames))
+
+
+def render() -> str:
+    lines = []
+    for metric in _registry.values():
+        lines += metric.render()
+    return "\n".join(lines) + "\n"
+
+
+request_duration = register(Histogram(
+    "http_request_duration_seconds",
+    "Time from receiving the request to sending the last byte of the response.",
+    ("method", "route", "status"),
+))
+requests_in_progress = register(Gauge(
+    "http_requests_in_progress",
+    "Requests being handled.",
+))
+stage_duration = register(Histogram(
+    "http_request_stage_seconds",
+    "Time spent in a named stage of a route.",
+    ("route", "stage"),
+))
+command_duration = register(Histogram(
+    "mongodb_command_duration_seconds",
+    "Duration of the commands sent to MongoDB, as measured by the driver.",
+    ("command", "collection"),
+))
+command_documents = register(Counter(
+    "mongodb_command_documents_returned_total",
+    "Documents returned by MongoDB commands (batches of find, aggregate and getMore).",
+    ("command", "collection"),
+))
+command_failures = register(Counter(
+    "mongodb_command_failures_total",
+    "MongoDB commands that failed.",
+    ("command", "collection"),
+))
+pool_checkout_wait = register(Histogram(
+    "mongodb_pool_checkout_wait_seconds",
+    "Time waiting to check a connection out of the pool.",
+))
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware that feeds http_request_duration_seconds. Requests are
+    labelled with the route template ("/products/{product_id}/history"), not
+    the path, so the number of series stays bounded; unmatched paths share
+    the "unmatched" label.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        start = time.perf_counter()
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        requests_in_progress.inc()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            requests_in_progress.dec()
+            route = scope.get("route")
+            request_duration.observe(
+                time.perf_counter() - start,
+                method=scope["method"],
+                route=getattr(route, "path", "unmatched"),
+                status=status,
+            )
+
+
+class CommandMetrics(monitoring.CommandListener):
+    """
+    Records the duration and returned documents of every MongoDB command.
+    """
+
+    def __init__(self):
+        # (connection, request id) -> collection, since only the started event has the command
+        self._collections: Dict[Tuple, str] = {}
+
+    @staticmethod
+    def _collection(event: monitoring.CommandStartedEvent) -> str:
+        if event.command_name == "getMore":
+            return str(event.command.get("collection", ""))
+        target = event.command.get(event.command_name)
+        return target if isinstance(target, str) else ""
+
+    def started(self, event):
+        self._collections[(event.connection_id, event.request_id)] = self._collection(event)
+
+    def succeeded(self, event):
+        collection = self._collections.pop((event.connection_id, event.request_id), "")
+        command_duration.observe(event.duration_micros / 1e6, command=event.command_name, collection=collection)
+        cursor = event.reply.get("cursor") if isinstance(event.reply, dict) else None
+        if isinstance(cursor, dict):
+            batch = cursor.get("firstBatch", cursor.get("nextBatch", []))
+            command_documents.inc(len(batch), command=event.command_name, collection=collection)
+
+    def failed(self, event):
+        collection = self._collections.pop((event.connection_id, event.request_id), "")
+        command_duration.observe(event.duration_micros / 1e6, command=event.command_name, collection=collection)
+        command_failures.inc(command=event.command_name, collection=collection)
+
+
+command_metrics = CommandMetrics()
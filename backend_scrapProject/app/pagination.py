@@ -0,0 +1,69 @@
+import base64
+import json
+from typing import Dict, List
+
+from bson import ObjectId
+from bson.errors import InvalidId
+from pymongo import ASCENDING
+
+
+def encode_cursor(sort_stage: Dict[str, int], doc: Dict) -> str:
+    """
+    Builds an opaque cursor from the sort keys of the last document of a page.
+    """
+    values = [str(doc["_id"]) if field == "_id" else doc.get(field) for field in sort_stage]
+    payload = json.dumps({"k": list(sort_stage.items()), "v": values}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, sort_stage: Dict[str, int]) -> Dict:
+    """
+    Decodes a cursor produced by encode_cursor for the same sort.
+    Raises ValueError if the cursor is malformed or was built for another sort.
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        keys: List[List] = payload["k"]
+        values: List = payload["v"]
+    except (ValueError, KeyError, TypeError) as e:
+        raise ValueError("Malformed cursor") from e
+
+    if keys != [list(item) for item in sort_stage.items()] or len(values) != len(keys):
+        raise ValueError("Cursor does not match the requested sort")
+
+    after = {field: value for (field, _), value in zip(keys, values)}
+    if "_id" in after:
+        try:
+            after["_id"] = ObjectId(after["_id"])
+        except (InvalidId, TypeError) as e:
+            raise ValueError("Malformed cursor") from e
+    return after
+
+
+def keyset_match(sort_stage: Dict[str, int], after: Dict) -> Dict:
+    """
+    Builds the filter for documents that come strictly after `after` in
+    `sort_stage` order. The last sort key must be unique (usually _id).
+
+    For sort (a ASC, _id ASC) this is:
+        {"$or": [{"a": {"$gt": a0}}, {"a": a0, "_id": {"$gt": id0}}]}
+    """
+    clauses = []
+    fields = list(sort_stage.items())
+    for i, (field, direction) in enumerate(fields):
+        clause = {prev: after[prev] for prev, _ in fields[:i]}
+        value = after[field]
+        if value is None:
+            # null sorts before every other value: everything non-null comes
+            # after it in ascending order and nothing comes after it descending
+            if direction != ASCENDING:
+                continue
+            clause[field] = {"$ne": None}
+        else:
+            clause[field] = {"$gt" if direction == ASCENDING else "$lt": value}
+        clauses.append(clause)
+
+    if len(clauses) == 1:
+        return clauses[0]
+    return {"$or": clauses}
@@ -0,0 +1,53 @@
+from typing import Dict, List, Optional
+
+from .schemas.product import Product
+
+# Predefined field sets accepted by `fields=` (e.g. ?fields=card or ?fields=card,product_url)
+FIELD_VIEWS: Dict[str, List[str]] = {
+    # What a product grid card shows
+    "card": ["product_id", "product_name", "price_current", "store_name", "image_url"],
+}
+
+PRODUCT_FIELDS = list(Product.model_fields)
+
+
+def parse_fields(fields: Optional[str]) -> Optional[List[str]]:
+    """
+    Parses a comma-separated `fields=` value into Product field names.
+    None means every field. product_id is always included since it is required.
+    Raises ValueError on unknown fields.
+    """
+    if not fields:
+        return None
+    selected = ["product_id"]
+    for name in fields.split(","):
+        name = name.strip()
+        if not name:
+            continue
+        if name in FIELD_VIEWS:
+            names = FIELD_VIEWS[name]
+        elif name in PRODUCT_FIELDS:
+            names = [name]
+        else:
+            raise ValueError(name)
+        selected += [field for field in names if field not in selected]
+    return selected
+
+
+def product_projection(fields: Optional[List[str]], sort_stage: Optional[Dict] = None) -> Dict[str, int]:
+    """
+    MongoDB projection with the selected Product fields (all of them by default)
+    plus the sort keys, which keyset cursors are built from.
+    """
+    projection = {field: 1 for field in (fields or PRODUCT_FIELDS)}
+    for key in sort_stage or {}:
+        projection[key] = 1
+    return projection
+
+
+def select_fields(docs: List[Dict], fields: List[str]) -> List[Dict]:
+    """
+    Keeps only `fields` of each document. The result is serialized as is,
+    skipping the Product validation of the full responses.
+    """
+    return [{field: doc[field] for field in fields if field in doc} for doc in docs]
@@ -0,0 +1,175 @@
+"""
+Queries sent by the /products endpoints, built here so the endpoints and the
+query-plan check (app/indexes.py) use exactly the same filters and pipelines.
+"""
+from typing import Dict, List, Optional, Tuple
+
+from pymongo import ASCENDING, DESCENDING
+
+from .pagination import decode_cursor, keyset_match
+from .projection import product_projection
+from .services.canonical import canonical_key
+
+
+def comparison_filter(product: Dict) -> Dict:
+    """
+    Every listing of the same product: same canonical key, even if the store
+    titles differ (or the same name if the key was not backfilled yet).
+    """
+    key = product.get("canonical_key") or canonical_key(product["product_name"])
+    return {"$or": [{"canonical_key": key}, {"product_name": product["product_name"]}]}
+
+
+def batch_pipeline(collection_name: str, product_ids: List[str]) -> List[Dict]:
+    """
+    /products/batch: resolves every ID to its product, then joins all of its
+    listings with the same condition as comparison_filter.
+    """
+    return [
+        {"$match": {"product_id": {"$in": product_ids}}},
+        {"$group": {
+            "_id": "$product_id",
+            "product_name": {"$first": "$product_name"},
+            "canonical_key": {"$first": "$canonical_key"},
+        }},
+        {"$lookup": {
+            "from": collection_name,
+            "let": {"key": "$canonical_key", "name": "$product_name"},
+            "pipeline": [
+                # Same canonical key, or the same name for listings not backfilled yet
+                {"$match": {"$expr": {"$or": [
+                    {"$and": [{"$ne": ["$$key", None]}, {"$eq": ["$canonical_key", "$$key"]}]},
+                    {"$eq": ["$product_name", "$$name"]},
+                ]}}},
+                {"$project": {"_id": 0, "store_name": 1, "price_current": 1, "product_url": 1}},
+            ],
+            "as": "listings"
+        }},
+    ]
+
+
+def search_filters(
+    q: Optional[str],
+    min_price: Optional[float],
+    max_price: Optional[float],
+    store: Optional[str],
+    search_mode: str
+) -> Tuple[Dict, Dict, List[Dict]]:
+    """
+    Filters of /products/search over best_offers: the $match stage, the
+    same price/store filter for a single offer, and its $filter conditions.
+    """
+    # "text" uses the text index over every store's title (see app/indexes.py).
+    # "regex" keeps the old substring matching, which cannot use an index.
+    match_stage = {}
+    if q:
+        if search_mode != "regex":
+            match_stage["$text"] = {"$search": q}
+        else:
+            regex = {"$regex": q, "$options": "i"}
+            match_stage["$or"] = [{"product_name": regex}, {"all_names": regex}]
+
+    # Price and store filters apply to the individual offers of each product
+    offer_filter = {}
+    offer_conditions = []
+    if min_price is not None:
+        offer_filter["price_current"] = {"$gte": min_price}
+        offer_conditions.append({"$gte": ["$$offer.price_current", min_price]})
+    if max_price is not None:
+        offer_filter.setdefault("price_current", {})["$lte"] = max_price
+        offer_conditions.append({"$lte": ["$$offer.price_current", max_price]})
+    if store:
+        offer_filter["store_name"] = store
+        offer_conditions.append({"$eq": ["$$offer.store_name", store]})
+    if offer_filter:
+        match_stage["offers"] = {"$elemMatch": offer_filter}
+    return match_stage, offer_filter, offer_conditions
+
+
+def best_matching_offer(offer_conditions: List[Dict]) -> Dict:
+    # The overall cheapest offer may be filtered out, so promote the cheapest one that matches
+    return {
+        "$replaceWith": {"$mergeObjects": [
+            "$$ROOT",
+            {"$first": {"$filter": {
+                "input": "$offers",
+                "as": "offer",
+                "cond": {"$and": offer_conditions}
+            }}}
+        ]}
+    }
+
+
+def search_pipeline(
+    q: Optional[str] = None,
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None,
+    store: Optional[str] = None,
+    sort_by: Optional[str] = None,
+    search_mode: str = "text",
+    page: int = 1,
+    limit: int = 20,
+    cursor: Optional[str] = None,
+    fields: Optional[List[str]] = None,
+) -> Tuple[List[Dict], Dict, Dict]:
+    """
+    Page pipeline of /products/search, with its sort (which cursors are
+    built from) and its $match stage. One extra document is fetched to know
+    whether there is a next page. Raises ValueError on an invalid cursor.
+    """
+    use_text = bool(q) and search_mode != "regex"
+
+    # 1. Match Stage (Filtering)
+    match_stage, offer_filter, offer_conditions = search_filters(q, min_price, max_price, store, search_mode)
+
+    pipeline = []
+    if match_stage:
+        pipeline.append({"$match": match_stage})
+
+    if sort_by == "relevance" and use_text:
+        # Keep the text score as a regular field so it can be sorted on and paginated
+        pipeline.append({"$addFields": {"score": {"$meta": "textScore"}}})
+
+    # 2. Best Matching Offer
+    if offer_conditions:
+        pipeline.append(best_matching_offer(offer_conditions))
+
+    # 3. Sort Stage
+    sort_stage = {}
+    if sort_by == "relevance" and use_text:
+        sort_stage["score"] = DESCENDING
+        sort_stage["price_current"] = ASCENDING
+    elif sort_by == "price_desc":
+        sort_stage["price_current"] = DESCENDING
+    elif sort_by == "date_desc":
+        sort_stage["_id"] = DESCENDING # best_offers _id is set when the product is first seen
+    else: # price_asc or default
+        sort_stage["price_current"] = ASCENDING
+    # _id as tiebreaker gives a total order, which keyset pagination needs
+    sort_stage["_id"] = sort_stage.get("_id", ASCENDING)
+
+    # Keep only the returned fields (and the sort keys) before sorting, so the
+    # offers array and other unused fields are not carried through the sort
+    pipeline.append({"$project": product_projection(fields, sort_stage)})
+    pipeline.append({"$sort": sort_stage})
+
+    # 4. Pagination
+    # With a cursor we seek past the last seen sort key instead of skipping.
+    if cursor:
+        after = decode_cursor(cursor, sort_stage)
+        pipeline += [{"$match": keyset_match(sort_stage, after)}, {"$limit": limit + 1}]
+    else:
+        pipeline += [{"$skip": (page - 1) * limit}, {"$limit": limit + 1}]
+    return pipeline, sort_stage, match_stage
+
+
+def search_count_pipeline(match_stage: Dict, cap: Optional[int] = None) -> List[Dict]:
+    """
+    Count of /products/search: only the filters, without sorting. With
+    `cap` it stops counting after cap + 1 matches.
+    """
+    pipeline = [{"$match": match_stage}] if match_stage else []
+    if cap is not None:
+        pipeline.append({"$limit": cap + 1})
+    pipeline.append({"$count": "total"})
+    return pipeline
@@ -0,0 +1,42 @@
+from fastapi import APIRouter, Depends
+from motor.motor_asyncio import AsyncIOMotorDatabase
+
+from ..schemas.admin import QueryPlansResponse, ResponseCacheStats, SlowQueryReport
+from ..dependencies import get_db, require_admin
+from ..indexes import explain_canonical_queries
+from ..services.response_cache import response_cache
+from ..services.slow_queries import slow_query_log
+
+router = APIRouter(
+    prefix="/admin",
+    tags=["admin"],
+    dependencies=[Depends(require_admin)],
+)
+
+@router.get("/query-plans", response_model=QueryPlansResponse)
+async def get_query_plans(db: AsyncIOMotorDatabase = Depends(get_db)):
+    # Explains the query behind each endpoint; ok is False if any of them scans the collection
+    queries = await explain_canonical_queries(db)
+    return QueryPlansResponse(
+        ok=all(query["uses_index"] for query in queries),
+        queries=queries
+    )
+
+@router.get("/cache", response_model=ResponseCacheStats)
+async def get_cache_stats():
+    return response_cache.stats()
+
+@router.delete("/cache", response_model=ResponseCacheStats)
+async def clear_cache():
+    response_cache.invalidate()
+    return response_cache.stats()
+
+@router.get("/slow-queries", response_model=SlowQueryReport)
+async def get_slow_queries():
+    # Newest first, each with the explain("executionStats") summary of its pipeline
+    return slow_query_log.stats()
+
+@router.delete("/slow-queries", response_model=SlowQueryReport)
+async def clear_slow_queries():
+    slow_query_log.clear()
+    return slow_query_log.stats()
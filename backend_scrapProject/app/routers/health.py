@@ -0,0 +1,25 @@
+from fastapi import APIRouter
+from fastapi.responses import JSONResponse
+
+from .. import database
+from ..schemas.health import ReadinessResponse
+
+router = APIRouter(
+    prefix="/health",
+    tags=["health"],
+)
+
+@router.get("/live")
+async def liveness():
+    # The process is up; says nothing about MongoDB
+    return {"status": "ok"}
+
+@router.get("/ready", response_model=ReadinessResponse, responses={503: {"model": ReadinessResponse}})
+async def readiness():
+    # Ready only if MongoDB answers a ping; load balancers should stop routing here otherwise
+    try:
+        rtt = await database.ping()
+    except Exception as e:
+        report = ReadinessResponse(status="unavailable", pool=database.pool_stats.snapshot(), error=str(e))
+        return JSONResponse(status_code=503, content=report.model_dump())
+    return ReadinessResponse(status="ok", mongo_rtt_ms=round(rtt, 3), pool=database.pool_stats.snapshot())
@@ -0,0 +1,53 @@
+from fastapi import APIRouter, Response
+
+from .. import database, dependencies
+from .. import metrics
+from ..services.response_cache import response_cache
+
+router = APIRouter(tags=["metrics"])
+
+
+def _pool_state():
+    snapshot = database.pool_stats.snapshot()
+    return {(state,): snapshot[state] for state in ("open", "in_use", "available")}
+
+
+def _response_cache_lookups():
+    return {("hit",): response_cache.hits, ("miss",): response_cache.misses}
+
+
+def _response_cache_hit_ratio():
+    return {(): response_cache.stats()["hit_ratio"]}
+
+
+def _sheets_snapshot_reads():
+    service = dependencies._sheets_service
+    if service is None:
+        return {}
+    sheets = service.service
+    return {
+        ("hit",): sheets.snapshot_hits,
+        ("stale",): sheets.snapshot_stale_hits,
+        ("miss",): sheets.snapshot_misses,
+    }
+
+
+def _sheets_snapshot_hit_ratio():
+    reads = _sheets_snapshot_reads()
+    if not reads:
+        return {}
+    lookups = sum(reads.values())
+    # Stale reads are answered from memory too
+    return {(): (reads[("hit",)] + reads[("stale",)]) / lookups if lookups else 0.0}
+
+
+metrics.register_callback("mongodb_pool_connections", "Connections in the MongoDB pool by state.", "gauge", _pool_state, ("state",))
+metrics.register_callback("response_cache_lookups_total", "Response cache lookups by result.", "counter", _response_cache_lookups, ("result",))
+metrics.register_callback("response_cache_hit_ratio", "Response cache hits over lookups.", "gauge", _response_cache_hit_ratio)
+metrics.register_callback("sheets_snapshot_reads_total", "Reads of the Google Sheets snapshot by result.", "counter", _sheets_snapshot_reads, ("result",))
+metrics.register_callback("sheets_snapshot_hit_ratio", "Google Sheets reads answered from the snapshot over all reads.", "gauge", _sheets_snapshot_hit_ratio)
+
+
+@router.get("/metrics", include_in_schema=False)
+async def get_metrics():
+    return Response(content=metrics.render(), media_type=metrics.CONTENT_TYPE)
@@ -1,10 +1,34 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
+import asyncio
+import os
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
 from typing import List, Dict, Optional
+from datetime import datetime, timezone
 from motor.motor_asyncio import AsyncIOMotorCollection
 from pymongo import DESCENDING, ASCENDING
+from pydantic_core import to_json
 
-from ..schemas.product import Product, ProductHistory, ProductComparison, GlobalStats, ProductSearchResponse, BestPriceProduct, PriceHistoryItem, ProductComparisonItem
-from ..dependencies import get_product_collection
+from ..schemas.product import Product, ProductHistory, ProductComparison, GlobalStats, ProductSearchResponse, BestPriceProduct, PriceHistoryItem, ProductComparisonItem, ProductBatchRequest, ProductBatchItem, ProductBatchResponse, ProductFacets, FacetCount, PriceBucket, SuggestResponse, Suggestion, SearchCount
+from ..dependencies import get_product_collection, get_best_offer_collection, get_price_history_collection
+from ..pagination import encode_cursor, decode_cursor, keyset_match
+from ..queries import batch_pipeline, comparison_filter, search_filters, best_matching_offer, search_pipeline, search_count_pipeline
+from ..services.response_cache import response_cache, cached_json_response
+from ..services.price_history import RESOLUTIONS, get_price_history
+from ..projection import parse_fields, product_projection, select_fields, PRODUCT_FIELDS
+from ..services.suggest import suggest_index
+from ..services.export import EXPORT_FORMATS, export_filter, export_cursor, iter_ndjson, iter_csv
+from ..metrics import stage_duration
+from ..services.slow_queries import aggregate_tracked
+
+# Maximum number of product IDs accepted by /products/batch
+MAX_BATCH_SIZE = 50
+
+# Largest page of / and /search
+MAX_PAGE_SIZE = 100
+
+# count_mode of /products/search: "exact" counts every match, "capped" stops at SEARCH_COUNT_CAP
+SEARCH_COUNT_MODES = ("exact", "capped")
+SEARCH_COUNT_CAP = int(os.getenv("SEARCH_COUNT_CAP", "1000"))
 
 router = APIRouter(
     prefix="/products",
@@ -12,67 +36,152 @@ router = APIRouter(
 )
 
 @router.get("/stats", response_model=GlobalStats)
-async def get_global_stats(collection: AsyncIOMotorCollection = Depends(get_product_collection)):
-    # Example: Get best prices (lowest price per product name across stores)
-    pipeline = [
-        {"$sort": {"price_current": 1}},
-        {"$group": {
-            "_id": "$product_name",
-            "min_price": {"$first": "$price_current"},
-            "store": {"$first": "$store_name"}
-        }},
-        {"$limit": 10} # Limit to top 10 for now
-    ]
+async def get_global_stats(
+    request: Request,
+    best_offers: AsyncIOMotorCollection = Depends(get_best_offer_collection)
+):
+    cache_key = response_cache.make_key("stats", {})
+    cached = response_cache.get(cache_key)
+    if cached:
+        return cached_json_response(request, cached, hit=True)
+    cache_version = response_cache.version
+
+    # Best prices (lowest price per product name across stores), read from the
+    # pre-grouped best_offers collection instead of re-aggregating every listing
+    cursor = best_offers.find(
+        {},
+        {"product_name": 1, "price_current": 1, "store_name": 1, "offer_count": 1, "price_spread": 1}
+    ).sort([("price_current", ASCENDING), ("_id", ASCENDING)]).limit(10) # Limit to top 10 for now
     
     best_prices = []
-    async for doc in collection.aggregate(pipeline):
+    async for doc in cursor:
         best_prices.append(BestPriceProduct(
-            product_name=doc["_id"],
-            min_price=doc["min_price"],
-            store=doc["store"]
+            product_name=doc["product_name"],
+            min_price=doc["price_current"],
+            store=doc["store_name"],
+            offer_count=doc.get("offer_count"),
+            price_spread=doc.get("price_spread")
         ))
         
-    return GlobalStats(best_prices=best_prices)
+    entry = response_cache.set(cache_key, GlobalStats(best_prices=best_prices), cache_version)
+    return cached_json_response(request, entry, hit=False)
 
 @router.get("/count", response_model=Dict[str, int])
-async def count_products(collection: AsyncIOMotorCollection = Depends(get_product_collection)):
-    count = await collection.count_documents({})
+async def count_products(
+    exact: bool = False,
+    collection: AsyncIOMotorCollection = Depends(get_product_collection)
+):
+    # The estimate comes from the collection metadata; the exact count scans
+    if exact:
+        count = await collection.count_documents({})
+    else:
+        count = await collection.estimated_document_count()
     return {"total_products": count}
 
+@router.get("/export")
+async def export_products(
+    format: str = "ndjson",
+    store: Optional[str] = None,
+    category: Optional[str] = None,
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None,
+    fields: Optional[str] = None,
+    collection: AsyncIOMotorCollection = Depends(get_product_collection)
+):
+    # Streams every matching listing in one request (instead of paging with skip),
+    # reading the cursor batch by batch so memory does not grow with the collection
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of: {', '.join(EXPORT_FORMATS)}")
+    try:
+        selected_fields = parse_fields(fields) or PRODUCT_FIELDS
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Unknown field: {e}")
+
+    cursor = export_cursor(collection, export_filter(store, category, min_price, max_price), selected_fields)
+    body = iter_csv(cursor, selected_fields) if format == "csv" else iter_ndjson(cursor)
+    return StreamingResponse(
+        body,
+        media_type=EXPORT_FORMATS[format],
+        headers={"Content-Disposition": f'attachment; filename="products.{format}"'}
+    )
+
 @router.get("/", response_model=List[Product])
 async def read_products(
-    skip: int = 0, 
-    limit: int = 20, 
+    response: Response,
+    skip: int = Query(0, ge=0),
+    limit: int = Query(20, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
     collection: AsyncIOMotorCollection = Depends(get_product_collection)
 ):
-    cursor = collection.find({}).skip(skip).limit(limit)
-    products = await cursor.to_list(length=limit)
+    # `fields` selects the returned fields (e.g. "card", see app/projection.py);
+    # the projection runs in MongoDB so unused fields never leave the database
+    try:
+        selected_fields = parse_fields(fields)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Unknown field: {e}")
+
+    # Keyset pagination: pass the X-Next-Cursor header of the previous page
+    # as `cursor` and every page costs the same. `skip` is kept for backwards compatibility.
+    sort_stage = {"_id": ASCENDING}
+    projection = product_projection(selected_fields, sort_stage)
+    if cursor:
+        try:
+            after = decode_cursor(cursor, sort_stage)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        docs_cursor = collection.find(keyset_match(sort_stage, after), projection).sort(list(sort_stage.items()))
+    else:
+        docs_cursor = collection.find({}, projection).sort(list(sort_stage.items())).skip(skip)
+
+    # Fetch one extra document to know whether there is a next page
+    products = await docs_cursor.limit(limit + 1).to_list(length=limit + 1)
+    headers = {}
+    if len(products) > limit:
+        products = products[:limit]
+        headers["X-Next-Cursor"] = encode_cursor(sort_stage, products[-1])
+
+    if selected_fields:
+        # Only the selected fields, without validating every document again
+        body = to_json(select_fields(products, selected_fields))
+        return Response(content=body, media_type="application/json", headers=headers)
+    response.headers.update(headers)
     return products
 
 @router.get("/{product_id}/history", response_model=ProductHistory)
-async def get_product_history(product_id: str, collection: AsyncIOMotorCollection = Depends(get_product_collection)):
-    # For now, we might not have historical data in the 'products' collection as it might be just current state.
-    # If the scraper stores history in a separate collection or embedded, we'd query that.
-    # Assuming for now we just return the current product as a single history point or if there's a history field.
-    # The user mentioned "price_original" and "price_current".
-    
+async def get_product_history(
+    product_id: str,
+    from_: Optional[datetime] = Query(None, alias="from"),
+    to: Optional[datetime] = None,
+    resolution: str = "daily",
+    collection: AsyncIOMotorCollection = Depends(get_product_collection),
+    history: AsyncIOMotorCollection = Depends(get_price_history_collection)
+):
+    # Points come from the price_history time-series collection (see app/services/price_history.py).
+    # daily/weekly return one point per store and bucket with min/max/avg computed by MongoDB.
+    if resolution not in RESOLUTIONS:
+        raise HTTPException(status_code=400, detail=f"resolution must be one of: {', '.join(RESOLUTIONS)}")
+
     product = await collection.find_one({"product_id": product_id})
     if not product:
         raise HTTPException(status_code=404, detail="Product not found")
-        
-    # Mocking history from current data for now, or if scraper saves history elsewhere.
-    # The user didn't specify a history collection.
-    # We'll just return the current price as a history item.
-    history_item = PriceHistoryItem(
-        date="Today", # We should probably store date in DB
-        price=product["price_current"],
-        store=product["store_name"]
-    )
+
+    points = await get_price_history(history, product_id, from_, to, resolution)
+    history_items = [PriceHistoryItem(**point) for point in points]
+
+    if not history_items and from_ is None and to is None:
+        # Nothing recorded yet: the current price is the only point we know
+        history_items.append(PriceHistoryItem(
+            date=datetime.now(timezone.utc).date().isoformat(),
+            price=product["price_current"],
+            store=product["store_name"]
+        ))
     
     return ProductHistory(
         product_id=product["product_id"],
         product_name=product["product_name"],
-        history=[history_item]
+        resolution=resolution,
+        history=history_items
     )
 
 @router.get("/{product_id}/compare", response_model=ProductComparison)
@@ -82,14 +191,15 @@ async def get_product_comparison(product_id: str, collection: AsyncIOMotorCollec
     if not product:
         raise HTTPException(status_code=404, detail="Product not found")
         
-    # Find all products with the same name
-    cursor = collection.find({"product_name": product["product_name"]})
+    # Find all listings of the same product: same canonical key, even if the
+    # store titles differ (or the same name if the key was not backfilled yet)
+    cursor = collection.find(comparison_filter(product))
     comparison_items = []
     async for doc in cursor:
         comparison_items.append(ProductComparisonItem(
             store=doc["store_name"],
             price=doc["price_current"],
-            link=doc["product_url"]
+            link=doc.get("product_url")
         ))
         
     return ProductComparison(
@@ -99,86 +209,239 @@ async def get_product_comparison(product_id: str, collection: AsyncIOMotorCollec
     )
 
 
+@router.post("/batch", response_model=ProductBatchResponse)
+async def get_products_batch(
+    request: ProductBatchRequest,
+    collection: AsyncIOMotorCollection = Depends(get_product_collection),
+    history: AsyncIOMotorCollection = Depends(get_price_history_collection)
+):
+    # Comparison (and optionally history) for many products in one round trip,
+    # e.g. for every card of a product grid page
+    product_ids = list(dict.fromkeys(request.product_ids))
+    if len(product_ids) > MAX_BATCH_SIZE:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_SIZE} product IDs per request")
+    if request.include_history and request.history_resolution not in RESOLUTIONS:
+        raise HTTPException(status_code=400, detail=f"history_resolution must be one of: {', '.join(RESOLUTIONS)}")
+
+    # One aggregation: resolve every ID, then join all listings of each product
+    pipeline = batch_pipeline(collection.name, product_ids)
+    found = {doc["_id"]: doc async for doc in collection.aggregate(pipeline)}
+
+    history_by_product: Dict[str, List[PriceHistoryItem]] = {}
+    if request.include_history and found:
+        points = await get_price_history(
+            history, list(found), request.history_from, request.history_to, request.history_resolution
+        )
+        for point in points:
+            history_by_product.setdefault(point["product_id"], []).append(PriceHistoryItem(**point))
+
+    items = []
+    for product_id in product_ids:
+        doc = found.get(product_id)
+        if not doc:
+            continue
+        items.append(ProductBatchItem(
+            product_id=product_id,
+            product_name=doc["product_name"],
+            comparison=[
+                ProductComparisonItem(
+                    store=listing["store_name"],
+                    price=listing["price_current"],
+                    link=listing.get("product_url")
+                )
+                for listing in doc["listings"]
+            ],
+            history=history_by_product.get(product_id, []) if request.include_history else None
+        ))
+
+    return ProductBatchResponse(
+        items=items,
+        not_found=[product_id for product_id in product_ids if product_id not in found]
+    )
+
+
 @router.get("/search", response_model=ProductSearchResponse)
 async def search_products(
+    request: Request,
     q: Optional[str] = None,
     min_price: Optional[float] = None,
     max_price: Optional[float] = None,
     store: Optional[str] = None,
     sort_by: Optional[str] = None,
-    page: int = 1,
-    limit: int = 20,
-    collection: AsyncIOMotorCollection = Depends(get_product_collection)
+    search_mode: str = "text",
+    page: int = Query(1, ge=1),
+    limit: int = Query(20, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+    count_mode: str = "exact",
+    best_offers: AsyncIOMotorCollection = Depends(get_best_offer_collection)
 ):
-    # 1. Match Stage (Filtering)
-    match_stage = {}
-    if q:
-        match_stage["product_name"] = {"$regex": q, "$options": "i"}
-    if min_price is not None:
-        match_stage["price_current"] = {"$gte": min_price}
-    if max_price is not None:
-        if "price_current" in match_stage:
-            match_stage["price_current"]["$lte"] = max_price
+    if count_mode not in SEARCH_COUNT_MODES:
+        raise HTTPException(status_code=400, detail=f"count_mode must be one of: {', '.join(SEARCH_COUNT_MODES)}")
+    try:
+        selected_fields = parse_fields(fields)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Unknown field: {e}")
+
+    # Identical searches are served from the response cache until the catalog changes
+    search_params = {
+        "q": q, "min_price": min_price, "max_price": max_price, "store": store,
+        "sort_by": sort_by, "search_mode": search_mode, "page": page, "limit": limit, "cursor": cursor,
+        "fields": ",".join(selected_fields) if selected_fields else None, "count_mode": count_mode,
+    }
+    cache_key = response_cache.make_key("search", search_params)
+    cached = response_cache.get(cache_key)
+    if cached:
+        return cached_json_response(request, cached, hit=True)
+    cache_version = response_cache.version
+
+    # Search runs over the best_offers collection (one document per product,
+    # see app/services/best_offers.py), so no per-request deduplication is needed.
+    # The pipeline is built in app/queries.py, shared with the query-plan check.
+    try:
+        pipeline, sort_stage, match_stage = search_pipeline(
+            q, min_price, max_price, store, sort_by, search_mode, page, limit, cursor, selected_fields
+        )
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    # 5. Counting
+    # The total only depends on the filters, so it is cached apart from the pages
+    # and counted on its own (without sorting) when missing, alongside the page query.
+    # "capped" stops counting at SEARCH_COUNT_CAP and reports has_more ("1000+").
+    count_key = response_cache.make_key("search_count", {
+        "q": q, "min_price": min_price, "max_price": max_price, "store": store,
+        "search_mode": search_mode, "count_mode": count_mode,
+    })
+    cached_count = response_cache.get(count_key)
+    if cached_count:
+        search_count = SearchCount.model_validate_json(cached_count.body)
+        with stage_duration.time(route="/products/search", stage="aggregate"):
+            products = await aggregate_tracked(best_offers, pipeline, limit + 1, "/products/search", search_params)
+    else:
+        count_pipeline = search_count_pipeline(match_stage, SEARCH_COUNT_CAP if count_mode == "capped" else None)
+        with stage_duration.time(route="/products/search", stage="aggregate"):
+            products, counted = await asyncio.gather(
+                aggregate_tracked(best_offers, pipeline, limit + 1, "/products/search", search_params),
+                aggregate_tracked(best_offers, count_pipeline, 1, "/products/search (count)", search_params),
+            )
+        total = counted[0]["total"] if counted else 0
+        if count_mode == "capped" and total > SEARCH_COUNT_CAP:
+            search_count = SearchCount(total=SEARCH_COUNT_CAP, has_more=True)
         else:
-            match_stage["price_current"] = {"$lte": max_price}
-    if store:
-        match_stage["store_name"] = store
+            search_count = SearchCount(total=total)
+        response_cache.set(count_key, search_count, cache_version)
+    total_results = search_count.total
+
+    next_cursor = None
+    if len(products) > limit:
+        products = products[:limit]
+        next_cursor = encode_cursor(sort_stage, products[-1])
+
+    total_pages = (total_results + limit - 1) // limit
+    
+    result = {
+        "total_results": total_results,
+        "total_pages": total_pages,
+        "current_page": page,
+        "limit": limit,
+        "next_cursor": next_cursor,
+        "has_more": search_count.has_more
+    }
+    with stage_duration.time(route="/products/search", stage="serialize"):
+        if selected_fields:
+            # Only the selected fields, without validating every document again
+            result["data"] = select_fields(products, selected_fields)
+            entry = response_cache.set_body(cache_key, to_json(result), cache_version)
+        else:
+            entry = response_cache.set(cache_key, ProductSearchResponse(**result, data=products), cache_version)
+    return cached_json_response(request, entry, hit=False)
+
+
+@router.get("/facets", response_model=ProductFacets)
+async def get_search_facets(
+    request: Request,
+    q: Optional[str] = None,
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None,
+    store: Optional[str] = None,
+    search_mode: str = "text",
+    price_buckets: int = Query(5, ge=1, le=20),
+    best_offers: AsyncIOMotorCollection = Depends(get_best_offer_collection)
+):
+    # Counts for the search filter sidebar, computed with the same filters as
+    # /products/search in a single aggregation and cached per filter combination
+    facet_params = {
+        "q": q, "min_price": min_price, "max_price": max_price, "store": store,
+        "search_mode": search_mode, "price_buckets": price_buckets,
+    }
+    cache_key = response_cache.make_key("facets", facet_params)
+    cached = response_cache.get(cache_key)
+    if cached:
+        return cached_json_response(request, cached, hit=True)
+    cache_version = response_cache.version
+
+    match_stage, offer_filter, offer_conditions = search_filters(q, min_price, max_price, store, search_mode)
 
     pipeline = []
     if match_stage:
         pipeline.append({"$match": match_stage})
+    if offer_conditions:
+        # Price buckets use the cheapest matching offer, like the search results
+        pipeline.append(best_matching_offer(offer_conditions))
 
-    # 2. Sort Stage (Pre-sorting for grouping)
-    # We sort BEFORE grouping so that $first in $group picks the "best" item (e.g. lowest price)
-    sort_stage = {}
-    if sort_by == "price_desc":
-        sort_stage["price_current"] = DESCENDING
-    elif sort_by == "date_desc":
-        sort_stage["_id"] = DESCENDING # Assuming _id correlates with time, or use a date field if available
-    else: # price_asc or default
-        sort_stage["price_current"] = ASCENDING
-    
-    pipeline.append({"$sort": sort_stage})
+    # A product counts once for every store that sells it (within the filters)
+    store_stages = [{"$unwind": "$offers"}]
+    if offer_filter:
+        store_stages.append({"$match": {f"offers.{field}": value for field, value in offer_filter.items()}})
+    store_stages += [
+        {"$group": {"_id": "$offers.store_name", "count": {"$sum": 1}}},
+        {"$sort": {"count": DESCENDING, "_id": ASCENDING}},
+    ]
 
-    # 3. Group Stage (Deduplication)
-    # Group by product_name to remove duplicates. Keep the first doc (best match due to sort).
     pipeline.append({
-        "$group": {
-            "_id": "$product_name",
-            "doc": {"$first": "$$ROOT"}
+        "$facet": {
+            "total": [{"$count": "total"}],
+            "stores": store_stages,
+            "categories": [
+                {"$match": {"category": {"$type": "string"}}},
+                {"$group": {"_id": "$category", "count": {"$sum": 1}}},
+                {"$sort": {"count": DESCENDING, "_id": ASCENDING}},
+            ],
+            "price_ranges": [
+                {"$match": {"price_current": {"$type": "number"}}},
+                {"$bucketAuto": {"groupBy": "$price_current", "buckets": price_buckets}},
+            ],
         }
     })
 
-    # 4. Replace Root (Restore original document structure)
-    pipeline.append({"$replaceRoot": {"newRoot": "$doc"}})
+    result = await aggregate_tracked(best_offers, pipeline, 1, "/products/facets", facet_params)
+    facets = result[0] if result else {}
 
-    # 5. Facet Stage (Pagination & Counting)
-    # Get total count of UNIQUE products and the paginated data in one go
-    pipeline.append({
-        "$facet": {
-            "metadata": [{"$count": "total"}],
-            "data": [{"$skip": (page - 1) * limit}, {"$limit": limit}]
-        }
-    })
+    total = facets.get("total") or []
+    facets_response = ProductFacets(
+        total_results=total[0]["total"] if total else 0,
+        stores=[FacetCount(value=doc["_id"], count=doc["count"]) for doc in facets.get("stores", []) if doc["_id"]],
+        categories=[FacetCount(value=doc["_id"], count=doc["count"]) for doc in facets.get("categories", [])],
+        price_ranges=[
+            PriceBucket(min_price=doc["_id"]["min"], max_price=doc["_id"]["max"], count=doc["count"])
+            for doc in facets.get("price_ranges", [])
+        ]
+    )
+    entry = response_cache.set(cache_key, facets_response, cache_version)
+    return cached_json_response(request, entry, hit=False)
 
-    # Execute Aggregation
-    result = await collection.aggregate(pipeline).to_list(length=1)
-    
-    # Parse Results
-    if result:
-        facet_data = result[0]
-        products = facet_data["data"]
-        total_results = facet_data["metadata"][0]["total"] if facet_data["metadata"] else 0
-    else:
-        products = []
-        total_results = 0
-    
-    total_pages = (total_results + limit - 1) // limit
-    
-    return ProductSearchResponse(
-        total_results=total_results,
-        total_pages=total_pages,
-        current_page=page,
-        limit=limit,
-        data=products
+
+@router.get("/suggest", response_model=SuggestResponse)
+async def suggest_products(
+    q: str,
+    limit: int = Query(8, ge=1, le=20)
+):
+    # Typeahead for the search bar, answered from the in-memory index
+    # (app/services/suggest.py) without querying MongoDB
+    if not suggest_index.ready:
+        raise HTTPException(status_code=503, detail="Suggestion index is still loading")
+    return SuggestResponse(
+        query=q,
+        suggestions=[Suggestion(product_name=name, listings=listings) for name, listings in suggest_index.lookup(q, limit)]
     )
@@ -0,0 +1,64 @@
+import asyncio
+from fastapi import APIRouter, Depends, HTTPException
+from typing import Dict, Optional
+
+from ..schemas.product import ProductHistory, GlobalStats
+from ..schemas.sheets import SheetSearchResponse
+from ..dependencies import get_sheets_service
+from ..services.sheets_service import AsyncGoogleSheetsService
+
+router = APIRouter(
+    prefix="/sheets",
+    tags=["sheets"],
+)
+
+# Every call goes through AsyncGoogleSheetsService, so a slow sheet download
+# runs in its thread pool instead of blocking the other endpoints
+SHEET_TIMEOUT_DETAIL = "Google Sheets no respondió a tiempo"
+
+@router.get("/count", response_model=Dict[str, int])
+async def count_sheet_products(sheets: AsyncGoogleSheetsService = Depends(get_sheets_service)):
+    try:
+        count = await sheets.get_product_count()
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail=SHEET_TIMEOUT_DETAIL)
+    return {"total_products": count}
+
+@router.get("/stats", response_model=GlobalStats)
+async def get_sheet_stats(sheets: AsyncGoogleSheetsService = Depends(get_sheets_service)):
+    try:
+        return await sheets.get_global_stats()
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail=SHEET_TIMEOUT_DETAIL)
+
+@router.get("/search", response_model=SheetSearchResponse)
+async def search_sheet_products(
+    q: Optional[str] = None,
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None,
+    store: Optional[str] = None,
+    sort_by: Optional[str] = None,
+    page: int = 1,
+    limit: int = 20,
+    sheets: AsyncGoogleSheetsService = Depends(get_sheets_service)
+):
+    try:
+        return await sheets.search_products(
+            q=q, min_price=min_price, max_price=max_price, store=store,
+            sort_by=sort_by, page=page, limit=limit
+        )
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail=SHEET_TIMEOUT_DETAIL)
+
+@router.get("/{product_id}/history", response_model=ProductHistory)
+async def get_sheet_product_history(
+    product_id: str,
+    sheets: AsyncGoogleSheetsService = Depends(get_sheets_service)
+):
+    try:
+        history = await sheets.get_product_history(product_id)
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail=SHEET_TIMEOUT_DETAIL)
+    if history is None:
+        raise HTTPException(status_code=404, detail="Product not found")
+    return history
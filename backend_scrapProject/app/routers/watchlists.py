@@ -0,0 +1,95 @@
+from datetime import datetime, timezone
+from typing import List, Optional
+
+from bson import ObjectId
+from bson.errors import InvalidId
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from motor.motor_asyncio import AsyncIOMotorCollection
+from pymongo import DESCENDING
+
+from ..schemas.watchlist import WatchlistRuleCreate, WatchlistRule, PriceAlert
+from ..dependencies import get_product_collection, get_watchlist_rule_collection, get_price_alert_collection
+from ..services.canonical import canonical_key
+
+router = APIRouter(
+    prefix="/watchlists",
+    tags=["watchlists"],
+)
+
+
+def _with_id(doc: dict) -> dict:
+    doc["id"] = str(doc.pop("_id"))
+    if "rule_id" in doc:
+        doc["rule_id"] = str(doc["rule_id"])
+    return doc
+
+
+@router.post("/", response_model=WatchlistRule, status_code=201)
+async def create_rule(
+    rule: WatchlistRuleCreate,
+    products: AsyncIOMotorCollection = Depends(get_product_collection),
+    rules: AsyncIOMotorCollection = Depends(get_watchlist_rule_collection)
+):
+    # Alerts are written when a price update reaches the target (see app/services/watchlists.py)
+    if bool(rule.product_id) == bool(rule.product_name):
+        raise HTTPException(status_code=400, detail="Either product_id or product_name is required")
+
+    doc = {
+        "owner": rule.owner,
+        "store_name": rule.store_name,
+        "target_price": rule.target_price,
+        "last_alert_price": None,
+        "created_at": datetime.now(timezone.utc),
+    }
+    if rule.product_id:
+        product = await products.find_one({"product_id": rule.product_id}, {"product_name": 1})
+        if not product:
+            raise HTTPException(status_code=404, detail="Product not found")
+        doc.update(product_id=rule.product_id, product_name=product["product_name"])
+    else:
+        # Matches the listings of every store, whatever their titles
+        doc.update(product_name=rule.product_name, canonical_key=canonical_key(rule.product_name))
+
+    result = await rules.insert_one(doc)
+    doc["_id"] = result.inserted_id
+    return _with_id(doc)
+
+
+@router.get("/", response_model=List[WatchlistRule])
+async def list_rules(
+    owner: str,
+    rules: AsyncIOMotorCollection = Depends(get_watchlist_rule_collection)
+):
+    cursor = rules.find({"owner": owner}).sort("created_at", DESCENDING)
+    return [_with_id(doc) async for doc in cursor]
+
+
+@router.get("/alerts", response_model=List[PriceAlert])
+async def list_alerts(
+    owner: str,
+    since: Optional[datetime] = None,
+    limit: int = Query(50, ge=1, le=500),
+    alerts: AsyncIOMotorCollection = Depends(get_price_alert_collection)
+):
+    # Newest first; `since` returns only the alerts after the last poll
+    query = {"owner": owner}
+    if since:
+        query["created_at"] = {"$gt": since}
+    cursor = alerts.find(query).sort("created_at", DESCENDING).limit(limit)
+    return [_with_id(doc) async for doc in cursor]
+
+
+@router.delete("/{rule_id}", status_code=204)
+async def delete_rule(
+    rule_id: str,
+    owner: str,
+    rules: AsyncIOMotorCollection = Depends(get_watchlist_rule_collection)
+):
+    try:
+        object_id = ObjectId(rule_id)
+    except InvalidId:
+        raise HTTPException(status_code=404, detail="Rule not found")
+    result = await rules.delete_one({"_id": object_id, "owner": owner})
+    if not result.deleted_count:
+        raise HTTPException(status_code=404, detail="Rule not found")
+    return Response(status_code=204)
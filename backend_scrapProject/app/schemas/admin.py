@@ -0,0 +1,54 @@
+from datetime import datetime
+from pydantic import BaseModel
+from typing import Any, Dict, Optional, List
+
+class QueryPlanReport(BaseModel):
+    endpoint: str
+    collection: str
+    uses_index: bool
+    covered: bool
+    indexes: List[str]
+    stages: List[str]
+    error: Optional[str] = None
+
+class QueryPlansResponse(BaseModel):
+    ok: bool
+    queries: List[QueryPlanReport]
+
+class ResponseCacheStats(BaseModel):
+    entries: int
+    size_bytes: int
+    max_bytes: int
+    ttl_seconds: float
+    version: int
+    hits: int
+    misses: int
+    evictions: int
+    hit_ratio: float
+
+class SlowQueryExplain(BaseModel):
+    stages: List[str] = []
+    indexes: List[str] = []
+    uses_index: Optional[bool] = None
+    covered: Optional[bool] = None
+    docs_examined: Optional[int] = None
+    keys_examined: Optional[int] = None
+    returned: Optional[int] = None
+    execution_ms: Optional[int] = None
+    error: Optional[str] = None
+
+class SlowQuery(BaseModel):
+    recorded_at: datetime
+    route: str
+    params: Dict[str, Any]
+    collection: str
+    duration_ms: float
+    pipeline: List[Dict[str, Any]]
+    # None until the background explain finishes
+    explain: Optional[SlowQueryExplain] = None
+
+class SlowQueryReport(BaseModel):
+    threshold_ms: float
+    max_entries: int
+    recorded: int
+    entries: List[SlowQuery]
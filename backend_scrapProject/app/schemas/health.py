@@ -0,0 +1,18 @@
+from pydantic import BaseModel
+from typing import Optional
+
+class PoolStatsReport(BaseModel):
+    open: int
+    in_use: int
+    available: int
+    max_size: int
+    min_size: int
+    checkouts: int
+    avg_checkout_wait_ms: float
+    checkout_failures: int
+
+class ReadinessResponse(BaseModel):
+    status: str
+    mongo_rtt_ms: Optional[float] = None
+    pool: PoolStatsReport
+    error: Optional[str] = None
@@ -1,5 +1,6 @@
 from pydantic import BaseModel, HttpUrl, Field
 from typing import Optional, List
+from datetime import datetime
 
 class Product(BaseModel):
     product_id: str
@@ -11,6 +12,8 @@ class Product(BaseModel):
     product_url: Optional[str] = None
     discount_percentage: Optional[float] = None
     category: Optional[str] = None
+    # Same for listings of the same product with different titles (see app/services/canonical.py)
+    canonical_key: Optional[str] = None
     
     class Config:
         from_attributes = True
@@ -20,26 +23,52 @@ class PriceHistoryItem(BaseModel):
     date: str
     price: int
     store: str
+    # Only set for daily/weekly resolutions, where price is the last one of the bucket
+    min_price: Optional[int] = None
+    max_price: Optional[int] = None
+    avg_price: Optional[float] = None
+    samples: Optional[int] = None
 
 class ProductHistory(BaseModel):
     product_id: str
     product_name: str
+    resolution: Optional[str] = None
     history: List[PriceHistoryItem]
 
 class ProductComparisonItem(BaseModel):
     store: str
     price: int
-    link: HttpUrl
+    # None for listings loaded without a link
+    link: Optional[HttpUrl] = None
 
 class ProductComparison(BaseModel):
     product_id: str
     product_name: str
     comparison: List[ProductComparisonItem]
 
+class ProductBatchRequest(BaseModel):
+    product_ids: List[str]
+    include_history: bool = False
+    history_resolution: str = "daily"
+    history_from: Optional[datetime] = None
+    history_to: Optional[datetime] = None
+
+class ProductBatchItem(BaseModel):
+    product_id: str
+    product_name: str
+    comparison: List[ProductComparisonItem]
+    history: Optional[List[PriceHistoryItem]] = None
+
+class ProductBatchResponse(BaseModel):
+    items: List[ProductBatchItem]
+    not_found: List[str]
+
 class BestPriceProduct(BaseModel):
     product_name: str
     min_price: int
     store: str
+    offer_count: Optional[int] = None
+    price_spread: Optional[int] = None
 
 class GlobalStats(BaseModel):
     best_prices: List[BestPriceProduct]
@@ -49,4 +78,34 @@ class ProductSearchResponse(BaseModel):
     total_pages: int
     current_page: int
     limit: int
-    data: List[Product]
\ No newline at end of file
+    data: List[Product]
+    next_cursor: Optional[str] = None
+    # With count_mode=capped: there are more than total_results matches ("1000+")
+    has_more: bool = False
+
+class SearchCount(BaseModel):
+    total: int
+    has_more: bool = False
+
+class FacetCount(BaseModel):
+    value: str
+    count: int
+
+class PriceBucket(BaseModel):
+    min_price: float
+    max_price: float
+    count: int
+
+class ProductFacets(BaseModel):
+    total_results: int
+    stores: List[FacetCount]
+    categories: List[FacetCount]
+    price_ranges: List[PriceBucket]
+
+class Suggestion(BaseModel):
+    product_name: str
+    listings: int
+
+class SuggestResponse(BaseModel):
+    query: str
+    suggestions: List[Suggestion]
\ No newline at end of file
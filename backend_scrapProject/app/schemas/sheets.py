@@ -0,0 +1,17 @@
+from pydantic import BaseModel
+from typing import List, Optional
+
+class SheetProduct(BaseModel):
+    product_id: str
+    store: str
+    product_name: str
+    price: int
+    link: Optional[str] = None
+    date: Optional[str] = None
+
+class SheetSearchResponse(BaseModel):
+    total_results: int
+    total_pages: int
+    current_page: int
+    limit: int
+    data: List[SheetProduct]
@@ -0,0 +1,36 @@
+from datetime import datetime
+from pydantic import BaseModel, Field
+from typing import Optional
+
+class WatchlistRuleCreate(BaseModel):
+    owner: str = Field(..., min_length=1)
+    # One of the two: a single listing, or the product at any store (by name)
+    product_id: Optional[str] = None
+    product_name: Optional[str] = None
+    store_name: Optional[str] = None
+    target_price: int = Field(..., gt=0)
+
+class WatchlistRule(BaseModel):
+    id: str
+    owner: str
+    product_id: Optional[str] = None
+    product_name: Optional[str] = None
+    canonical_key: Optional[str] = None
+    store_name: Optional[str] = None
+    target_price: int
+    last_alert_price: Optional[int] = None
+    last_alert_at: Optional[datetime] = None
+    created_at: datetime
+
+class PriceAlert(BaseModel):
+    id: str
+    rule_id: str
+    owner: str
+    product_id: Optional[str] = None
+    product_name: Optional[str] = None
+    store_name: Optional[str] = None
+    product_url: Optional[str] = None
+    price: int
+    target_price: int
+    previous_alert_price: Optional[int] = None
+    created_at: datetime
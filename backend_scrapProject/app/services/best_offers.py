@@ -0,0 +1,161 @@
+"""
+Materialized "best offer per product" collection.
+
+One document per canonical_key (see app.services.canonical), so listings of
+the same product with different titles are grouped together, with the
+cheapest listing promoted to the top level (so it validates as a `Product`,
+product_name included) plus:
+
+    offers        cheapest listing per store, sorted by price, each with its own title
+    all_names     every title the product is listed with (text searched, see app/indexes.py)
+    offer_count   number of priced listings
+    store_count   number of stores selling it
+    max_price     most expensive listing
+    price_spread  max_price - price_current
+    refreshed_at  when the document was last recomputed
+
+Listings written before canonical_key existed are grouped by their exact
+product_name until `python -m app.services.canonical` fills it in.
+
+It is recomputed per product name by `refresh_best_offers`, which ingestion
+code (or the change stream watcher in app.services.change_feed) calls after
+writing listings. Run this module to rebuild it from scratch:
+
+    python -m app.services.best_offers
+"""
+import asyncio
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional
+
+from motor.motor_asyncio import AsyncIOMotorCollection
+
+from .canonical import canonical_keys
+
+# Listing fields copied into each offer
+OFFER_FIELDS = [
+    "product_id",
+    "product_name",
+    "store_name",
+    "price_current",
+    "price_original",
+    "discount_percentage",
+    "product_url",
+    "image_url",
+]
+
+# Keeps the $in lists of incremental refreshes at a reasonable size
+REFRESH_CHUNK_SIZE = 1000
+
+
+def best_offers_pipeline(into: str, refreshed_at: datetime, match: Optional[Dict] = None) -> List[Dict]:
+    """
+    Aggregation over the products collection that writes the best offer
+    documents of the matched listings into the `into` collection.
+    """
+    pipeline = []
+    if match:
+        pipeline.append({"$match": match})
+
+    pipeline += [
+        # Listings without a price cannot be the best offer
+        {"$match": {"product_name": {"$type": "string"}, "price_current": {"$type": "number"}}},
+        {"$sort": {"canonical_key": 1, "price_current": 1}},
+        # Cheapest listing per product and store
+        {"$group": {
+            "_id": {
+                "canonical_key": {"$ifNull": ["$canonical_key", "$product_name"]},
+                "store_name": "$store_name",
+            },
+            "offer": {"$first": {field: f"${field}" for field in OFFER_FIELDS}},
+            "category": {"$first": "$category"},
+            "listings": {"$sum": 1},
+            "max_price": {"$max": "$price_current"},
+            "names": {"$addToSet": "$product_name"},
+        }},
+        {"$sort": {"offer.price_current": 1}},
+        # One document per product, offers ordered by price
+        {"$group": {
+            "_id": "$_id.canonical_key",
+            "offers": {"$push": "$offer"},
+            "category": {"$first": "$category"},
+            "offer_count": {"$sum": "$listings"},
+            "max_price": {"$max": "$max_price"},
+            "names": {"$push": "$names"},
+        }},
+        {"$replaceWith": {"$mergeObjects": [
+            {"$first": "$offers"},
+            {
+                "canonical_key": "$_id",
+                "category": "$category",
+                "offers": "$offers",
+                # Titles of every store, not only the cheapest one at the top level
+                "all_names": {"$reduce": {"input": "$names", "initialValue": [], "in": {"$setUnion": ["$$value", "$$this"]}}},
+                "offer_count": "$offer_count",
+                "store_count": {"$size": "$offers"},
+                "max_price": "$max_price",
+                "price_spread": {"$subtract": ["$max_price", {"$first": "$offers.price_current"}]},
+                "refreshed_at": refreshed_at,
+            },
+        ]}},
+        # Keeps the existing _id of each product, so it stays stable across refreshes
+        {"$merge": {
+            "into": into,
+            "on": "canonical_key",
+            "whenMatched": "replace",
+            "whenNotMatched": "insert",
+        }},
+    ]
+    return pipeline
+
+
+async def refresh_best_offers(
+    products: AsyncIOMotorCollection,
+    best_offers: AsyncIOMotorCollection,
+    names: Optional[Iterable[str]] = None,
+):
+    """
+    Recomputes the best offer documents for the given product names, or for
+    the whole catalog when `names` is None. Products that no longer have
+    priced listings are removed.
+    """
+    if names is None:
+        await _refresh(products, best_offers, None)
+        return
+
+    names = list(names)
+    for start in range(0, len(names), REFRESH_CHUNK_SIZE):
+        await _refresh(products, best_offers, names[start:start + REFRESH_CHUNK_SIZE])
+
+
+async def _refresh(products, best_offers, names: Optional[List[str]]):
+    refreshed_at = datetime.now(timezone.utc)
+    match = None
+    if names is not None:
+        # Every listing grouped with these names: same canonical key, or same
+        # name for listings that do not have a key yet
+        keys = canonical_keys(names)
+        match = {"$or": [{"canonical_key": {"$in": keys}}, {"product_name": {"$in": names}}]}
+
+    await products.aggregate(best_offers_pipeline(best_offers.name, refreshed_at, match)).to_list(length=None)
+
+    # Anything in scope that was not rewritten lost all its listings
+    stale = {"refreshed_at": {"$lt": refreshed_at}}
+    if names is not None:
+        stale["$or"] = [{"canonical_key": {"$in": keys + names}}, {"product_name": {"$in": names}}]
+    await best_offers.delete_many(stale)
+
+
+async def _rebuild():
+    from ..database import mongo_db, products_collection, best_offers_collection
+    from ..indexes import ensure_indexes
+
+    best_offers = best_offers_collection()
+    # $merge needs the unique index on canonical_key
+    await ensure_indexes(mongo_db())
+    await refresh_best_offers(products_collection(), best_offers)
+    count = await best_offers.count_documents({})
+    print(f"best_offers reconstruida: {count} productos")
+
+
+if __name__ == "__main__":
+    asyncio.run(_rebuild())
@@ -0,0 +1,126 @@
+"""
+Canonical product keys: the same product listed with slightly different
+titles by different stores gets the same `canonical_key`.
+
+    "Placa de Video ASUS Dual GeForce RTX 4060 8GB"  -> "4060 8 asus dual gb geforce rtx"
+    "ASUS DUAL RTX4060 8 GB GeForce"                 -> "4060 8 asus dual gb geforce rtx"
+
+The key is computed when listings are written (app.services.ingestion and
+the change feed listener in app.main) and stored, indexed, on each product;
+/compare and the best_offers grouping read it instead of the exact name.
+Run this module to compute it for existing documents and rebuild best_offers:
+
+    python -m app.services.canonical
+"""
+import asyncio
+import re
+import unicodedata
+from typing import Iterable, List, Optional
+
+from motor.motor_asyncio import AsyncIOMotorCollection
+from pymongo import UpdateOne, UpdateMany
+
+# Letters and digits are separate tokens, which pulls model numbers out of the
+# words they are glued to: "RTX4060" and "RTX 4060", "8GB" and "8 GB",
+# "i5-13400F" and "i5 13400F" all give the same tokens
+_TOKEN_RE = re.compile(r"[a-z]+|[0-9]+")
+
+# Words that do not tell two products apart
+STOPWORDS = {
+    "de", "del", "la", "el", "los", "las", "y", "con", "para", "en", "por",
+    "placa", "tarjeta", "video", "grafica", "nuevo", "nueva", "original", "oferta",
+}
+
+BACKFILL_BATCH_SIZE = 1000
+
+
+def normalize_text(text: str) -> str:
+    """
+    Lowercase, without accents and with single spaces.
+    """
+    text = unicodedata.normalize("NFKD", text.lower())
+    text = "".join(char for char in text if not unicodedata.combining(char))
+    return " ".join(text.split())
+
+
+def canonical_key(product_name: str) -> str:
+    """
+    Sorted distinct tokens of the normalized name, without stopwords.
+    """
+    tokens = {token for token in _TOKEN_RE.findall(normalize_text(product_name)) if token not in STOPWORDS}
+    if not tokens:
+        # Nothing left (e.g. only stopwords): fall back to the normalized name
+        return normalize_text(product_name)
+    return " ".join(sorted(tokens))
+
+
+def canonical_keys(product_names: Iterable[str]) -> List[str]:
+    return sorted({canonical_key(name) for name in product_names})
+
+
+async def assign_canonical_keys(products: AsyncIOMotorCollection, names: Optional[Iterable[str]]) -> int:
+    """
+    Sets canonical_key on the listings with the given names that do not have
+    the right one yet (e.g. written by the scrapers). Returns the number of
+    updated listings.
+    """
+    if names is None:
+        return 0
+    operations = [
+        UpdateMany({"product_name": name, "canonical_key": {"$ne": key}}, {"$set": {"canonical_key": key}})
+        for name, key in ((name, canonical_key(name)) for name in names)
+    ]
+    if not operations:
+        return 0
+    result = await products.bulk_write(operations, ordered=False)
+    return result.modified_count
+
+
+async def assign_missing_canonical_keys(products: AsyncIOMotorCollection) -> int:
+    """
+    Sets canonical_key on every listing that does not have one yet.
+    """
+    names = await products.distinct("product_name", {"canonical_key": None, "product_name": {"$type": "string"}})
+    return await assign_canonical_keys(products, names)
+
+
+async def backfill_canonical_keys(products: AsyncIOMotorCollection, batch_size: int = BACKFILL_BATCH_SIZE) -> int:
+    """
+    Computes canonical_key for every listing and writes the ones that are
+    missing or outdated, `batch_size` at a time. Returns the number of updated listings.
+    """
+    updated = 0
+    operations: List[UpdateOne] = []
+    cursor = products.find(
+        {"product_name": {"$type": "string"}},
+        {"product_name": 1, "canonical_key": 1},
+        batch_size=batch_size,
+    )
+    async for doc in cursor:
+        key = canonical_key(doc["product_name"])
+        if doc.get("canonical_key") != key:
+            operations.append(UpdateOne({"_id": doc["_id"]}, {"$set": {"canonical_key": key}}))
+        if len(operations) >= batch_size:
+            updated += (await products.bulk_write(operations, ordered=False)).modified_count
+            operations = []
+    if operations:
+        updated += (await products.bulk_write(operations, ordered=False)).modified_count
+    return updated
+
+
+async def _backfill():
+    from ..database import mongo_db, products_collection, best_offers_collection
+    from ..indexes import ensure_indexes
+    from .best_offers import refresh_best_offers
+
+    collection, best_offers = products_collection(), best_offers_collection()
+    await ensure_indexes(mongo_db())
+    updated = await backfill_canonical_keys(collection)
+    print(f"canonical_key actualizada en {updated} productos")
+    await refresh_best_offers(collection, best_offers)
+    count = await best_offers.count_documents({})
+    print(f"best_offers reconstruida: {count} productos")
+
+
+if __name__ == "__main__":
+    asyncio.run(_backfill())
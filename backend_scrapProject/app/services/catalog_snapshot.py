@@ -0,0 +1,456 @@
+"""
+Snapshot del catálogo de Google Sheets compartido entre los workers de
+uvicorn (se activa con CATALOG_SNAPSHOT_PATH).
+
+Sin él cada worker descarga la hoja y arma su propia copia (SheetIndexes),
+que además vence en un momento distinto en cada uno. Con él:
+- un solo worker, el que toma el flock de `<path>.lock`, descarga la hoja
+  cada SNAPSHOT_TTL y escribe el catálogo en un archivo compacto de sólo
+  lectura;
+- el archivo nuevo se escribe aparte y se reemplaza con os.replace: el cambio
+  de versión es atómico y quien tenga mapeada la anterior la sigue leyendo;
+- todos los workers (incluido el que escribe) lo mapean con mmap. Precios,
+  códigos, órdenes y el agrupado por product_id son arrays de numpy sobre el
+  mapeo, sin copias, y el sistema operativo comparte esas páginas entre los
+  procesos. Sólo se decodifican a dicts las filas que se devuelven.
+
+Si el worker que escribe muere, el lock se libera y otro worker toma su
+lugar. Requiere fcntl (Linux/Mac).
+
+Formato del archivo (little endian, secciones alineadas a 8 bytes):
+
+    MAGIC | largo del header (uint32) | header JSON | secciones
+
+El header tiene la cantidad de filas, la fecha de armado y el (offset,
+cantidad) de cada sección:
+- records: un RECORD por producto, en el orden de la hoja
+- price_asc / price_desc / newest: permutaciones de filas de search_products
+- by_id / by_id_starts: filas agrupadas por product_id y ordenadas por fecha
+- best_prices: un BEST_PRICE por nombre de producto (get_global_stats)
+- tablas de strings (ids, names, stores, links, dates): offsets uint64 más
+  los textos en UTF-8. ids y dates están ordenadas, así los códigos se
+  comparan igual que los textos.
+"""
+import fcntl
+import json
+import mmap
+import os
+import tempfile
+import threading
+import time
+from bisect import bisect_left
+from collections.abc import Sequence
+from functools import cached_property
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from .sheets_service import SNAPSHOT_TTL, GoogleSheetsService, SheetIndexes, parse_price
+
+MAGIC = b"CATSNAP1"
+FORMAT_VERSION = 1
+RECORD = np.dtype([
+    ("price", "<i8"),
+    ("id", "<u4"),
+    ("name", "<u4"),
+    ("store", "<u4"),
+    ("link", "<u4"),
+    ("date", "<u4"),
+])
+BEST_PRICE = np.dtype([("name", "<u4"), ("price", "<i8"), ("store", "<u4")])
+STRING_TABLES = ("ids", "names", "stores", "links", "dates")
+SORT_ORDERS = ("price_asc", "price_desc", "newest")
+
+# How often readers look for a newer version of the file
+SNAPSHOT_CHECK_INTERVAL = float(os.getenv("CATALOG_SNAPSHOT_CHECK_INTERVAL", "1"))
+# How long a request waits for the first version before serving an empty catalog
+SNAPSHOT_WAIT = float(os.getenv("CATALOG_SNAPSHOT_WAIT", "30"))
+
+
+def _align(offset: int) -> int:
+    return (offset + 7) & ~7
+
+
+def _string_table(values) -> Dict[str, bytes]:
+    encoded = [str(value).encode() for value in values]
+    offsets = np.zeros(len(encoded) + 1, dtype="<u8")
+    np.cumsum([len(value) for value in encoded], out=offsets[1:])
+    return {"offsets": offsets.tobytes(), "blob": b"".join(encoded)}
+
+
+def build_snapshot(products: List[Dict[str, any]]) -> bytes:
+    """
+    Serializa los productos (filas de parse_row) en el formato del snapshot.
+    """
+    indexes = SheetIndexes(products, parse_price)
+    frame = indexes.frame
+    ids, id_codes = np.unique(
+        np.array([str(p.get('product_id')) for p in products], dtype=object), return_inverse=True
+    )
+    date_codes, dates = pd.factorize(frame['date'].astype(str), sort=True)
+    link_codes, links = pd.factorize(pd.Series([str(p.get('link') or '') for p in products], dtype=object))
+    names = frame['product_name'].cat.categories
+    stores = frame['store'].cat.categories
+
+    records = np.zeros(len(products), dtype=RECORD)
+    records["price"] = indexes.prices
+    records["id"] = id_codes
+    records["name"] = indexes.name_codes
+    records["store"] = indexes.store_codes
+    records["link"] = link_codes
+    records["date"] = date_codes
+
+    # Stable: rows of the same product and date keep the sheet order, like SheetIndexes.by_id
+    by_id = np.lexsort((date_codes, id_codes)).astype("<u4")
+    by_id_starts = np.searchsorted(id_codes[by_id], np.arange(len(ids) + 1)).astype("<u4")
+
+    best_prices = np.zeros(len(indexes.best_prices), dtype=BEST_PRICE)
+    best_prices["name"] = names.get_indexer([str(item["product_name"]) for item in indexes.best_prices])
+    best_prices["price"] = [item["min_price"] for item in indexes.best_prices]
+    best_prices["store"] = stores.get_indexer([str(item["store"]) for item in indexes.best_prices])
+
+    sections = {
+        "records": records.tobytes(),
+        **{name: indexes.sort_orders[name].astype("<u4").tobytes() for name in SORT_ORDERS},
+        "by_id": by_id.tobytes(),
+        "by_id_starts": by_id_starts.tobytes(),
+        "best_prices": best_prices.tobytes(),
+    }
+    for table, values in zip(STRING_TABLES, (ids, names, stores, links, dates)):
+        for part, data in _string_table(values).items():
+            sections[f"{table}_{part}"] = data
+
+    layout = {}
+    offset = 0
+    for name, data in sections.items():
+        layout[name] = [offset, len(data)]
+        offset = _align(offset + len(data))
+    header = json.dumps({
+        "format": FORMAT_VERSION,
+        "rows": len(products),
+        "built_at": time.time(),
+        "sections": layout,
+    }).encode()
+
+    start = _align(len(MAGIC) + 4 + len(header))
+    buffer = bytearray(start + offset)
+    buffer[:len(MAGIC)] = MAGIC
+    buffer[len(MAGIC):len(MAGIC) + 4] = len(header).to_bytes(4, "little")
+    buffer[len(MAGIC) + 4:len(MAGIC) + 4 + len(header)] = header
+    for name, data in sections.items():
+        position = start + layout[name][0]
+        buffer[position:position + len(data)] = data
+    return bytes(buffer)
+
+
+def write_snapshot(path: str, products: List[Dict[str, any]]):
+    """
+    Escribe una nueva versión del snapshot en `path`. Se escribe en un archivo
+    temporal del mismo directorio y se reemplaza de una vez, así nadie lee
+    un archivo a medio escribir.
+    """
+    data = build_snapshot(products)
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), prefix=".catalog-", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as file:
+            file.write(data)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.unlink(temp_path)
+        raise
+
+
+class _Strings(Sequence):
+    # One string table of the file, decoded only when an item is read
+    def __init__(self, buffer, offsets: np.ndarray, start: int):
+        self._buffer = buffer
+        self._offsets = offsets
+        self._start = start
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    def __getitem__(self, index: int) -> str:
+        begin = self._start + int(self._offsets[index])
+        end = self._start + int(self._offsets[index + 1])
+        return self._buffer[begin:end].decode()
+
+
+class _Rows(Sequence):
+    # The products in the sheet order, as the dicts of parse_row
+    def __init__(self, catalog: "MappedCatalog"):
+        self._catalog = catalog
+
+    def __len__(self) -> int:
+        return self._catalog.rows
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self._catalog.row(i) for i in range(*index.indices(len(self)))]
+        if not -len(self) <= index < len(self):
+            raise IndexError(index)
+        return self._catalog.row(int(index) % len(self))
+
+
+class _RowsById:
+    # Read-only stand-in for SheetIndexes.by_id
+    def __init__(self, catalog: "MappedCatalog"):
+        self._catalog = catalog
+
+    def get(self, product_id: str, default=None) -> Optional[List[Dict[str, any]]]:
+        catalog = self._catalog
+        code = bisect_left(catalog.ids, product_id)
+        if code == len(catalog.ids) or catalog.ids[code] != product_id:
+            return default
+        rows = catalog.by_id_rows[catalog.by_id_starts[code]:catalog.by_id_starts[code + 1]]
+        return [catalog.row(int(i)) for i in rows]
+
+
+class MappedCatalog:
+    """
+    Una versión del snapshot mapeada en memoria, con la misma interfaz que
+    SheetIndexes (source, by_id, best_prices, prices, name_codes, store_codes,
+    name_keys, store_keys, sort_orders).
+
+    El mapeo se libera cuando no queda ninguna referencia a la versión, así
+    los requests que la estaban usando terminan con ella aunque ya haya una
+    nueva.
+    """
+
+    def __init__(self, path: str):
+        with open(path, "rb") as file:
+            stat = os.fstat(file.fileno())
+            self._map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        # A new version is always a new file (os.replace), so a new inode
+        self.identity = (stat.st_dev, stat.st_ino)
+        if self._map[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"{path} no es un snapshot del catálogo")
+        header_length = int.from_bytes(self._map[len(MAGIC):len(MAGIC) + 4], "little")
+        header = json.loads(self._map[len(MAGIC) + 4:len(MAGIC) + 4 + header_length])
+        if header["format"] != FORMAT_VERSION:
+            raise ValueError(f"{path} tiene un formato de snapshot desconocido ({header['format']})")
+        self.rows: int = header["rows"]
+        self.built_at: float = header["built_at"]
+        self._start = _align(len(MAGIC) + 4 + header_length)
+        self._sections = header["sections"]
+
+        self.records = self._array("records", RECORD)
+        self.sort_orders = {name: self._array(name, "<u4") for name in SORT_ORDERS}
+        self.by_id_rows = self._array("by_id", "<u4")
+        self.by_id_starts = self._array("by_id_starts", "<u4")
+        self.ids, self.names, self.stores, self.links, self.dates = (self._strings(table) for table in STRING_TABLES)
+
+        self.source = _Rows(self)
+        self.by_id = _RowsById(self)
+
+    def _array(self, section: str, dtype) -> np.ndarray:
+        # A view on the mapped file, not a copy
+        offset, length = self._sections[section]
+        dtype = np.dtype(dtype)
+        return np.frombuffer(self._map, dtype=dtype, count=length // dtype.itemsize, offset=self._start + offset)
+
+    def _strings(self, table: str) -> _Strings:
+        offset = self._sections[f"{table}_blob"][0]
+        return _Strings(self._map, self._array(f"{table}_offsets", "<u8"), self._start + offset)
+
+    @property
+    def prices(self) -> np.ndarray:
+        return self.records["price"]
+
+    @property
+    def name_codes(self) -> np.ndarray:
+        return self.records["name"]
+
+    @property
+    def store_codes(self) -> np.ndarray:
+        return self.records["store"]
+
+    @cached_property
+    def name_keys(self) -> pd.Index:
+        # Distinct names only, so a per-worker copy is small next to the rows
+        return pd.Index([name.lower() for name in self.names], dtype=object)
+
+    @cached_property
+    def store_keys(self) -> pd.Index:
+        return pd.Index([store.lower() for store in self.stores], dtype=object)
+
+    @cached_property
+    def best_prices(self) -> List[Dict[str, any]]:
+        return [
+            {
+                "product_name": self.names[int(item["name"])],
+                "min_price": int(item["price"]),
+                "store": self.stores[int(item["store"])],
+            }
+            for item in self._array("best_prices", BEST_PRICE)
+        ]
+
+    def row(self, index: int) -> Dict[str, any]:
+        record = self.records[index]
+        return {
+            "product_id": self.ids[int(record["id"])],
+            "store": self.stores[int(record["store"])],
+            "product_name": self.names[int(record["name"])],
+            "price": int(record["price"]),
+            "link": self.links[int(record["link"])],
+            "date": self.dates[int(record["date"])],
+        }
+
+
+class CatalogSnapshotStore:
+    """
+    Acceso de un worker al archivo del snapshot: mapea la versión vigente y
+    toma el rol de escritor si nadie lo tiene.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.modified_at = 0.0 # mtime of the file at the last check
+        self._current: Optional[MappedCatalog] = None
+        self._checked_at = float("-inf")
+        self._lock = threading.Lock()
+        self._writer_lock_file = None
+
+    def current(self, force: bool = False) -> Optional[MappedCatalog]:
+        """
+        La versión mapeada, cambiada por la nueva si el archivo se reemplazó.
+        El archivo se revisa a lo sumo cada SNAPSHOT_CHECK_INTERVAL, salvo con `force`.
+        """
+        if not force and time.monotonic() - self._checked_at < SNAPSHOT_CHECK_INTERVAL:
+            return self._current
+        with self._lock:
+            self._checked_at = time.monotonic()
+            try:
+                stat = os.stat(self.path)
+            except FileNotFoundError:
+                return self._current
+            if self._current is None or self._current.identity != (stat.st_dev, stat.st_ino):
+                try:
+                    self._current = MappedCatalog(self.path)
+                except (OSError, ValueError) as e:
+                    # Keep serving the version already mapped
+                    print(f"Error al mapear el snapshot del catálogo: {e}")
+            self.modified_at = stat.st_mtime
+        return self._current
+
+    def age(self) -> float:
+        """
+        Segundos desde que el escritor actualizó o confirmó el snapshot.
+        """
+        return time.time() - self.modified_at
+
+    def acquire_writer(self) -> bool:
+        """
+        Intenta tomar el rol de escritor (sin esperar). El lock dura lo que el
+        proceso, y el sistema operativo lo libera si el proceso muere.
+        """
+        if self._writer_lock_file is not None:
+            return True
+        lock_file = open(self.path + ".lock", "a")
+        try:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            lock_file.close()
+            return False
+        self._writer_lock_file = lock_file
+        return True
+
+    def publish(self, products: List[Dict[str, any]]):
+        write_snapshot(self.path, products)
+
+    def touch(self):
+        # Same data: mark it as current without making readers map it again
+        os.utime(self.path)
+
+
+class SharedSheetsService(GoogleSheetsService):
+    """
+    GoogleSheetsService que lee el catálogo del snapshot compartido en lugar
+    de una copia propia. El worker escritor además descarga la hoja (con la
+    actualización incremental de GoogleSheetsService) y publica cada versión.
+    """
+
+    def __init__(
+        self,
+        credentials_path: Optional[str] = None,
+        spreadsheet_name: Optional[str] = None,
+        sheet_name: Optional[str] = None,
+        *,
+        snapshot_path: str,
+        sheet=None,
+    ):
+        super().__init__(credentials_path, spreadsheet_name, sheet_name, sheet=sheet)
+        self.store = CatalogSnapshotStore(snapshot_path)
+        self._refresher: Optional[threading.Thread] = None
+        self._writer_checked_at = float("-inf")
+        self._published: Optional[List[Dict[str, any]]] = None
+
+    def get_all_products(self) -> Sequence:
+        return self.get_indexes().source
+
+    def get_indexes(self):
+        """
+        La versión vigente del snapshot. Si todavía no hay ninguna, espera
+        hasta SNAPSHOT_WAIT a que el escritor publique la primera.
+        """
+        self._start_refresher()
+        catalog = self.store.current()
+        if catalog is None:
+            self.snapshot_misses += 1
+            catalog = self._wait_for_snapshot()
+            return catalog if catalog is not None else SheetIndexes([], self._parse_price)
+        # The writer rewrites or touches the file every SNAPSHOT_TTL
+        if self.store.age() > 2 * SNAPSHOT_TTL:
+            self.snapshot_stale_hits += 1
+        else:
+            self.snapshot_hits += 1
+        return catalog
+
+    def _wait_for_snapshot(self) -> Optional[MappedCatalog]:
+        deadline = time.monotonic() + SNAPSHOT_WAIT
+        while time.monotonic() < deadline:
+            catalog = self.store.current(force=True)
+            if catalog is not None:
+                return catalog
+            time.sleep(0.1)
+            self._start_refresher()
+        return None
+
+    def _start_refresher(self):
+        # Non-writers retry now and then, to take over if the writer died
+        if self._refresher is not None or time.monotonic() - self._writer_checked_at < SNAPSHOT_CHECK_INTERVAL:
+            return
+        with self._state_lock:
+            if self._refresher is not None:
+                return
+            self._writer_checked_at = time.monotonic()
+            if not self.store.acquire_writer():
+                return
+            self._refresher = threading.Thread(target=self._refresh_loop, name="catalog-snapshot", daemon=True)
+            self._refresher.start()
+
+    def _refresh_loop(self):
+        while True:
+            try:
+                self.publish()
+            except Exception as e:
+                print(f"Error al publicar el snapshot del catálogo: {e}")
+            time.sleep(SNAPSHOT_TTL)
+
+    def publish(self):
+        """
+        Actualiza la hoja y publica una nueva versión del snapshot, o sólo
+        marca la actual como vigente si la hoja no cambió.
+        """
+        with self._load_lock:
+            self.refresh()
+        products = self._snapshot
+        if products is self._published and os.path.exists(self.store.path):
+            self.store.touch()
+            return
+        self.store.publish(products)
+        self._published = products
@@ -0,0 +1,184 @@
+import asyncio
+import os
+from typing import Awaitable, Callable, List, Optional, Set
+
+from motor.motor_asyncio import AsyncIOMotorCollection, AsyncIOMotorDatabase
+from pymongo.errors import PyMongoError
+
+from .lease import Lease
+
+# A listener receives the product names touched by a write.
+# None means "anything may have changed" (e.g. a delete without pre-image).
+ProductsChangedListener = Callable[[Optional[Set[str]]], Awaitable[None]]
+
+_listeners: List[ProductsChangedListener] = []
+# Listeners that write to MongoDB, run by the holder of the change feed lease only
+_shared_listeners: List[ProductsChangedListener] = []
+_lease: Optional[Lease] = None
+
+# While the change stream is unavailable, listeners are resynced this often (seconds)
+RESYNC_INTERVAL = float(os.getenv("CHANGE_STREAM_RESYNC_INTERVAL", "300"))
+# InvalidResumeToken, ChangeStreamFatalError and ChangeStreamHistoryLost
+RESUME_ERROR_CODES = {260, 280, 286}
+# Fields the listeners themselves write back into products (see
+# assign_changed_canonical_keys). Updates touching only these are not changes.
+DERIVED_FIELDS = {"canonical_key"}
+
+
+def on_products_changed(listener: ProductsChangedListener) -> ProductsChangedListener:
+    """
+    Registers a coroutine to be called after products are written, in every
+    worker (for state kept in memory, like the typeahead index).
+    """
+    _listeners.append(listener)
+    return listener
+
+
+def on_products_changed_once(listener: ProductsChangedListener) -> ProductsChangedListener:
+    """
+    Registers a coroutine to be called after products are written, in a
+    single worker: the one holding the lease set with set_lease. For
+    listeners that write to MongoDB, which must not run once per worker.
+    """
+    _shared_listeners.append(listener)
+    return listener
+
+
+def set_lease(lease: Optional[Lease]):
+    global _lease
+    _lease = lease
+
+
+def is_leader() -> bool:
+    # Without a lease (tests, scripts) this process is the only one
+    return _lease is None or _lease.held
+
+
+async def notify_products_changed(names: Optional[Set[str]]):
+    """
+    Called by ingestion code (or the change stream watcher) after writing products.
+    Shared listeners run first, so the in-memory ones see their writes.
+    """
+    listeners = (_shared_listeners if is_leader() else []) + _listeners
+    for listener in listeners:
+        try:
+            await listener(names)
+        except Exception as e:
+            print(f"Error en listener de cambios de productos: {e}")
+
+
+async def enable_pre_images(db: AsyncIOMotorDatabase, collection_name: str) -> bool:
+    """
+    Makes the change stream of the collection carry the document before each
+    change (MongoDB 6.0+), so a delete says which product it removed. Without
+    it a delete means "anything may have changed" and every listener
+    recomputes everything.
+    """
+    try:
+        await db.command({"collMod": collection_name, "changeStreamPreAndPostImages": {"enabled": True}})
+    except PyMongoError as e:
+        print(f"Sin pre-images en el change stream de {collection_name}: {e}")
+        return False
+    return True
+
+
+def _names_from_event(event: dict) -> Optional[Set[str]]:
+    names = set()
+    for key in ("fullDocument", "fullDocumentBeforeChange"):
+        doc = event.get(key)
+        if doc and doc.get("product_name"):
+            names.add(doc["product_name"])
+    if not names:
+        # Deletes only carry the _id unless pre-images are enabled (see enable_pre_images)
+        return None
+    return names
+
+
+def _is_derived_update(event: dict) -> bool:
+    # Without this, the canonical_key written by a listener would come back
+    # as a new change and run every listener (price history, best_offers) twice
+    if event.get("operationType") != "update":
+        return False
+    description = event.get("updateDescription") or {}
+    updated = set(description.get("updatedFields") or {})
+    return bool(updated) and updated <= DERIVED_FIELDS and not description.get("removedFields")
+
+
+async def _next_batch(stream, batch_window: float, max_batch: int) -> Optional[Set[str]]:
+    """
+    Waits for the next change, then keeps collecting for `batch_window`
+    seconds (or until `max_batch` names) and returns the names touched.
+    """
+    loop = asyncio.get_running_loop()
+    # Block until something changes, then collect for batch_window seconds
+    event = await stream.next()
+    while _is_derived_update(event):
+        event = await stream.next()
+    pending = _names_from_event(event)
+    deadline = loop.time() + batch_window
+    while loop.time() < deadline and (pending is None or len(pending) < max_batch):
+        event = await stream.try_next()
+        if event is None:
+            await asyncio.sleep(0.1)
+            continue
+        if _is_derived_update(event):
+            continue
+        names = _names_from_event(event)
+        pending = None if names is None or pending is None else pending | names
+    return pending
+
+
+async def watch_products(
+    collection: AsyncIOMotorCollection,
+    batch_window: float = 1.0,
+    max_batch: int = 1000,
+    resync: Optional[Callable[[], Awaitable[None]]] = None,
+    resync_interval: float = RESYNC_INTERVAL,
+    retry_delay: float = 1.0,
+    max_retry_delay: float = 60.0,
+    notify: ProductsChangedListener = notify_products_changed,
+):
+    """
+    Follows the products change stream and notifies listeners in batches,
+    so a scraper run that writes thousands of listings triggers a few
+    refreshes instead of one per document. `notify` replaces the
+    registered listeners, e.g. to follow another collection.
+
+    Change streams need a replica set. When the stream cannot be opened (a
+    standalone mongod) or breaks (a failover), it is retried with
+    exponential backoff up to `max_retry_delay`, resuming after the last
+    notified change. Meanwhile `resync` runs every `resync_interval`
+    seconds, so the collections derived from products do not go stale; it
+    also runs when the missed changes cannot be resumed.
+    """
+    loop = asyncio.get_running_loop()
+    resume_token = None
+    delay = retry_delay
+    next_resync = loop.time()
+    while True:
+        try:
+            async with collection.watch(
+                full_document="updateLookup",
+                full_document_before_change="whenAvailable",
+                resume_after=resume_token,
+            ) as stream:
+                delay = retry_delay
+                while stream.alive:
+                    names = await _next_batch(stream, batch_window, max_batch)
+                    await notify(names)
+                    resume_token = stream.resume_token
+        except PyMongoError as e:
+            print(f"Change stream de {collection.name} no disponible, reintento en {delay:.0f} s: {e}")
+            if resume_token is not None and getattr(e, "code", None) in RESUME_ERROR_CODES:
+                # The changes since the token are gone from the oplog
+                resume_token = None
+                next_resync = loop.time()
+
+        if resync is not None and loop.time() >= next_resync:
+            try:
+                await resync()
+            except Exception as e:
+                print(f"Error al resincronizar los productos: {e}")
+            next_resync = loop.time() + resync_interval
+        await asyncio.sleep(delay)
+        delay = min(delay * 2, max_retry_delay)
@@ -0,0 +1,77 @@
+"""
+Streaming export of the products collection as NDJSON or CSV.
+
+Documents are read from a Motor cursor in batches of EXPORT_BATCH_SIZE and
+written out one batch at a time, so memory stays flat no matter how large
+the collection is.
+"""
+import csv
+import io
+import os
+from typing import AsyncIterator, Dict, List, Optional
+
+from motor.motor_asyncio import AsyncIOMotorCollection
+from pydantic_core import to_json
+
+EXPORT_FORMATS = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+
+# Documents per round trip to MongoDB, and per chunk written to the client
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "2000"))
+
+
+def export_filter(
+    store: Optional[str] = None,
+    category: Optional[str] = None,
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None,
+) -> Dict:
+    match: Dict = {}
+    if store:
+        match["store_name"] = store
+    if category:
+        match["category"] = category
+    if min_price is not None:
+        match["price_current"] = {"$gte": min_price}
+    if max_price is not None:
+        match.setdefault("price_current", {})["$lte"] = max_price
+    return match
+
+
+def export_cursor(collection: AsyncIOMotorCollection, match: Dict, fields: List[str], batch_size: int = EXPORT_BATCH_SIZE):
+    projection = {field: 1 for field in fields}
+    projection["_id"] = 0
+    # _id order walks the default index, so no sort has to be held in memory
+    return collection.find(match, projection, batch_size=batch_size).sort("_id", 1)
+
+
+async def _batches(cursor, batch_size: int) -> AsyncIterator[List[Dict]]:
+    batch = []
+    async for doc in cursor:
+        batch.append(doc)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+async def iter_ndjson(cursor, batch_size: int = EXPORT_BATCH_SIZE) -> AsyncIterator[bytes]:
+    async for batch in _batches(cursor, batch_size):
+        yield b"".join(to_json(doc) + b"\n" for doc in batch)
+
+
+async def iter_csv(cursor, fields: List[str], batch_size: int = EXPORT_BATCH_SIZE) -> AsyncIterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=fields, extrasaction="ignore")
+    writer.writeheader()
+    async for batch in _batches(cursor, batch_size):
+        writer.writerows(batch)
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        # Empty export: just the header
+        yield buffer.getvalue().encode()
@@ -0,0 +1,329 @@
+"""
+Carga masiva de filas de Google Sheets (o de un CSV exportado con el mismo
+formato) a MongoDB.
+
+Las filas se leen por bloques y se escriben con bulk_write desordenados, con
+memoria constante sin importar el tamaño de la hoja:
+
+- products: un upsert por product_id + tienda; la fila con la fecha más
+  reciente es la que queda como precio actual, así que el orden de las filas
+  no importa y volver a correr la carga no duplica nada. El índice único de
+  product_id + tienda evita que dos bloques en vuelo inserten el mismo listado.
+- price_history: un punto por fila con fecha (desactivable con --no-history;
+  este paso sí duplica puntos si se corre dos veces sobre el mismo rango).
+- alertas: cada bloque se compara contra las listas de seguimiento
+  (app.services.watchlists) apenas se escribe (desactivable con --no-alerts),
+  sólo con las filas que quedaron como precio actual.
+
+Al final se recalcula best_offers.
+
+Uso (desde backend_scrapProject):
+    python -m app.services.ingestion --csv export.csv
+    python -m app.services.ingestion --sheet --credentials creds.json --spreadsheet Precios --worksheet Hoja1
+"""
+import argparse
+import asyncio
+import csv
+import time
+from datetime import datetime, timezone
+from typing import Dict, Iterable, Iterator, List, Optional
+
+from motor.motor_asyncio import AsyncIOMotorCollection
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+from .sheets_service import parse_row, LAST_COLUMN
+from .price_history import history_point
+from .canonical import canonical_key
+from .watchlists import ALERT_LISTING_FIELDS, evaluate_price_updates
+
+DEFAULT_BATCH_SIZE = 5000
+# Bulk writes in flight at the same time
+DEFAULT_CONCURRENCY = 4
+
+
+def iter_csv_rows(path: str) -> Iterator[List[str]]:
+    with open(path, newline="", encoding="utf-8") as f:
+        reader = csv.reader(f)
+        next(reader, None) # Saltamos headers
+        yield from reader
+
+
+def iter_sheet_rows(sheet, chunk_size: int = DEFAULT_BATCH_SIZE) -> Iterator[List[str]]:
+    """
+    Lee la hoja por rangos de `chunk_size` filas en lugar de get_all_values.
+    """
+    last_row = sheet.row_count
+    start = 2 # Saltamos headers
+    while start <= last_row:
+        end = min(start + chunk_size - 1, last_row)
+        yield from sheet.get_values(f"A{start}:{LAST_COLUMN}{end}")
+        start = end + 1
+
+
+def parse_date(value: str) -> Optional[datetime]:
+    try:
+        parsed = datetime.fromisoformat(value.strip())
+    except (ValueError, AttributeError):
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed
+
+
+def _link(value: str) -> Optional[str]:
+    # The API validates links as URLs: an empty or relative one would break /compare
+    value = (value or "").strip()
+    return value if value.startswith(("http://", "https://")) else None
+
+
+def listing_from_row(row: List[str]) -> Optional[Dict]:
+    """
+    Convierte una fila de la hoja en un documento de products.
+    """
+    item = parse_row(row)
+    if item is None or not item["product_id"]:
+        return None
+    return {
+        "product_id": item["product_id"],
+        "store_name": item["store"],
+        "product_name": item["product_name"],
+        "canonical_key": canonical_key(item["product_name"]),
+        "price_current": item["price"],
+        "product_url": _link(item["link"]),
+        "scraped_at": parse_date(item["date"]),
+    }
+
+
+def listing_upsert(listing: Dict) -> UpdateOne:
+    """
+    Upsert keyed on product_id + store_name. The fields are only replaced if
+    the row is at least as recent as the stored one, so batches can be
+    written in any order.
+    """
+    is_newer = {"$or": [
+        {"$eq": [{"$type": "$scraped_at"}, "missing"]},
+        {"$gte": [listing["scraped_at"], "$scraped_at"]},
+    ]}
+    fields = {
+        field: {"$cond": [is_newer, {"$literal": value}, f"${field}"]}
+        for field, value in listing.items()
+        if field not in ("product_id", "store_name")
+    }
+    return UpdateOne(
+        {"product_id": listing["product_id"], "store_name": listing["store_name"]},
+        [{"$set": fields}],
+        upsert=True,
+    )
+
+
+async def bulk_upsert(products: AsyncIOMotorCollection, operations: List[UpdateOne], attempts: int = 3):
+    """
+    bulk_write desordenado de los upserts, reintentando los que chocaron con
+    el índice único de product_id + tienda. Devuelve (nuevos, actualizados).
+    """
+    upserted = modified = 0
+    for attempt in range(attempts):
+        try:
+            result = await products.bulk_write(operations, ordered=False)
+        except BulkWriteError as e:
+            upserted += e.details.get("nUpserted", 0)
+            modified += e.details.get("nModified", 0)
+            errors = e.details.get("writeErrors", [])
+            if attempt == attempts - 1 or any(error.get("code") != 11000 for error in errors):
+                raise
+            # Another batch in flight inserted the same listing first: the
+            # retry finds it and updates it like any other upsert
+            operations = [operations[error["index"]] for error in errors]
+            continue
+        return upserted + result.upserted_count, modified + result.modified_count
+
+
+def _is_newer(listing: Dict, other: Dict) -> bool:
+    # Same rule as listing_upsert: rows without a date never replace dated ones
+    if listing["scraped_at"] is None:
+        return other["scraped_at"] is None
+    return other["scraped_at"] is None or listing["scraped_at"] >= other["scraped_at"]
+
+
+def _same_time(a: Optional[datetime], b: Optional[datetime]) -> bool:
+    if a is None or b is None:
+        return a is b
+    # Motor returns naive UTC datetimes unless the client is tz_aware
+    if a.tzinfo is None:
+        a = a.replace(tzinfo=timezone.utc)
+    if b.tzinfo is None:
+        b = b.replace(tzinfo=timezone.utc)
+    return a == b
+
+
+async def current_listings(products: AsyncIOMotorCollection, latest: Dict) -> List[Dict]:
+    """
+    De las filas recién escritas (`latest`, por product_id + tienda), los
+    listados cuya fila quedó como precio actual. Un bloque con filas más
+    viejas que las ya guardadas no cambia el precio y no debe dar alertas.
+    """
+    cursor = products.find(
+        {"product_id": {"$in": list({product_id for product_id, _ in latest})}},
+        {"_id": 0, "price_current": 1, "scraped_at": 1, **{field: 1 for field in ALERT_LISTING_FIELDS}},
+    )
+    current = []
+    async for doc in cursor:
+        row = latest.get((doc["product_id"], doc.get("store_name")))
+        if row is not None and _same_time(doc.get("scraped_at"), row["scraped_at"]):
+            current.append(doc)
+    return current
+
+
+class IngestionStats:
+    def __init__(self):
+        self.rows = 0
+        self.skipped = 0
+        self.upserted = 0
+        self.modified = 0
+        self.history_points = 0
+        self.alerts = 0
+        self.started_at = time.monotonic()
+
+    def report(self) -> str:
+        elapsed = time.monotonic() - self.started_at
+        rate = self.rows / elapsed if elapsed else 0
+        return (
+            f"{self.rows} filas ({rate:,.0f}/s) | nuevos: {self.upserted} | actualizados: {self.modified}"
+            f" | historial: {self.history_points} | alertas: {self.alerts} | salteadas: {self.skipped}"
+        )
+
+
+async def ingest_rows(
+    rows: Iterable[List[str]],
+    products: AsyncIOMotorCollection,
+    history: Optional[AsyncIOMotorCollection] = None,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    concurrency: int = DEFAULT_CONCURRENCY,
+    progress: bool = True,
+    rules: Optional[AsyncIOMotorCollection] = None,
+    alerts: Optional[AsyncIOMotorCollection] = None,
+) -> IngestionStats:
+    """
+    Escribe las filas en products (y price_history si se pasa `history`)
+    por bloques de `batch_size`, con hasta `concurrency` bloques en vuelo.
+    Con `rules` y `alerts`, cada bloque escrito se evalúa contra las listas
+    de seguimiento.
+    """
+    stats = IngestionStats()
+    slots = asyncio.Semaphore(concurrency)
+    pending = set()
+    errors: List[BaseException] = []
+
+    def on_done(task: asyncio.Task):
+        pending.discard(task)
+        if not task.cancelled() and task.exception():
+            errors.append(task.exception())
+
+    async def write(operations: List[UpdateOne], points: List[Dict], latest: Dict):
+        try:
+            upserted, modified = await bulk_upsert(products, operations)
+            stats.upserted += upserted
+            stats.modified += modified
+            if points:
+                await history.insert_many(points, ordered=False)
+                stats.history_points += len(points)
+            if latest:
+                current = await current_listings(products, latest)
+                stats.alerts += await evaluate_price_updates(rules, alerts, current)
+            if progress:
+                print(stats.report())
+        finally:
+            slots.release()
+
+    operations: List[UpdateOne] = []
+    points: List[Dict] = []
+    # Newest row of each listing in the block, the price the alerts are evaluated on
+    latest: Dict = {}
+    evaluate_alerts = rules is not None and alerts is not None
+    for row in rows:
+        stats.rows += 1
+        listing = listing_from_row(row)
+        if listing is None:
+            stats.skipped += 1
+            continue
+        operations.append(listing_upsert(listing))
+        if history is not None and listing["scraped_at"] is not None:
+            point = history_point(listing, listing["scraped_at"])
+            if point:
+                points.append(point)
+        if evaluate_alerts:
+            key = (listing["product_id"], listing["store_name"])
+            previous = latest.get(key)
+            if previous is None or _is_newer(listing, previous):
+                latest[key] = listing
+
+        if len(operations) >= batch_size:
+            await slots.acquire()
+            task = asyncio.create_task(write(operations, points, latest))
+            pending.add(task)
+            task.add_done_callback(on_done)
+            operations, points, latest = [], [], {}
+            if errors:
+                break
+
+    if operations and not errors:
+        await slots.acquire()
+        task = asyncio.create_task(write(operations, points, latest))
+        pending.add(task)
+        task.add_done_callback(on_done)
+    if pending:
+        await asyncio.gather(*pending, return_exceptions=True)
+    if errors:
+        raise errors[0]
+    return stats
+
+
+async def _main(args):
+    from ..database import mongo_db, products_collection, best_offers_collection, history_collection, watchlist_collection, alerts_collection
+    from ..indexes import ensure_indexes
+    from .best_offers import refresh_best_offers
+
+    collection = products_collection()
+    await ensure_indexes(mongo_db())
+
+    if args.csv:
+        rows = iter_csv_rows(args.csv)
+    else:
+        from .sheets_service import GoogleSheetsService
+        service = GoogleSheetsService(args.credentials, args.spreadsheet, args.worksheet)
+        rows = iter_sheet_rows(service.sheet, args.batch_size)
+
+    stats = await ingest_rows(
+        rows,
+        collection,
+        None if args.no_history else history_collection(),
+        batch_size=args.batch_size,
+        concurrency=args.concurrency,
+        rules=None if args.no_alerts else watchlist_collection(),
+        alerts=None if args.no_alerts else alerts_collection(),
+    )
+    print(f"Carga terminada: {stats.report()}")
+
+    if not args.skip_best_offers:
+        await refresh_best_offers(collection, best_offers_collection())
+        print("best_offers recalculada")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Carga masiva de filas de Google Sheets a MongoDB")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--csv", help="CSV exportado de la hoja (mismas columnas)")
+    source.add_argument("--sheet", action="store_true", help="Leer directamente de Google Sheets")
+    parser.add_argument("--credentials", help="JSON de la cuenta de servicio (con --sheet)")
+    parser.add_argument("--spreadsheet", help="Nombre de la planilla (con --sheet)")
+    parser.add_argument("--worksheet", help="Nombre de la hoja (con --sheet)")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY)
+    parser.add_argument("--no-history", action="store_true", help="No escribir price_history")
+    parser.add_argument("--no-alerts", action="store_true", help="No evaluar las listas de seguimiento")
+    parser.add_argument("--skip-best-offers", action="store_true", help="No recalcular best_offers al final")
+    args = parser.parse_args()
+    if args.sheet and not (args.credentials and args.spreadsheet and args.worksheet):
+        parser.error("--sheet requiere --credentials, --spreadsheet y --worksheet")
+    asyncio.run(_main(args))
@@ -0,0 +1,74 @@
+"""
+A lease held by one process among every worker (and server) of the API.
+
+The change feed listeners that write to MongoDB (canonical keys, best_offers,
+price history, watchlist alerts) must run once per change, not once per
+uvicorn worker. Workers compete for a lease document; the holder renews it
+every ttl / 3 and, if it dies, another worker takes over once it expires.
+
+    {"_id": name, "owner": "<host>:<pid>:<random>", "expires_at": datetime}
+"""
+import asyncio
+import os
+import socket
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from motor.motor_asyncio import AsyncIOMotorCollection
+from pymongo.errors import DuplicateKeyError, PyMongoError
+
+LEASE_TTL = float(os.getenv("CHANGE_FEED_LEASE_TTL", "30"))
+
+
+class Lease:
+    def __init__(self, collection: AsyncIOMotorCollection, name: str, ttl: float = LEASE_TTL):
+        self.collection = collection
+        self.name = name
+        self.ttl = ttl
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._valid_until = float("-inf")
+
+    @property
+    def held(self) -> bool:
+        return time.monotonic() < self._valid_until
+
+    async def acquire(self) -> bool:
+        """
+        Takes the lease if it is free or expired, or renews it if it is ours.
+        """
+        started = time.monotonic()
+        now = datetime.now(timezone.utc)
+        try:
+            await self.collection.update_one(
+                {"_id": self.name, "$or": [{"owner": self.owner}, {"expires_at": {"$lt": now}}]},
+                {"$set": {"owner": self.owner, "expires_at": now + timedelta(seconds=self.ttl)}},
+                upsert=True,
+            )
+        except DuplicateKeyError:
+            # Another process holds it: the upsert tried to insert a second document
+            self._valid_until = float("-inf")
+            return False
+        except PyMongoError as e:
+            print(f"Error al renovar el lease {self.name}: {e}")
+            self._valid_until = float("-inf")
+            return False
+        # Given up a third of the ttl before the others may take over, so two
+        # processes never act as holder at once even if a renewal fails
+        self._valid_until = started + self.ttl * 2 / 3
+        return True
+
+    async def keep(self):
+        """
+        Renews the lease while it is held, or retries taking it, every ttl / 3.
+        """
+        while True:
+            await self.acquire()
+            await asyncio.sleep(self.ttl / 3)
+
+    async def release(self):
+        self._valid_until = float("-inf")
+        try:
+            await self.collection.delete_one({"_id": self.name, "owner": self.owner})
+        except PyMongoError as e:
+            print(f"Error al liberar el lease {self.name}: {e}")
@@ -0,0 +1,194 @@
+"""
+Price history stored in a MongoDB time-series collection.
+
+Each point is {"ts": datetime, "meta": {"product_id", "store_name", "product_name"}, "price": int}.
+MongoDB groups the points of each product/store into compressed buckets, and
+/products/{product_id}/history downsamples them server-side per day or week.
+"""
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional, Union
+
+from motor.motor_asyncio import AsyncIOMotorCollection, AsyncIOMotorDatabase
+
+# resolution -> $dateTrunc unit (None means raw points)
+RESOLUTIONS = {
+    "raw": None,
+    "daily": "day",
+    "weekly": "week",
+}
+
+
+async def ensure_price_history_collection(db: AsyncIOMotorDatabase, name: str):
+    """
+    Creates the time-series collection if it does not exist yet.
+    Must run before any index is created on it, which would create a regular collection.
+    """
+    if name in await db.list_collection_names(filter={"name": name}):
+        return
+    await db.create_collection(
+        name,
+        timeseries={"timeField": "ts", "metaField": "meta", "granularity": "hours"},
+    )
+
+
+def history_point(listing: Dict, ts: datetime) -> Optional[Dict]:
+    """
+    Converts a product listing into a history point. Listings without a price are skipped.
+    """
+    price = listing.get("price_current")
+    if not listing.get("product_id") or not isinstance(price, (int, float)):
+        return None
+    return {
+        "ts": ts,
+        "meta": {
+            "product_id": listing["product_id"],
+            "store_name": listing.get("store_name") or "",
+            "product_name": listing.get("product_name"),
+        },
+        "price": price,
+    }
+
+
+async def record_prices(history: AsyncIOMotorCollection, listings: Iterable[Dict], ts: Optional[datetime] = None) -> int:
+    """
+    Appends one history point per listing, stamped with `ts` (now by default).
+    """
+    ts = ts or datetime.now(timezone.utc)
+    points = [point for point in (history_point(listing, ts) for listing in listings) if point]
+    if points:
+        await history.insert_many(points, ordered=False)
+    return len(points)
+
+
+async def last_prices(history: AsyncIOMotorCollection, product_ids: List[str]) -> Dict:
+    """
+    Price of the newest point of each listing, by (product_id, store_name).
+    """
+    cursor = history.aggregate([
+        {"$match": {"meta.product_id": {"$in": product_ids}}},
+        # Points recorded in the same millisecond are told apart by insertion order
+        {"$sort": {"ts": -1, "_id": -1}},
+        {"$group": {
+            "_id": {"product_id": "$meta.product_id", "store_name": "$meta.store_name"},
+            "price": {"$first": "$price"},
+        }},
+    ])
+    return {(doc["_id"]["product_id"], doc["_id"].get("store_name") or ""): doc["price"] async for doc in cursor}
+
+
+async def snapshot_prices(
+    products: AsyncIOMotorCollection,
+    history: AsyncIOMotorCollection,
+    names: Optional[Iterable[str]],
+) -> int:
+    """
+    Records the current price of the listings of the given products whose
+    price differs from their last point. Meant to run after the scraper
+    writes them (see app.services.change_feed).
+
+    A change to one store's listing also touches the other stores' listings
+    of the product, and the bulk loader (app.services.ingestion) already
+    wrote a point at their scraped_at: unchanged prices get no new point, so
+    the history does not fill up with flat duplicates.
+    """
+    if names is None:
+        # Only deletes come without names, and they do not change any price
+        return 0
+    cursor = products.find(
+        {"product_name": {"$in": list(names)}},
+        {"product_id": 1, "store_name": 1, "product_name": 1, "price_current": 1},
+    )
+    listings = [listing for listing in await cursor.to_list(length=None) if listing.get("product_id")]
+    if not listings:
+        return 0
+
+    previous = await last_prices(history, list({listing["product_id"] for listing in listings}))
+    changed = [
+        listing for listing in listings
+        if previous.get((listing["product_id"], listing.get("store_name") or "")) != listing.get("price_current")
+    ]
+    return await record_prices(history, changed)
+
+
+def history_pipeline(
+    product_id: Union[str, List[str]],
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    resolution: str = "daily",
+) -> List[Dict]:
+    """
+    Aggregation over the history of one product, or of several when
+    `product_id` is a list. Every point carries its product_id.
+    """
+    if isinstance(product_id, list):
+        match: Dict = {"meta.product_id": {"$in": product_id}}
+    else:
+        match = {"meta.product_id": product_id}
+    if start or end:
+        match["ts"] = {}
+        if start:
+            match["ts"]["$gte"] = start
+        if end:
+            match["ts"]["$lte"] = end
+
+    pipeline: List[Dict] = [{"$match": match}, {"$sort": {"ts": 1}}]
+
+    unit = RESOLUTIONS[resolution]
+    if unit is None:
+        pipeline.append({"$project": {
+            "_id": 0,
+            "product_id": "$meta.product_id",
+            "date": "$ts",
+            "store": "$meta.store_name",
+            "price": 1,
+        }})
+        return pipeline
+
+    date_trunc = {"date": "$ts", "unit": unit}
+    if unit == "week":
+        date_trunc["startOfWeek"] = "monday"
+
+    pipeline += [
+        {"$group": {
+            "_id": {
+                "product_id": "$meta.product_id",
+                "store": "$meta.store_name",
+                "date": {"$dateTrunc": date_trunc},
+            },
+            "price": {"$last": "$price"},
+            "min_price": {"$min": "$price"},
+            "max_price": {"$max": "$price"},
+            "avg_price": {"$avg": "$price"},
+            "samples": {"$sum": 1},
+        }},
+        {"$sort": {"_id.date": 1, "_id.store": 1}},
+        {"$project": {
+            "_id": 0,
+            "product_id": "$_id.product_id",
+            "date": "$_id.date",
+            "store": "$_id.store",
+            "price": 1,
+            "min_price": 1,
+            "max_price": 1,
+            "avg_price": 1,
+            "samples": 1,
+        }},
+    ]
+    return pipeline
+
+
+async def get_price_history(
+    history: AsyncIOMotorCollection,
+    product_id: Union[str, List[str]],
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    resolution: str = "daily",
+) -> List[Dict]:
+    """
+    Returns the price points of a product (or of a list of products),
+    one per store and bucket (or every point for resolution="raw"), oldest first.
+    """
+    points = await history.aggregate(history_pipeline(product_id, start, end, resolution)).to_list(length=None)
+    for point in points:
+        point["date"] = point["date"].date().isoformat() if resolution != "raw" else point["date"].isoformat()
+    return points
@@ -0,0 +1,194 @@
+import hashlib
+import os
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Dict, Optional
+
+from fastapi import Request, Response
+from pydantic import BaseModel
+
+from ..compression import COMPRESSION_MIN_SIZE, choose_encoding, compress, decoded_etag, encoded_etag
+
+
+@dataclass
+class CachedResponse:
+    key: str
+    body: bytes
+    etag: str
+    expires_at: float
+    # Compressed copies of body by content coding, made on first request
+    encoded: Dict[str, bytes] = field(default_factory=dict)
+
+    @property
+    def size(self) -> int:
+        return len(self.body) + sum(len(body) for body in self.encoded.values())
+
+
+class ResponseCache:
+    """
+    In-process cache of serialized JSON responses.
+
+    - Keys are built from the route and its normalized query parameters.
+    - Memory is bounded by the total size of the cached bodies (LRU eviction).
+    - Entries expire after `ttl` seconds.
+    - `invalidate()` bumps a version so responses computed before a write are
+      never stored, and drops every entry.
+    - Every response carries an ETag (hash of the body) so clients can
+      revalidate with If-None-Match and get a 304 without a body.
+    - Entries keep their gzip/brotli bodies once a client asked for them
+      (see app/compression.py), counted in the size like the plain body.
+    """
+
+    def __init__(self, max_bytes: int, ttl: float):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.version = 0
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: "OrderedDict[str, CachedResponse]" = OrderedDict()
+
+    @staticmethod
+    def make_key(route: str, params: Dict) -> str:
+        parts = []
+        for name in sorted(params):
+            value = params[name]
+            if value is None or value == "":
+                continue
+            if name == "q":
+                # Search is case-insensitive, so "RTX  4060" and "rtx 4060" share an entry
+                value = " ".join(str(value).lower().split())
+            parts.append(f"{name}={value}")
+        return route + "?" + "&".join(parts)
+
+    def get(self, key: str) -> Optional[CachedResponse]:
+        entry = self._entries.get(key)
+        if entry is not None and entry.expires_at <= time.monotonic():
+            self._remove(key)
+            entry = None
+        if entry is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry
+
+    def set(self, key: str, model: BaseModel, version: int) -> CachedResponse:
+        """
+        Serializes `model` and stores it unless the cache was invalidated
+        since `version` was read. Returns the entry either way.
+        """
+        return self.set_body(key, model.model_dump_json().encode(), version)
+
+    def set_body(self, key: str, body: bytes, version: int) -> CachedResponse:
+        """
+        Same as `set` for an already serialized JSON body.
+        """
+        entry = CachedResponse(
+            key=key,
+            body=body,
+            etag='"' + hashlib.blake2b(body, digest_size=12).hexdigest() + '"',
+            expires_at=time.monotonic() + self.ttl,
+        )
+        if version != self.version or len(body) > self.max_bytes:
+            return entry
+
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = entry
+        self.size += len(body)
+        self._evict()
+        return entry
+
+    def encoded_body(self, entry: CachedResponse, encoding: str) -> bytes:
+        """
+        The body of `entry` compressed with `encoding`, compressed only the
+        first time it is requested.
+        """
+        body = entry.encoded.get(encoding)
+        if body is None:
+            body = compress(entry.body, encoding, cached=True)
+            entry.encoded[encoding] = body
+            # Entries already evicted or replaced are not counted anymore
+            if self._entries.get(entry.key) is entry:
+                self.size += len(body)
+                self._evict(keep=entry.key)
+        return body
+
+    def _evict(self, keep: Optional[str] = None):
+        while self.size > self.max_bytes and self._entries:
+            oldest = next(iter(self._entries))
+            if oldest == keep:
+                if len(self._entries) == 1:
+                    break
+                self._entries.move_to_end(oldest)
+                continue
+            self._remove(oldest)
+            self.evictions += 1
+
+    def invalidate(self):
+        self.version += 1
+        self._entries.clear()
+        self.size = 0
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "size_bytes": self.size,
+            "max_bytes": self.max_bytes,
+            "ttl_seconds": self.ttl,
+            "version": self.version,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+        }
+
+    def _remove(self, key: str):
+        entry = self._entries.pop(key)
+        self.size -= entry.size
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    candidates = [tag.strip() for tag in header.split(",")]
+    # The gzip/brotli representations have their own ETags ("abc-gzip")
+    return any(decoded_etag(tag.removeprefix("W/")) == etag for tag in candidates)
+
+
+def cached_json_response(request: Request, entry: CachedResponse, hit: bool) -> Response:
+    """
+    Builds the response for a cache entry, or a 304 if the client already has it.
+    """
+    headers = {
+        "ETag": entry.etag,
+        # Clients may store it but must revalidate, which is a cheap 304 while it is unchanged
+        "Cache-Control": "no-cache",
+        "X-Cache": "HIT" if hit else "MISS",
+    }
+    encoding = choose_encoding(request.headers.get("accept-encoding"))
+    if encoding and len(entry.body) >= COMPRESSION_MIN_SIZE:
+        headers["ETag"] = encoded_etag(entry.etag, encoding)
+        headers["Vary"] = "Accept-Encoding"
+    else:
+        encoding = None
+    if etag_matches(request, entry.etag):
+        return Response(status_code=304, headers=headers)
+    if encoding:
+        # Stored compressed, so hot responses are not compressed again on every request
+        headers["Content-Encoding"] = encoding
+        return Response(content=response_cache.encoded_body(entry, encoding), media_type="application/json", headers=headers)
+    return Response(content=entry.body, media_type="application/json", headers=headers)
+
+
+response_cache = ResponseCache(
+    max_bytes=int(os.getenv("RESPONSE_CACHE_MAX_BYTES", str(32 * 1024 * 1024))),
+    ttl=float(os.getenv("RESPONSE_CACHE_TTL", "60")),
+)
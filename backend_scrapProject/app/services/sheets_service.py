@@ -1,69 +1,330 @@
 import gspread
 from google.oauth2.service_account import Credentials
-from typing import List, Dict, Optional
-from cachetools import cached, TTLCache
+from typing import List, Dict, Optional, Callable, Tuple
 from datetime import datetime
+from functools import cached_property
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import functools
+import threading
+import time
+import numpy as np
+import pandas as pd
+
+# The snapshot is served for 10 minutes (600 seconds); after that the next
+# read returns it anyway and triggers a refresh in the background
+SNAPSHOT_TTL = 600
+# Incremental refreshes only see appended rows, so reload everything every hour
+FULL_RELOAD_INTERVAL = 3600
+# Last column read from the sheet (7: datetime)
+LAST_COLUMN = "H"
+
+
+def parse_price(price_str) -> int:
+    """
+    Helper to clean and parse price strings.
+    """
+    if isinstance(price_str, int):
+        return price_str
+    if isinstance(price_str, float):
+        return int(price_str)
+        
+    try:
+        # Remove currency symbols and dots/commas if necessary
+        # Assuming format like "$ 1.234" or "1234"
+        clean_price = str(price_str).replace('$', '').replace('.', '').replace(',', '').strip()
+        return int(clean_price)
+    except ValueError:
+        return 0
+
+
+def parse_row(row: List[str]) -> Optional[Dict[str, any]]:
+    """
+    Convierte una fila cruda de la hoja en un producto. Devuelve None si está incompleta.
+    """
+    # Asumimos que la primera fila son headers, pero parseamos por índice
+    # Indices basados en la imagen del usuario:
+    # 0: product_id
+    # 1: store
+    # 2: product_name
+    # 3: price
+    # 4: null/empty
+    # 5: product_discount
+    # 6: link
+    # 7: datetime
+
+    # Aseguramos que la fila tenga suficientes columnas
+    if len(row) < 4:
+        return None
+
+    return {
+        "product_id": row[0], # Hash string
+        "store": row[1],
+        "product_name": row[2],
+        "price": parse_price(row[3]),
+        # "product_discount": row[5] if len(row) > 5 else 0, # Opcional si se agrega al schema
+        "link": row[6] if len(row) > 6 else "",
+        "date": row[7] if len(row) > 7 else ""
+    }
+
+
+def _trim(row: List[str]) -> List[str]:
+    # The API drops trailing empty cells in ranges but get_all_values pads them
+    row = list(row)
+    while row and row[-1] == "":
+        row.pop()
+    return row
+
+
+class SheetIndexes:
+    """
+    Índices construidos una vez por carga de la hoja:
+    - by_id: filas de cada product_id ordenadas por fecha
+    - best_prices: precio mínimo por nombre de producto (lo que devuelve get_global_stats)
+    - frame / prices / name_codes / store_codes / name_keys / store_keys /
+      sort_orders: datos columnares para search_products (se arman la
+      primera vez que se usan)
+
+    app.services.catalog_snapshot.MappedCatalog expone la misma interfaz
+    sobre un snapshot compartido entre workers.
+    """
+
+    def __init__(self, products: List[Dict[str, any]], parse_price: Callable[[any], int]):
+        # Referencia a la lista cacheada, para saber cuándo se recargó la hoja
+        self.source = products
+        self._parse_price = parse_price
+
+        self.by_id: Dict[str, List[Dict[str, any]]] = {}
+        best_by_name: Dict[str, Tuple[int, Dict[str, any]]] = {}
+        for p in products:
+            self.by_id.setdefault(str(p.get('product_id')), []).append(p)
+
+            name = p.get('product_name')
+            price = parse_price(p.get('price'))
+            if not name or price <= 0:
+                continue
+            best = best_by_name.get(name)
+            if best is None or price < best[0]:
+                best_by_name[name] = (price, p)
+
+        for rows in self.by_id.values():
+            rows.sort(key=lambda x: x.get('date', ''))
+
+        self.best_prices = [
+            {
+                "product_name": name,
+                "min_price": price,
+                "store": item.get('store')
+            }
+            for name, (price, item) in best_by_name.items()
+        ]
+
+    @cached_property
+    def frame(self) -> pd.DataFrame:
+        """
+        Productos como DataFrame tipado, en el mismo orden que la hoja:
+        precio int64 parseado una sola vez, nombre y tienda como categorías.
+        """
+        frame = pd.DataFrame({
+            'product_name': pd.Categorical([str(p.get('product_name', '')) for p in self.source]),
+            'store': pd.Categorical([str(p.get('store', '')) for p in self.source]),
+            'price': np.fromiter(
+                (self._parse_price(p.get('price')) for p in self.source), dtype=np.int64, count=len(self.source)
+            ),
+            'date': [p.get('date', '') for p in self.source],
+        })
+        return frame
+
+    @cached_property
+    def prices(self) -> np.ndarray:
+        return self.frame['price'].to_numpy()
+
+    @cached_property
+    def name_codes(self) -> np.ndarray:
+        # Row -> position of its name in name_keys
+        return self.frame['product_name'].cat.codes.to_numpy()
+
+    @cached_property
+    def store_codes(self) -> np.ndarray:
+        return self.frame['store'].cat.codes.to_numpy()
+
+    @cached_property
+    def name_keys(self) -> pd.Index:
+        # Lowercased distinct names: text search runs once per name, not once per row
+        return self.frame['product_name'].cat.categories.str.lower()
+
+    @cached_property
+    def store_keys(self) -> pd.Index:
+        return self.frame['store'].cat.categories.str.lower()
+
+    @cached_property
+    def sort_orders(self) -> Dict[str, np.ndarray]:
+        """
+        Permutaciones de filas para cada orden de search_products, calculadas una vez.
+        Son estables: los empates mantienen el orden de la hoja, como list.sort.
+        """
+        price = self.prices
+        date_codes, _ = pd.factorize(self.frame['date'], sort=True)
+        return {
+            'price_asc': np.argsort(price, kind='stable'),
+            'price_desc': np.argsort(-price, kind='stable'),
+            'newest': np.argsort(-date_codes, kind='stable'),
+        }
 
-# Cache for 10 minutes (600 seconds)
-cache = TTLCache(maxsize=100, ttl=600)
 
 class GoogleSheetsService:
-    def __init__(self, credentials_path: str, spreadsheet_name: str, sheet_name: str):
-        self.scope = ['https://spreadsheets.google.com/feeds', 'https://www.googleapis.com/auth/drive']
-        self.creds = Credentials.from_service_account_file(credentials_path, scopes=self.scope)
-        self.client = gspread.authorize(self.creds)
-        self.spreadsheet = self.client.open(spreadsheet_name)
-        self.sheet = self.spreadsheet.worksheet(sheet_name)
-
-    @cached(cache)
+    def __init__(
+        self,
+        credentials_path: Optional[str] = None,
+        spreadsheet_name: Optional[str] = None,
+        sheet_name: Optional[str] = None,
+        sheet=None,
+    ):
+        # `sheet` is an already opened worksheet (or anything with its
+        # get_all_values and batch_get); otherwise it is opened here
+        if sheet is None:
+            self.scope = ['https://spreadsheets.google.com/feeds', 'https://www.googleapis.com/auth/drive']
+            self.creds = Credentials.from_service_account_file(credentials_path, scopes=self.scope)
+            self.client = gspread.authorize(self.creds)
+            self.spreadsheet = self.client.open(spreadsheet_name)
+            sheet = self.spreadsheet.worksheet(sheet_name)
+        self.sheet = sheet
+        self._indexes: Optional[SheetIndexes] = None
+
+        # Snapshot state
+        self._snapshot: Optional[List[Dict[str, any]]] = None
+        self._header: List[str] = []
+        self._loaded_rows = 0 # sheet rows in the snapshot, header included
+        self._last_row: List[str] = []
+        self._loaded_at = 0.0
+        self._full_loaded_at = 0.0
+        self._refreshing = False
+        self._refresh_thread: Optional[threading.Thread] = None
+        self._load_lock = threading.Lock()
+        self._state_lock = threading.Lock()
+
+        # Lecturas del snapshot, para /metrics
+        self.snapshot_hits = 0 # served the current snapshot
+        self.snapshot_stale_hits = 0 # served an expired snapshot while it refreshes
+        self.snapshot_misses = 0 # had to wait for the sheet to download
+
     def get_all_products(self) -> List[Dict[str, any]]:
         """
         Obtiene todos los registros de la hoja de cálculo.
-        Usa caché para evitar exceder los límites de la API.
+        Sirve la última carga (snapshot) para evitar exceder los límites de la API:
+        - la primera llamada descarga la hoja; las concurrentes esperan esa misma descarga
+        - pasado SNAPSHOT_TTL devuelve la carga anterior y la actualiza en segundo plano
+        """
+        snapshot = self._snapshot
+        if snapshot is None:
+            self.snapshot_misses += 1
+            with self._load_lock:
+                # Another thread may have loaded it while we waited
+                if self._snapshot is None:
+                    self.refresh()
+            return self._snapshot
+
+        if time.monotonic() - self._loaded_at > SNAPSHOT_TTL:
+            self.snapshot_stale_hits += 1
+            self._refresh_in_background()
+        else:
+            self.snapshot_hits += 1
+        return snapshot
+
+    def refresh(self):
+        """
+        Actualiza el snapshot. Sólo descarga las filas agregadas desde la carga
+        anterior, salvo que la hoja se haya achicado, cambien los headers o haya
+        pasado FULL_RELOAD_INTERVAL, en cuyo caso la descarga completa.
+        Los llamadores deben tener _load_lock.
         """
         try:
-            # Usamos get_all_values para obtener los datos crudos
-            rows = self.sheet.get_all_values()
-            if not rows:
-                return []
-            
-            # Asumimos que la primera fila son headers, pero parseamos por índice
-            # Indices basados en la imagen del usuario:
-            # 0: product_id
-            # 1: store
-            # 2: product_name
-            # 3: price
-            # 4: null/empty
-            # 5: product_discount
-            # 6: link
-            # 7: datetime
-            
-            data = rows[1:] # Saltamos headers
-            
-            result = []
-            for row in data:
-                # Aseguramos que la fila tenga suficientes columnas
-                if len(row) < 4:
-                    continue
-                    
-                try:
-                    item = {
-                        "product_id": row[0], # Hash string
-                        "store": row[1],
-                        "product_name": row[2],
-                        "price": self._parse_price(row[3]),
-                        # "product_discount": row[5] if len(row) > 5 else 0, # Opcional si se agrega al schema
-                        "link": row[6] if len(row) > 6 else "",
-                        "date": row[7] if len(row) > 7 else ""
-                    }
-                    result.append(item)
-                except IndexError:
-                    continue
-                
-            return result
+            full_reload_due = time.monotonic() - self._full_loaded_at > FULL_RELOAD_INTERVAL
+            if self._snapshot is None or self._loaded_rows == 0 or full_reload_due:
+                self._full_reload()
+            elif not self._append_new_rows():
+                self._full_reload()
         except Exception as e:
             print(f"Error al leer desde Google Sheets: {e}")
-            return []
+            if self._snapshot is None:
+                self._set_snapshot([], [], 0, [])
+            else:
+                # Keep serving the previous snapshot and retry after SNAPSHOT_TTL
+                self._loaded_at = time.monotonic()
+
+    def _refresh_in_background(self):
+        with self._state_lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+        self._refresh_thread = threading.Thread(target=self._background_refresh, daemon=True)
+        self._refresh_thread.start()
+
+    def _background_refresh(self):
+        try:
+            with self._load_lock:
+                self.refresh()
+        finally:
+            self._refreshing = False
+
+    def _full_reload(self):
+        # Usamos get_all_values para obtener los datos crudos
+        rows = self.sheet.get_all_values()
+        if not rows:
+            self._set_snapshot([], [], 0, [])
+            return
+        self._set_snapshot(self._parse_rows(rows[1:]), rows[0], len(rows), rows[-1]) # Saltamos headers
+        self._full_loaded_at = self._loaded_at
+
+    def _append_new_rows(self) -> bool:
+        """
+        Descarga sólo las filas nuevas. Devuelve False si la hoja cambió de una
+        forma que requiere la descarga completa.
+        """
+        known = self._loaded_rows
+        # One API call: header, last known row (to detect a shrink or edit) and everything after it
+        header, last_row, new_rows = self.sheet.batch_get([
+            "1:1",
+            f"{known}:{known}",
+            f"A{known + 1}:{LAST_COLUMN}",
+        ])
+        if _trim(header[0] if header else []) != _trim(self._header):
+            return False
+        if _trim(last_row[0] if last_row else []) != _trim(self._last_row):
+            return False
+
+        new_rows = list(new_rows)
+        if new_rows:
+            self._set_snapshot(
+                self._snapshot + self._parse_rows(new_rows),
+                self._header,
+                known + len(new_rows),
+                new_rows[-1],
+            )
+        else:
+            self._loaded_at = time.monotonic()
+        return True
+
+    def _set_snapshot(self, products: List[Dict[str, any]], header: List[str], row_count: int, last_row: List[str]):
+        # Always a new list: readers holding the previous snapshot keep a consistent view
+        self._snapshot = products
+        self._header = header
+        self._loaded_rows = row_count
+        self._last_row = last_row
+        self._loaded_at = time.monotonic()
+
+    def _parse_rows(self, rows: List[List[str]]) -> List[Dict[str, any]]:
+        return [item for item in (parse_row(row) for row in rows) if item is not None]
+
+    def get_indexes(self) -> SheetIndexes:
+        """
+        Devuelve los índices de la carga actual de la hoja.
+        Se reconstruyen sólo cuando get_all_products devuelve una carga nueva.
+        """
+        products = self.get_all_products()
+        if self._indexes is None or self._indexes.source is not products:
+            self._indexes = SheetIndexes(products, self._parse_price)
+        return self._indexes
 
     def get_product_count(self) -> int:
         """
@@ -77,15 +338,11 @@ class GoogleSheetsService:
         Obtiene el historial de precios de un producto específico.
         """
         try:
-            all_products = self.get_all_products()
-            # Filter by product_id
-            history_items = [p for p in all_products if str(p.get('product_id')) == str(product_id)]
+            # Rows of this product, already sorted by date
+            history_items = self.get_indexes().by_id.get(str(product_id))
             
             if not history_items:
                 return None
-                
-            # Sort by date
-            history_items.sort(key=lambda x: x.get('date', ''), reverse=False)
             
             product_info = history_items[0]
             
@@ -111,8 +368,7 @@ class GoogleSheetsService:
         Asume que el 'precio actual' es el último registrado para cada tienda.
         """
         try:
-            all_products = self.get_all_products()
-            product_items = [p for p in all_products if str(p.get('product_id')) == str(product_id)]
+            product_items = self.get_indexes().by_id.get(str(product_id))
             
             if not product_items:
                 return None
@@ -149,42 +405,9 @@ class GoogleSheetsService:
         Agrupa por nombre y encuentra el precio mínimo.
         """
         try:
-            all_products = self.get_all_products()
-            if not all_products:
-                return {"best_prices": []}
-                
-            # Group by product_name
-            product_groups = {}
-            for p in all_products:
-                name = p.get('product_name')
-                if not name:
-                    continue
-                
-                # Normalize name if needed (simple strip/lower for grouping keys?)
-                # For now, exact match on product_name
-                if name not in product_groups:
-                    product_groups[name] = []
-                product_groups[name].append(p)
-            
-            best_prices = []
-            for name, items in product_groups.items():
-                # Find item with min price in this group
-                # Filter out 0 or invalid prices if necessary
-                valid_items = [i for i in items if self._parse_price(i.get('price')) > 0]
-                
-                if not valid_items:
-                    continue
-                    
-                best_item = min(valid_items, key=lambda x: self._parse_price(x.get('price')))
-                
-                best_prices.append({
-                    "product_name": name,
-                    "min_price": self._parse_price(best_item.get('price')),
-                    "store": best_item.get('store')
-                })
-                
+            # Precomputed once per sheet load
             return {
-                "best_prices": best_prices
+                "best_prices": self.get_indexes().best_prices
             }
         except Exception as e:
             print(f"Error in get_global_stats: {e}")
@@ -194,18 +417,7 @@ class GoogleSheetsService:
         """
         Helper to clean and parse price strings.
         """
-        if isinstance(price_str, int):
-            return price_str
-        if isinstance(price_str, float):
-            return int(price_str)
-            
-        try:
-            # Remove currency symbols and dots/commas if necessary
-            # Assuming format like "$ 1.234" or "1234"
-            clean_price = str(price_str).replace('$', '').replace('.', '').replace(',', '').strip()
-            return int(clean_price)
-        except ValueError:
-            return 0
+        return parse_price(price_str)
 
     def search_products(
         self,
@@ -221,49 +433,37 @@ class GoogleSheetsService:
         Busca productos con filtros, ordenamiento y paginación.
         """
         try:
-            all_products = self.get_all_products()
+            indexes = self.get_indexes()
+            prices = indexes.prices
             
-            # 1. Filtering
-            filtered_products = all_products
+            # 1. Filtering (vectorized over the columns, prices already parsed)
+            mask = np.ones(len(prices), dtype=bool)
             
             if q:
-                q_lower = q.lower()
-                filtered_products = [
-                    p for p in filtered_products 
-                    if q_lower in str(p.get('product_name', '')).lower()
-                ]
+                # Match the distinct names, then expand to rows through the category codes
+                name_hits = np.asarray(indexes.name_keys.str.contains(q.lower(), regex=False), dtype=bool)
+                mask &= name_hits[indexes.name_codes]
                 
             if store:
-                store_lower = store.lower()
-                filtered_products = [
-                    p for p in filtered_products
-                    if str(p.get('store', '')).lower() == store_lower
-                ]
+                store_hits = np.asarray(indexes.store_keys == store.lower(), dtype=bool)
+                mask &= store_hits[indexes.store_codes]
                 
             if min_price is not None:
-                filtered_products = [
-                    p for p in filtered_products
-                    if self._parse_price(p.get('price')) >= min_price
-                ]
+                mask &= prices >= min_price
                 
             if max_price is not None:
-                filtered_products = [
-                    p for p in filtered_products
-                    if self._parse_price(p.get('price')) <= max_price
-                ]
+                mask &= prices <= max_price
                 
-            # 2. Sorting
-            if sort_by:
-                if sort_by == 'price_asc':
-                    filtered_products.sort(key=lambda x: self._parse_price(x.get('price')))
-                elif sort_by == 'price_desc':
-                    filtered_products.sort(key=lambda x: self._parse_price(x.get('price')), reverse=True)
-                elif sort_by == 'newest':
-                    # Assuming date format YYYY-MM-DD or similar string that sorts correctly
-                    filtered_products.sort(key=lambda x: x.get('date', ''), reverse=True)
+            # 2. Sorting: keep the precomputed order of the rows that passed the filters
+            # (unknown sort_by values keep the sheet order, like before)
+            order = indexes.sort_orders.get(sort_by)
+            if order is not None:
+                positions = order[mask[order]]
+            else:
+                positions = np.flatnonzero(mask)
             
             # 3. Pagination
-            total_results = len(filtered_products)
+            total_results = len(positions)
             total_pages = (total_results + limit - 1) // limit
             
             if page > total_pages and total_pages > 0:
@@ -272,7 +472,7 @@ class GoogleSheetsService:
             else:
                 start_idx = (page - 1) * limit
                 end_idx = start_idx + limit
-                paginated_data = filtered_products[start_idx:end_idx]
+                paginated_data = [indexes.source[i] for i in positions[start_idx:end_idx]]
             
             return {
                 "total_results": total_results,
@@ -290,4 +490,58 @@ class GoogleSheetsService:
                 "current_page": page,
                 "limit": limit,
                 "data": []
-            }
\ No newline at end of file
+            }
+
+class AsyncGoogleSheetsService:
+    """
+    Interfaz async de GoogleSheetsService para usar desde handlers de FastAPI.
+
+    Las llamadas a gspread (y el filtrado sobre la hoja) corren en un pool de
+    threads acotado, así una descarga lenta no bloquea el event loop. Llamadas
+    idénticas en curso se comparten (single-flight): si 50 requests llegan
+    mientras se descarga la hoja, la descarga se hace una vez. Cada espera
+    tiene un timeout; la descarga en curso sigue y la aprovechan los siguientes.
+    """
+
+    def __init__(self, service: GoogleSheetsService, max_workers: int = 4, timeout: float = 30.0):
+        self.service = service
+        self.timeout = timeout
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="sheets")
+        self._inflight: Dict[tuple, asyncio.Future] = {}
+
+    async def _run(self, fn: Callable, *args, **kwargs):
+        key = (fn.__name__, args, tuple(sorted(kwargs.items())))
+        future = self._inflight.get(key)
+        if future is None:
+            loop = asyncio.get_running_loop()
+            future = loop.run_in_executor(self._executor, functools.partial(fn, *args, **kwargs))
+            self._inflight[key] = future
+            future.add_done_callback(lambda _: self._inflight.pop(key, None))
+        # shield: a waiter that times out must not cancel the call the others are waiting on
+        return await asyncio.wait_for(asyncio.shield(future), self.timeout)
+
+    async def get_all_products(self) -> List[Dict[str, any]]:
+        return await self._run(self.service.get_all_products)
+
+    async def get_product_count(self) -> int:
+        await self.get_all_products()
+        return await self._run(self.service.get_product_count)
+
+    async def get_product_history(self, product_id: str) -> Optional[Dict]:
+        await self.get_all_products()
+        return await self._run(self.service.get_product_history, product_id)
+
+    async def get_product_comparison(self, product_id: str) -> Optional[Dict]:
+        await self.get_all_products()
+        return await self._run(self.service.get_product_comparison, product_id)
+
+    async def get_global_stats(self) -> Dict:
+        await self.get_all_products()
+        return await self._run(self.service.get_global_stats)
+
+    async def search_products(self, **params) -> Dict:
+        await self.get_all_products()
+        return await self._run(self.service.search_products, **params)
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False)
@@ -0,0 +1,132 @@
+"""
+Slow aggregation recorder.
+
+Aggregations run through `aggregate_tracked` are timed; the ones slower than
+SLOW_QUERY_THRESHOLD_MS are kept, with the route, its parameters and the
+exact pipeline, in a ring buffer of the last SLOW_QUERY_LOG_SIZE entries
+(GET /admin/slow-queries).
+
+Each entry also gets the summary of an explain("executionStats") of its
+pipeline: plan stages and indexes, documents and keys examined and documents
+returned. The explain runs the query again, so it runs in the background
+after the response is sent, and at most once per distinct pipeline every
+SLOW_QUERY_EXPLAIN_INTERVAL seconds (later entries reuse the summary).
+"""
+import asyncio
+import json
+import os
+import time
+from collections import deque
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+
+from bson import json_util
+from motor.motor_asyncio import AsyncIOMotorCollection
+
+from ..indexes import summarize_execution, summarize_plan
+
+SLOW_QUERY_THRESHOLD_MS = float(os.getenv("SLOW_QUERY_THRESHOLD_MS", "200"))
+SLOW_QUERY_LOG_SIZE = int(os.getenv("SLOW_QUERY_LOG_SIZE", "100"))
+SLOW_QUERY_EXPLAIN_INTERVAL = float(os.getenv("SLOW_QUERY_EXPLAIN_INTERVAL", "60"))
+
+
+class SlowQueryLog:
+    def __init__(self, threshold_ms: float, max_entries: int, explain_interval: float):
+        self.threshold_ms = threshold_ms
+        self.explain_interval = explain_interval
+        self.recorded = 0
+        self._entries: "deque[Dict]" = deque(maxlen=max_entries)
+        # pipeline -> (monotonic time, summary) of its last explain
+        self._explains: Dict[str, Tuple[float, Dict]] = {}
+        # pipeline -> entries waiting for the explain that is running
+        self._pending: Dict[str, List[Dict]] = {}
+        # Referenced until they finish, so they are not garbage collected
+        self._tasks = set()
+
+    @property
+    def max_entries(self) -> int:
+        return self._entries.maxlen
+
+    def entries(self) -> List[Dict]:
+        # Newest first
+        return list(reversed(self._entries))
+
+    def clear(self):
+        self._entries.clear()
+        self._explains.clear()
+
+    def observe(self, route: str, params: Dict, collection: AsyncIOMotorCollection, pipeline: List[Dict], duration_ms: float):
+        """
+        Records the aggregation if it took at least `threshold_ms`.
+        """
+        if duration_ms < self.threshold_ms:
+            return
+        # BSON values (ObjectId, datetime) as extended JSON, so the entry can be returned as is
+        logged = json.loads(json_util.dumps(pipeline))
+        entry = {
+            "recorded_at": datetime.now(timezone.utc),
+            "route": route,
+            "params": {name: value for name, value in params.items() if value is not None and value != ""},
+            "collection": collection.name,
+            "duration_ms": round(duration_ms, 3),
+            "pipeline": logged,
+            "explain": None,
+        }
+        self._entries.append(entry)
+        self.recorded += 1
+
+        key = json.dumps(logged, sort_keys=True)
+        if key in self._pending:
+            # Concurrent slow runs of the same pipeline share one explain
+            self._pending[key].append(entry)
+            return
+        previous = self._explains.get(key)
+        if previous and time.monotonic() - previous[0] < self.explain_interval:
+            entry["explain"] = previous[1]
+            return
+        self._pending[key] = [entry]
+        task = asyncio.create_task(self._explain(key, collection, pipeline))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _explain(self, key: str, collection: AsyncIOMotorCollection, pipeline: List[Dict]):
+        command = {"aggregate": collection.name, "pipeline": pipeline, "cursor": {}}
+        try:
+            explain = await collection.database.command({"explain": command, "verbosity": "executionStats"})
+            summary = {**summarize_plan(explain), **summarize_execution(explain)}
+        except Exception as e:
+            summary = {"error": str(e)}
+        self._explains.pop(key, None)
+        self._explains[key] = (time.monotonic(), summary)
+        while len(self._explains) > self.max_entries:
+            # Oldest explain first (dicts keep insertion order)
+            del self._explains[next(iter(self._explains))]
+        for entry in self._pending.pop(key, []):
+            entry["explain"] = summary
+
+    def stats(self) -> Dict:
+        return {
+            "threshold_ms": self.threshold_ms,
+            "max_entries": self.max_entries,
+            "recorded": self.recorded,
+            "entries": self.entries(),
+        }
+
+
+async def aggregate_tracked(
+    collection: AsyncIOMotorCollection,
+    pipeline: List[Dict],
+    length: Optional[int],
+    route: str,
+    params: Dict,
+) -> List[Dict]:
+    """
+    `collection.aggregate(pipeline).to_list(length)`, recorded in slow_query_log if slow.
+    """
+    start = time.perf_counter()
+    result = await collection.aggregate(pipeline).to_list(length=length)
+    slow_query_log.observe(route, params, collection, pipeline, (time.perf_counter() - start) * 1000)
+    return result
+
+
+slow_query_log = SlowQueryLog(SLOW_QUERY_THRESHOLD_MS, SLOW_QUERY_LOG_SIZE, SLOW_QUERY_EXPLAIN_INTERVAL)
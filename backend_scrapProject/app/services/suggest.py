@@ -0,0 +1,186 @@
+"""
+In-memory prefix index for the search bar typeahead (/products/suggest).
+
+Every distinct product name is indexed under each of its normalized words
+(brand, model, ...), so "rtx", "4060" and "asus" all suggest "ASUS Dual RTX
+4060". Words are kept in a sorted list, each with its product names ordered
+by listing count, so a prefix lookup is a binary search over the words plus
+a merge of their already ranked names that stops after the top N.
+
+It is built at startup from the products collection and updated per product
+name through app.services.change_feed.
+"""
+import asyncio
+import bisect
+import heapq
+import re
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from motor.motor_asyncio import AsyncIOMotorCollection
+from pymongo.errors import PyMongoError
+
+from .canonical import normalize_text
+
+# Lookups for short prefixes walk many keys, so their results are memoized until the next update
+MEMO_PREFIX_LENGTH = 3
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+def _tokens(normalized_name: str) -> List[str]:
+    return _TOKEN_RE.findall(normalized_name)
+
+
+class SuggestIndex:
+    def __init__(self):
+        self.ready = False
+        self._keys: List[str] = [] # sorted distinct tokens
+        self._postings: Dict[str, List[Tuple[int, str]]] = {} # token -> (-listings, name), best first
+        self._listings: Dict[str, int] = {} # product name -> listing count
+        self._normalized: Dict[str, str] = {} # product name -> normalized name
+        self._memo: Dict[Tuple[str, int], List[Tuple[str, int]]] = {}
+
+    def __len__(self) -> int:
+        return len(self._listings)
+
+    def build(self, listings: Dict[str, int]):
+        """
+        Replaces the whole index. `listings` maps product names to listing counts.
+        """
+        self.load(self.prepare(listings))
+
+    @staticmethod
+    def prepare(listings: Dict[str, int]) -> Tuple:
+        # Pure function of `listings`, so it can run in a worker thread
+        postings: Dict[str, List[Tuple[int, str]]] = {}
+        normalized: Dict[str, str] = {}
+        for name, count in listings.items():
+            normalized[name] = normalize_text(name)
+            for token in set(_tokens(normalized[name])):
+                postings.setdefault(token, []).append((-count, name))
+        for entries in postings.values():
+            entries.sort()
+        return sorted(postings), postings, dict(listings), normalized
+
+    def load(self, state: Tuple):
+        """
+        Installs a state returned by `prepare`.
+        """
+        self._keys, self._postings, self._listings, self._normalized = state
+        self._memo = {}
+        self.ready = True
+
+    def update(self, listings: Dict[str, int]):
+        """
+        Sets the listing counts of some product names; a count of 0 removes the name.
+        """
+        for name, count in listings.items():
+            if name in self._listings:
+                self._remove(name)
+            if count > 0:
+                self._add(name, count)
+        self._memo = {}
+
+    def _add(self, name: str, count: int):
+        self._listings[name] = count
+        self._normalized[name] = normalize_text(name)
+        for token in set(_tokens(self._normalized[name])):
+            entries = self._postings.get(token)
+            if entries is None:
+                entries = self._postings[token] = []
+                bisect.insort(self._keys, token)
+            bisect.insort(entries, (-count, name))
+
+    def _remove(self, name: str):
+        entry = (-self._listings.pop(name), name)
+        for token in set(_tokens(self._normalized.pop(name))):
+            entries = self._postings[token]
+            del entries[bisect.bisect_left(entries, entry)]
+            if not entries:
+                del self._postings[token]
+                del self._keys[bisect.bisect_left(self._keys, token)]
+
+    def lookup(self, prefix: str, limit: int = 10) -> List[Tuple[str, int]]:
+        """
+        Up to `limit` (product name, listing count) pairs, most listed first,
+        with a word starting with `prefix`. With several words, every one of
+        them must start a word of the name (in any order).
+        """
+        words = _tokens(normalize_text(prefix))
+        if not words:
+            return []
+        memo_key = (" ".join(words), limit)
+        short = len(memo_key[0]) <= MEMO_PREFIX_LENGTH
+        if short and memo_key in self._memo:
+            return self._memo[memo_key]
+
+        # Walk the names of the most selective word best first,
+        # and stop as soon as `limit` of them contain the other words too
+        postings = {word: self._postings_with_prefix(word) for word in set(words)}
+        first = min(postings, key=lambda word: sum(len(entries) for entries in postings[word]))
+        others = [word for word in postings if word != first]
+        result: List[Tuple[str, int]] = []
+        seen: Set[str] = set()
+        for negative_count, name in heapq.merge(*postings[first]):
+            if name in seen:
+                continue
+            seen.add(name)
+            if others:
+                tokens = _tokens(self._normalized[name])
+                if not all(any(token.startswith(word) for token in tokens) for word in others):
+                    continue
+            result.append((name, -negative_count))
+            if len(result) >= limit:
+                break
+
+        if short:
+            self._memo[memo_key] = result
+        return result
+
+    def _postings_with_prefix(self, prefix: str) -> List[List[Tuple[int, str]]]:
+        keys = self._keys
+        start = bisect.bisect_left(keys, prefix)
+        end = bisect.bisect_left(keys, prefix + "\uffff", start)
+        return [self._postings[key] for key in keys[start:end]]
+
+
+async def count_listings(products: AsyncIOMotorCollection, names: Optional[Iterable[str]] = None) -> Dict[str, int]:
+    """
+    Number of listings per product name (of the given names, or all of them).
+    """
+    pipeline = []
+    if names is not None:
+        pipeline.append({"$match": {"product_name": {"$in": list(names)}}})
+    pipeline += [
+        {"$match": {"product_name": {"$type": "string"}}},
+        {"$group": {"_id": "$product_name", "listings": {"$sum": 1}}},
+    ]
+    counts = {}
+    async for doc in products.aggregate(pipeline):
+        counts[doc["_id"]] = doc["listings"]
+    return counts
+
+
+async def build_suggest_index(products: AsyncIOMotorCollection, index: SuggestIndex):
+    try:
+        listings = await count_listings(products)
+    except PyMongoError as e:
+        print(f"Error al cargar el índice de sugerencias: {e}")
+        return
+    # Normalizing every name takes a while on big catalogs; keep it off the event loop
+    index.load(await asyncio.to_thread(SuggestIndex.prepare, listings))
+
+
+async def refresh_suggest_index(products: AsyncIOMotorCollection, index: SuggestIndex, names: Optional[Set[str]]):
+    """
+    Updates the given product names, or rebuilds everything when names is None.
+    """
+    if names is None:
+        await build_suggest_index(products, index)
+        return
+    counts = await count_listings(products, names)
+    # Names that are no longer in products get a count of 0 and are removed
+    index.update({name: counts.get(name, 0) for name in names})
+
+
+suggest_index = SuggestIndex()
@@ -0,0 +1,145 @@
+"""
+Price-drop watchlists.
+
+A rule watches a product below a target price, optionally at a single store:
+
+    {"owner", "product_id" | "canonical_key", "store_name", "target_price",
+     "last_alert_price", "last_alert_at", "created_at"}
+
+`product_id` rules watch one listing; `canonical_key` rules (created from a
+product name) watch every store's listing of the product, so they fire on the
+cheapest one. Rules are indexed by product_id and canonical_key with their
+target price (see app/indexes.py).
+
+Price updates are evaluated in bulk: for a batch of listings, one indexed
+query fetches only the rules of those products that could fire (target at or
+above the lowest price in the batch), so the cost grows with the changed
+products and not with the number of rules. Triggered rules write an alert to
+the alerts collection and remember the alerted price: a rule fires again
+only when the price drops below its last alert. The alerted price is set
+with a conditional update per rule and only the rules whose update matched
+get an alert, so concurrent evaluations of the same price alert once.
+
+Evaluation runs after each ingestion batch (app.services.ingestion) and for
+the products written by the scrapers (the change feed listener in app.main).
+"""
+import asyncio
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional
+
+from motor.motor_asyncio import AsyncIOMotorCollection
+
+from .canonical import canonical_key
+
+# Listing fields copied into the alerts
+ALERT_LISTING_FIELDS = ["product_id", "product_name", "store_name", "product_url", "canonical_key"]
+
+
+def _price(listing: Dict) -> Optional[float]:
+    price = listing.get("price_current")
+    return price if isinstance(price, (int, float)) and price > 0 else None
+
+
+def _cheapest(listings: Iterable[Dict], store_name: Optional[str]) -> Optional[Dict]:
+    candidates = [listing for listing in listings if not store_name or listing.get("store_name") == store_name]
+    return min(candidates, key=_price, default=None)
+
+
+def index_listings(listings: Iterable[Dict]):
+    """
+    Priced listings by product_id and by canonical_key.
+    """
+    by_id: Dict[str, List[Dict]] = {}
+    by_key: Dict[str, List[Dict]] = {}
+    for listing in listings:
+        if _price(listing) is None:
+            continue
+        if listing.get("product_id"):
+            by_id.setdefault(listing["product_id"], []).append(listing)
+        key = listing.get("canonical_key") or (canonical_key(listing["product_name"]) if listing.get("product_name") else None)
+        if key:
+            by_key.setdefault(key, []).append(listing)
+    return by_id, by_key
+
+
+async def evaluate_price_updates(
+    rules: AsyncIOMotorCollection,
+    alerts: AsyncIOMotorCollection,
+    listings: Iterable[Dict],
+    now: Optional[datetime] = None,
+) -> int:
+    """
+    Matches a batch of updated listings against the watchlist rules and
+    writes an alert for every rule that fires. Returns the number of alerts.
+    """
+    by_id, by_key = index_listings(listings)
+    if not by_id and not by_key:
+        return 0
+    lowest = min(_price(listing) for group in (by_id, by_key) for entries in group.values() for listing in entries)
+    cursor = rules.find({
+        "$or": [
+            {"product_id": {"$in": list(by_id)}},
+            {"canonical_key": {"$in": list(by_key)}},
+        ],
+        # Rules with a lower target cannot fire on any listing of the batch
+        "target_price": {"$gte": lowest},
+    })
+
+    now = now or datetime.now(timezone.utc)
+    triggered: List[Dict] = []
+    async for rule in cursor:
+        if rule.get("product_id"):
+            candidates = by_id.get(rule["product_id"], [])
+        else:
+            candidates = by_key.get(rule.get("canonical_key"), [])
+        listing = _cheapest(candidates, rule.get("store_name"))
+        if listing is None:
+            continue
+        price = _price(listing)
+        last_price = rule.get("last_alert_price")
+        if price > rule["target_price"] or (last_price is not None and price >= last_price):
+            continue
+        alert = {field: listing.get(field) for field in ALERT_LISTING_FIELDS}
+        alert.update({
+            "rule_id": rule["_id"],
+            "owner": rule.get("owner"),
+            "price": price,
+            "target_price": rule["target_price"],
+            "previous_alert_price": last_price,
+            "created_at": now,
+        })
+        triggered.append(alert)
+
+    # bulk_write only reports totals, so each rule is claimed on its own: a
+    # concurrent evaluation that alerted this price (or a lower one) first wins
+    claimed = await asyncio.gather(*(
+        rules.find_one_and_update(
+            {"_id": alert["rule_id"], "$or": [{"last_alert_price": None}, {"last_alert_price": {"$gt": alert["price"]}}]},
+            {"$set": {"last_alert_price": alert["price"], "last_alert_at": now}},
+            projection={"_id": 1},
+        )
+        for alert in triggered
+    ))
+    new_alerts = [alert for alert, rule in zip(triggered, claimed) if rule is not None]
+    if new_alerts:
+        await alerts.insert_many(new_alerts, ordered=False)
+    return len(new_alerts)
+
+
+async def evaluate_changed_products(
+    products: AsyncIOMotorCollection,
+    rules: AsyncIOMotorCollection,
+    alerts: AsyncIOMotorCollection,
+    names: Optional[Iterable[str]],
+) -> int:
+    """
+    Evaluates the watchlists against the current listings of the given products.
+    """
+    if names is None:
+        # Only deletes come without names, and they cannot lower a price
+        return 0
+    cursor = products.find(
+        {"product_name": {"$in": list(names)}},
+        {"_id": 0, "price_current": 1, **{field: 1 for field in ALERT_LISTING_FIELDS}},
+    )
+    return await evaluate_price_updates(rules, alerts, await cursor.to_list(length=None))
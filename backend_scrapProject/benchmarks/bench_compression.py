@@ -0,0 +1,83 @@
+"""
+Benchmark de la compresión de respuestas (app/compression.py) con los
+payloads grandes de la API: /products/search con limit=100, /stats y el
+historial crudo de un producto.
+
+Para cada payload y codificación mide los bytes enviados y el tiempo de CPU
+por request de:
+- dinámica: el middleware comprime cada respuesta (nivel GZIP_LEVEL / BROTLI_QUALITY),
+- cacheada: la respuesta cacheada se comprime una sola vez (nivel CACHED_*)
+  y los hits siguientes la sirven ya comprimida, sin costo de CPU.
+
+No necesita MongoDB. brotli es opcional: sin el paquete solo se mide gzip.
+
+Uso (desde backend_scrapProject):
+    python -m benchmarks.bench_compression [repeticiones]
+"""
+import random
+import statistics
+import sys
+import time
+
+from app import compression
+from app.schemas.product import GlobalStats, ProductHistory, ProductSearchResponse
+from benchmarks.bench_projection import STORES, best_offer_doc
+
+
+def search_payload(rng: random.Random) -> bytes:
+    docs = [best_offer_doc(i, rng) for i in range(100)]
+    return ProductSearchResponse(
+        total_results=5000, total_pages=50, current_page=1, limit=100, data=docs,
+    ).model_dump_json().encode()
+
+
+def stats_payload(rng: random.Random) -> bytes:
+    best_prices = [
+        {"product_name": f"Placa de video modelo {i}", "min_price": rng.randint(100_000, 900_000),
+         "store": rng.choice(STORES), "offer_count": rng.randint(1, 6), "price_spread": rng.randint(0, 50_000)}
+        for i in range(50)
+    ]
+    return GlobalStats(best_prices=best_prices).model_dump_json().encode()
+
+
+def history_payload(rng: random.Random) -> bytes:
+    # 180 días de precios crudos en cada tienda
+    history = [
+        {"date": f"2024-{1 + day // 30:02d}-{1 + day % 30:02d}T{rng.randint(0, 23):02d}:00:00",
+         "price": 400_000 + rng.randint(-20_000, 20_000), "store": store}
+        for day in range(180) for store in STORES
+    ]
+    return ProductHistory(product_id="p-1", product_name="Placa de video RTX 4060", history=history).model_dump_json().encode()
+
+
+def measure(body: bytes, encoding: str, cached: bool, repeat: int):
+    timings = []
+    for _ in range(repeat):
+        start = time.process_time()
+        compressed = compression.compress(body, encoding, cached=cached)
+        timings.append((time.process_time() - start) * 1000)
+    return len(compressed), statistics.median(timings)
+
+
+def main(repeat: int):
+    rng = random.Random(42)
+    payloads = [
+        ("search limit=100", search_payload(rng)),
+        ("stats", stats_payload(rng)),
+        ("historial crudo", history_payload(rng)),
+    ]
+    print(f"{'payload':>17} | {'codificación':>12} | {'bytes':>9} | {'ratio':>5} | {'CPU ms/request':>14}")
+    for name, body in payloads:
+        print(f"{name:>17} | {'identity':>12} | {len(body):>9,} | {1:>5.2f} | {0:>14.2f}")
+        for encoding in compression.available_encodings():
+            for cached in (False, True):
+                size, cpu_ms = measure(body, encoding, cached, repeat)
+                label = f"{encoding} {'cache' if cached else 'dinám.'}"
+                # La versión cacheada se comprime una vez; los hits no gastan CPU
+                per_request = 0.0 if cached else cpu_ms
+                print(f"{name:>17} | {label:>12} | {size:>9,} | {len(body) / size:>5.2f} | {per_request:>14.2f}"
+                      + (f"  (una vez: {cpu_ms:.2f} ms)" if cached else ""))
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 50)
@@ -0,0 +1,97 @@
+"""
+Benchmark de /products/search con y sin `fields=card` para una página de
+100 productos: bytes que llegan desde MongoDB (BSON), bytes que se envían al
+navegador (JSON) y tiempo de armar la respuesta.
+
+No necesita MongoDB: los documentos tienen la forma de best_offers y la
+proyección se aplica como lo haría el $project del pipeline.
+
+Uso (desde backend_scrapProject):
+    python -m benchmarks.bench_projection [productos por página]
+"""
+import random
+import statistics
+import sys
+import time
+
+import bson
+from bson import ObjectId
+
+from pydantic_core import to_json
+
+from app.projection import parse_fields, product_projection, select_fields
+from app.schemas.product import ProductSearchResponse
+from app.services.best_offers import OFFER_FIELDS
+
+STORES = ["Compragamer", "MercadoLibre", "FullH4rd", "Venex", "Maximus", "Mexx"]
+
+
+def best_offer_doc(i: int, rng: random.Random):
+    offers = sorted((
+        {
+            "product_id": f"{store[:3].lower()}-{i}",
+            "store_name": store,
+            "price_current": rng.randint(20000, 900000),
+            "price_original": rng.randint(20000, 900000),
+            "discount_percentage": rng.choice([0.0, 5.0, 10.0]),
+            "product_url": f"https://{store.lower()}.example/productos/{i}-placa-de-video-modelo",
+            "image_url": f"https://res.cloudinary.com/demo/image/upload/v1/{store.lower()}/{i}.jpg",
+        }
+        for store in rng.sample(STORES, rng.randint(1, len(STORES)))
+    ), key=lambda offer: offer["price_current"])
+    doc = {"_id": ObjectId(), **offers[0]}
+    doc.update({
+        "product_name": f"Placa de Video RTX 4060 {i} 8GB GDDR6",
+        "category": "Placas de Video",
+        "offers": offers,
+        "offer_count": len(offers),
+        "store_count": len(offers),
+        "max_price": offers[-1]["price_current"],
+        "price_spread": offers[-1]["price_current"] - offers[0]["price_current"],
+        "refreshed_at": "2024-06-01T00:00:00Z",
+    })
+    assert set(OFFER_FIELDS) <= set(doc)
+    return doc
+
+
+def project(doc, projection):
+    return {field: doc[field] for field in projection if field in doc}
+
+
+def build_response(docs, fields):
+    # Same as the end of search_products
+    result = {"total_results": 5000, "total_pages": 50, "current_page": 1, "limit": len(docs), "next_cursor": None}
+    if fields:
+        result["data"] = select_fields(docs, fields)
+        return to_json(result)
+    return ProductSearchResponse(**result, data=docs).model_dump_json().encode()
+
+
+def measure(docs, fields, repeat: int = 200):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        body = build_response(docs, fields)
+        timings.append((time.perf_counter() - start) * 1000)
+    return len(body), statistics.median(timings)
+
+
+def main(page_size: int):
+    rng = random.Random(42)
+    docs = [best_offer_doc(i, rng) for i in range(page_size)]
+    sort_stage = {"price_current": 1, "_id": 1}
+
+    variants = [
+        ("$$ROOT (antes)", None, docs),
+        ("todos los campos", None, [project(doc, product_projection(None, sort_stage)) for doc in docs]),
+        ("fields=card", parse_fields("card"), [project(doc, product_projection(parse_fields("card"), sort_stage)) for doc in docs]),
+    ]
+    print(f"{'variante':>18} | {'BSON desde Mongo':>16} | {'JSON al cliente':>15} | {'armado p50 ms':>13}")
+    for name, fields, page in variants:
+        mongo_bytes = sum(len(bson.encode(doc)) for doc in page)
+        json_bytes, p50 = measure(page, fields)
+        print(f"{name:>18} | {mongo_bytes:>16,} | {json_bytes:>15,} | {p50:>13.2f}")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100)
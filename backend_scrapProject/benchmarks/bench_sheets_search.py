@@ -0,0 +1,112 @@
+"""
+Benchmark de GoogleSheetsService.search_products: motor columnar (pandas)
+contra el recorrido anterior sobre la lista de diccionarios.
+
+Uso (desde backend_scrapProject):
+    python -m benchmarks.bench_sheets_search [filas ...]
+
+Por defecto mide 10k, 100k y 1M filas sintéticas.
+"""
+import random
+import statistics
+import sys
+import time
+from unittest.mock import MagicMock
+
+from app.services.sheets_service import GoogleSheetsService
+
+STORES = ["Compragamer", "MercadoLibre", "FullH4rd", "Venex"]
+FAMILIES = ["RTX 4060", "RTX 4070", "RX 7600", "Ryzen 5 7600", "Core i5 13400", "Memoria DDR5 16GB", "Fuente 650W", "SSD NVMe 1TB"]
+
+QUERIES = [
+    {"q": "rtx"},
+    {"q": "rtx 4060", "sort_by": "price_asc"},
+    {"store": "compragamer", "min_price": 100000, "max_price": 500000},
+    {"q": "ddr5", "store": "mercadolibre", "sort_by": "price_desc", "page": 3},
+    {"sort_by": "newest"},
+]
+
+
+def synthetic_rows(count: int, seed: int = 42):
+    rng = random.Random(seed)
+    rows = [["product_id", "store", "product_name", "price", "null", "discount", "link", "date"]]
+    for i in range(count):
+        family = rng.choice(FAMILIES)
+        rows.append([
+            f"p{i % (count // 10 or 1)}",
+            rng.choice(STORES),
+            f"{family} modelo {rng.randint(1, 500)}",
+            f"$ {rng.randint(20000, 900000):,}".replace(",", "."),
+            "",
+            "0",
+            f"https://tienda.example/{i}",
+            f"2024-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+        ])
+    return rows
+
+
+def make_service(rows) -> GoogleSheetsService:
+    sheet = MagicMock()
+    sheet.get_all_values.return_value = rows
+    return GoogleSheetsService(sheet=sheet)
+
+
+def legacy_search(service, q=None, min_price=None, max_price=None, store=None, sort_by=None, page=1, limit=20):
+    """Implementación anterior de search_products (lista de diccionarios)."""
+    filtered = service.get_all_products()
+    if q:
+        q_lower = q.lower()
+        filtered = [p for p in filtered if q_lower in str(p.get('product_name', '')).lower()]
+    if store:
+        store_lower = store.lower()
+        filtered = [p for p in filtered if str(p.get('store', '')).lower() == store_lower]
+    if min_price is not None:
+        filtered = [p for p in filtered if service._parse_price(p.get('price')) >= min_price]
+    if max_price is not None:
+        filtered = [p for p in filtered if service._parse_price(p.get('price')) <= max_price]
+    filtered = list(filtered)
+    if sort_by == 'price_asc':
+        filtered.sort(key=lambda x: service._parse_price(x.get('price')))
+    elif sort_by == 'price_desc':
+        filtered.sort(key=lambda x: service._parse_price(x.get('price')), reverse=True)
+    elif sort_by == 'newest':
+        filtered.sort(key=lambda x: x.get('date', ''), reverse=True)
+    start = (page - 1) * limit
+    return {"total_results": len(filtered), "data": filtered[start:start + limit]}
+
+
+def time_queries(search, repeat: int):
+    timings = []
+    for _ in range(repeat):
+        for params in QUERIES:
+            start = time.perf_counter()
+            search(**params)
+            timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings), max(timings)
+
+
+def main(sizes):
+    print(f"{'filas':>10} | {'lista p50 ms':>12} | {'lista max ms':>12} | {'columnar p50 ms':>15} | {'columnar max ms':>15} | {'build ms':>9}")
+    for size in sizes:
+        service = make_service(synthetic_rows(size))
+        service.get_all_products()
+
+        start = time.perf_counter()
+        service.get_indexes().frame
+        build_ms = (time.perf_counter() - start) * 1000
+
+        # The columnar path must return the same results
+        for params in QUERIES:
+            expected = legacy_search(service, **params)
+            actual = service.search_products(**params)
+            assert expected["total_results"] == actual["total_results"], params
+            assert [p["product_id"] for p in expected["data"]] == [p["product_id"] for p in actual["data"]], params
+
+        repeat = 3 if size >= 1_000_000 else 10
+        legacy_p50, legacy_max = time_queries(lambda **p: legacy_search(service, **p), repeat)
+        frame_p50, frame_max = time_queries(service.search_products, repeat)
+        print(f"{size:>10} | {legacy_p50:>12.1f} | {legacy_max:>12.1f} | {frame_p50:>15.1f} | {frame_max:>15.1f} | {build_ms:>9.0f}")
+
+
+if __name__ == "__main__":
+    main([int(arg) for arg in sys.argv[1:]] or [10_000, 100_000, 1_000_000])
@@ -0,0 +1,256 @@
+"""
+Catálogo sintético para los benchmarks.
+
+Genera listados de productos con la forma de la colección products (el mismo
+producto en varias tiendas, con títulos escritos distinto en cada una, como
+pasa con los scrapers), su historial de precios y las filas equivalentes de
+la hoja de Google Sheets. Todo sale de un `random.Random(seed)`, así que la
+misma especificación produce siempre el mismo catálogo.
+
+Los generadores son perezosos: se pueden cargar millones de filas por lotes
+sin tenerlas todas en memoria.
+
+    spec = CatalogSpec(stores=8, families=40, products_per_family=50, listings_per_product=4, history_days=30)
+    await load_catalog(db, spec)
+"""
+import random
+from dataclasses import asdict, dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterator, List
+
+from app.services.best_offers import OFFER_FIELDS
+from app.services.canonical import canonical_key
+
+STORE_NAMES = [
+    "Compragamer", "MercadoLibre", "FullH4rd", "Venex", "Maximus", "Mexx",
+    "Gezatek", "Integrados", "Logg", "Armytech", "InvidComputers", "Goldentech",
+]
+
+# (categoría, línea, marcas, precio base en pesos)
+BASE_FAMILIES = [
+    ("Placas de Video", "GeForce RTX 4060 8GB", ["ASUS Dual", "MSI Ventus", "Gigabyte Eagle", "Zotac Twin"], 450000),
+    ("Placas de Video", "GeForce RTX 4070 12GB", ["ASUS TUF", "MSI Gaming X", "Gigabyte Windforce", "PNY Verto"], 850000),
+    ("Placas de Video", "Radeon RX 7600 8GB", ["Sapphire Pulse", "XFX Speedster", "ASRock Challenger"], 380000),
+    ("Procesadores", "Ryzen 5 7600", ["AMD"], 260000),
+    ("Procesadores", "Core i5 13400F", ["Intel"], 230000),
+    ("Memorias", "DDR5 16GB 5600MHz", ["Kingston Fury Beast", "Corsair Vengeance", "Adata XPG Lancer"], 70000),
+    ("Almacenamiento", "SSD NVMe 1TB", ["Kingston NV2", "WD Blue SN580", "Samsung 980"], 80000),
+    ("Fuentes", "650W 80 Plus Bronze", ["Corsair CV", "Thermaltake Smart", "Cooler Master MWE"], 75000),
+    ("Motherboards", "B650M", ["ASUS Prime", "MSI Pro", "Gigabyte Aorus Elite"], 210000),
+    ("Monitores", "27 IPS 165Hz", ["LG UltraGear", "Samsung Odyssey", "AOC Gaming"], 320000),
+]
+
+
+@dataclass
+class CatalogSpec:
+    stores: int = 6
+    families: int = 10
+    products_per_family: int = 100
+    # Tiendas que publican cada producto (como máximo `stores`)
+    listings_per_product: int = 3
+    # Puntos de historial por listado, uno por día
+    history_days: int = 30
+    seed: int = 42
+
+    @property
+    def products(self) -> int:
+        return self.families * self.products_per_family
+
+    @property
+    def listings(self) -> int:
+        return self.products * min(self.listings_per_product, self.stores)
+
+    @property
+    def history_points(self) -> int:
+        return self.listings * self.history_days
+
+    def describe(self) -> Dict:
+        return {**asdict(self), "total_products": self.products, "total_listings": self.listings, "total_history_points": self.history_points}
+
+
+def store_names(spec: CatalogSpec) -> List[str]:
+    names = STORE_NAMES[:spec.stores]
+    names += [f"Tienda {i}" for i in range(len(names), spec.stores)]
+    return names
+
+
+def _title(brand: str, line: str, serial: int, style: int) -> str:
+    # Each store writes the same product differently; all of them share the canonical key
+    if style == 0:
+        return f"{brand} {line} Rev {serial}"
+    if style == 1:
+        return f"Nuevo {brand} {line} - Rev {serial}"
+    if style == 2:
+        return f"{brand.upper()} {line.replace('GB', ' GB')} REV {serial}"
+    return f"{line} {brand} (Rev {serial})"
+
+
+def product_names(spec: CatalogSpec) -> List[str]:
+    """
+    Nombre "limpio" de cada producto del catálogo, en orden.
+    """
+    names = []
+    for family in range(spec.families):
+        _, line, brands, _ = BASE_FAMILIES[family % len(BASE_FAMILIES)]
+        generation = family // len(BASE_FAMILIES)
+        for index in range(spec.products_per_family):
+            serial = generation * spec.products_per_family + index
+            names.append(_title(brands[index % len(brands)], line, serial, 0))
+    return names
+
+
+def generate_listings(spec: CatalogSpec, scraped_at: datetime = None) -> Iterator[Dict]:
+    """
+    Un documento de products por producto y tienda.
+    """
+    rng = random.Random(spec.seed)
+    scraped_at = scraped_at or datetime(2025, 1, 31, tzinfo=timezone.utc)
+    stores = store_names(spec)
+    per_product = min(spec.listings_per_product, spec.stores)
+    number = 0
+    for family in range(spec.families):
+        category, line, brands, base_price = BASE_FAMILIES[family % len(BASE_FAMILIES)]
+        generation = family // len(BASE_FAMILIES)
+        for index in range(spec.products_per_family):
+            serial = generation * spec.products_per_family + index
+            brand = brands[index % len(brands)]
+            price = int(base_price * rng.uniform(0.85, 1.3))
+            for store_index in rng.sample(range(len(stores)), per_product):
+                store = stores[store_index]
+                name = _title(brand, line, serial, store_index % 4)
+                current = int(price * rng.uniform(0.9, 1.15)) // 100 * 100
+                discount = rng.choice([0, 0, 0, 5, 10, 15])
+                number += 1
+                yield {
+                    "product_id": f"{store.lower().replace(' ', '')}-{number}",
+                    "store_name": store,
+                    "product_name": name,
+                    "canonical_key": canonical_key(name),
+                    "category": category,
+                    "price_current": current,
+                    "price_original": current * 100 // (100 - discount) if discount else current,
+                    "discount_percentage": float(discount),
+                    "product_url": f"https://{store.lower().replace(' ', '')}.example/producto/{number}",
+                    "image_url": f"https://res.cloudinary.com/demo/image/upload/{number}.jpg",
+                    "scraped_at": scraped_at,
+                }
+
+
+def generate_history(spec: CatalogSpec, listings: Iterator[Dict] = None) -> Iterator[Dict]:
+    """
+    `history_days` puntos diarios por listado (paseo aleatorio que termina
+    en el precio actual), con la forma de app.services.price_history.
+    """
+    rng = random.Random(spec.seed + 1)
+    for listing in listings if listings is not None else generate_listings(spec):
+        price = listing["price_current"]
+        for day in range(spec.history_days):
+            yield {
+                "ts": listing["scraped_at"] - timedelta(days=day),
+                "meta": {
+                    "product_id": listing["product_id"],
+                    "store_name": listing["store_name"],
+                    "product_name": listing["product_name"],
+                },
+                "price": price,
+            }
+            price = max(100, int(price * rng.uniform(0.97, 1.03)) // 100 * 100)
+
+
+def sheet_rows(spec: CatalogSpec) -> List[List[str]]:
+    """
+    La hoja de Google Sheets equivalente: un renglón por punto de historial.
+    """
+    rows = [["product_id", "store", "product_name", "price", "null", "discount", "link", "date"]]
+    history = generate_history(spec)
+    for listing in generate_listings(spec):
+        for _ in range(spec.history_days):
+            point = next(history)
+            rows.append([
+                listing["product_id"],
+                listing["store_name"],
+                listing["product_name"],
+                f"$ {point['price']:,}".replace(",", "."),
+                "",
+                str(int(listing["discount_percentage"])),
+                listing["product_url"],
+                point["ts"].strftime("%Y-%m-%d"),
+            ])
+    return rows
+
+
+def best_offer_documents(listings: List[Dict], refreshed_at: datetime) -> List[Dict]:
+    """
+    Mismo resultado que app.services.best_offers.best_offers_pipeline, en
+    Python, para cargar el fake en memoria (que no soporta $merge).
+    """
+    groups: Dict[str, Dict[str, Dict]] = {}
+    listings_by_key: Dict[str, List[Dict]] = {}
+    for listing in listings:
+        key = listing.get("canonical_key") or listing["product_name"]
+        listings_by_key.setdefault(key, []).append(listing)
+        stores = groups.setdefault(key, {})
+        best = stores.get(listing["store_name"])
+        if best is None or listing["price_current"] < best["price_current"]:
+            stores[listing["store_name"]] = listing
+    documents = []
+    for key, stores in groups.items():
+        offers = sorted(stores.values(), key=lambda listing: listing["price_current"])
+        best = offers[0]
+        document = {field: best.get(field) for field in OFFER_FIELDS}
+        document.update({
+            "canonical_key": key,
+            "category": best.get("category"),
+            "offers": [{field: offer.get(field) for field in OFFER_FIELDS} for offer in offers],
+            "all_names": sorted({listing["product_name"] for listing in listings_by_key[key]}),
+            "offer_count": len(offers),
+            "store_count": len(offers),
+            "max_price": offers[-1]["price_current"],
+            "price_spread": offers[-1]["price_current"] - best["price_current"],
+            "refreshed_at": refreshed_at,
+        })
+        documents.append(document)
+    return documents
+
+
+def _batches(items: Iterator[Dict], size: int) -> Iterator[List[Dict]]:
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+async def load_catalog(db, spec: CatalogSpec, fake: bool = False, batch_size: int = 5000):
+    """
+    Vacía y carga products, price_history y best_offers. Con MongoDB real
+    crea los índices y calcula best_offers con la agregación de la app; con
+    el fake (mongomock) la calcula en Python.
+    """
+    from app.database import MONGO_COLLECTION, MONGO_BEST_OFFERS_COLLECTION, MONGO_HISTORY_COLLECTION
+    from app.indexes import ensure_indexes
+    from app.services.best_offers import refresh_best_offers
+
+    products = db[MONGO_COLLECTION]
+    history = db[MONGO_HISTORY_COLLECTION]
+    best_offers = db[MONGO_BEST_OFFERS_COLLECTION]
+    for collection in (products, history, best_offers):
+        await collection.drop()
+    if not fake:
+        await ensure_indexes(db)
+
+    for batch in _batches(generate_listings(spec), batch_size):
+        await products.insert_many(batch, ordered=False)
+    for batch in _batches(generate_history(spec), batch_size):
+        await history.insert_many(batch, ordered=False)
+
+    if fake:
+        listings = await products.find({}, {"_id": 0}).to_list(length=None)
+        documents = best_offer_documents(listings, datetime.now(timezone.utc))
+        for batch in _batches(iter(documents), batch_size):
+            await best_offers.insert_many(batch, ordered=False)
+    else:
+        await refresh_best_offers(products, best_offers)
@@ -0,0 +1,78 @@
+"""
+Compara dos resultados de benchmarks.load (por ejemplo, la versión anterior
+contra la actual) escenario por escenario.
+
+Uso (desde backend_scrapProject):
+    python -m benchmarks.compare benchmarks/results/v1.json benchmarks/results/v2.json [--fail-over 10]
+
+Con --fail-over sale con código 1 si el p95 de algún escenario empeoró más
+de ese porcentaje.
+"""
+import argparse
+import json
+import sys
+from typing import Dict, List, Optional
+
+METRICS = ["throughput_rps", "p50_ms", "p95_ms", "p99_ms"]
+
+
+def change(before: float, after: float) -> Optional[float]:
+    if not before:
+        return None
+    return (after - before) / before * 100
+
+
+def compare(before: Dict, after: Dict) -> List[Dict]:
+    rows = []
+    names = list(before["scenarios"]) + [name for name in after["scenarios"] if name not in before["scenarios"]]
+    for name in names + ["TOTAL"]:
+        old = before["total"] if name == "TOTAL" else before["scenarios"].get(name)
+        new = after["total"] if name == "TOTAL" else after["scenarios"].get(name)
+        row = {"scenario": name}
+        for metric in METRICS:
+            row[metric] = (
+                old.get(metric) if old else None,
+                new.get(metric) if new else None,
+                change(old[metric], new[metric]) if old and new else None,
+            )
+        rows.append(row)
+    return rows
+
+
+def _cell(values) -> str:
+    old, new, delta = values
+    if old is None or new is None:
+        return f"{'-' if old is None else old:>9} -> {'-' if new is None else new:<9}{'':>8}"
+    return f"{old:>9.2f} -> {new:<9.2f}{'' if delta is None else f'{delta:+.1f}%':>8}"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compara dos resultados de benchmarks.load")
+    parser.add_argument("before")
+    parser.add_argument("after")
+    parser.add_argument("--fail-over", type=float, default=None, help="máximo empeoramiento de p95 tolerado, en %%")
+    args = parser.parse_args(argv)
+
+    with open(args.before) as file:
+        before = json.load(file)
+    with open(args.after) as file:
+        after = json.load(file)
+    if before.get("catalog") != after.get("catalog") or before.get("concurrency") != after.get("concurrency"):
+        print("Atención: los dos resultados usan catálogos o concurrencia distintos\n")
+
+    print(f"{before.get('git_revision')} -> {after.get('git_revision')}")
+    print(f"{'escenario':<24}" + "".join(f"{metric:^30}" for metric in METRICS))
+    regressions = []
+    for row in compare(before, after):
+        print(f"{row['scenario']:<24}" + "".join(_cell(row[metric]) for metric in METRICS))
+        delta = row["p95_ms"][2]
+        if args.fail_over is not None and delta is not None and delta > args.fail_over:
+            regressions.append(row["scenario"])
+
+    if regressions:
+        print(f"\np95 empeoró más de {args.fail_over}% en: {', '.join(regressions)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
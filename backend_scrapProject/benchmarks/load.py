@@ -0,0 +1,378 @@
+"""
+Prueba de carga de la API con un catálogo sintético (ver benchmarks.catalog).
+
+Carga el catálogo, manda pedidos concurrentes a todos los endpoints con una
+mezcla parecida a la del sitio (mucha búsqueda y typeahead, algo de
+comparaciones, historial y estadísticas) y escribe un JSON con throughput y
+latencias p50/p95/p99 por escenario, para comparar entre versiones con
+`python -m benchmarks.compare`.
+
+Destinos (--target):
+    fake      la app en el proceso sobre un MongoDB en memoria (mongomock-motor).
+              Sirve para probar el driver; mongomock no implementa $text,
+              $replaceWith ni $bucketAuto, así que esos escenarios se omiten.
+    mongo     la app en el proceso sobre MONGO_URI, en la base --database
+              (por defecto hardware_bench, que se vacía y se vuelve a cargar).
+    http://…  un servidor ya levantado (uvicorn, con varios workers, etc.).
+              Cargar antes su base con --target mongo --load-only. El
+              servidor lee MONGO_DATABASE (hardware_db si no está), no
+              --database: levantarlo con MONGO_DATABASE=hardware_bench.
+
+En los destinos en el proceso /sheets usa una hoja falsa con las mismas filas.
+
+Uso (desde backend_scrapProject):
+    python -m benchmarks.load --target mongo --families 40 --products-per-family 250 \\
+        --concurrency 32 --duration 60 --output benchmarks/results/v1.json
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Optional, Tuple
+
+import httpx
+
+from .catalog import CatalogSpec, generate_listings, load_catalog, sheet_rows, store_names
+
+BENCH_DATABASE = "hardware_bench"
+
+# Where the IDs, names and words the scenarios pick from are taken
+SAMPLE_SIZE = 2000
+
+
+@dataclass
+class Scenario:
+    name: str
+    weight: int
+    # rng, catalog sample -> (method, path, query params, JSON body)
+    build: Callable[[random.Random, "CatalogSample"], Tuple[str, str, Optional[Dict], Optional[Dict]]]
+
+
+class CatalogSample:
+    """
+    Valores reales del catálogo para armar pedidos que encuentran algo.
+    """
+
+    def __init__(self, spec: CatalogSpec):
+        rng = random.Random(spec.seed)
+        listings = []
+        for index, listing in enumerate(generate_listings(spec)):
+            # Reservoir sampling, so millions of listings are never held in memory
+            if index < SAMPLE_SIZE:
+                listings.append(listing)
+            else:
+                slot = rng.randint(0, index)
+                if slot < SAMPLE_SIZE:
+                    listings[slot] = listing
+        self.product_ids = [listing["product_id"] for listing in listings]
+        self.names = [listing["product_name"] for listing in listings]
+        self.words = sorted({word for name in self.names for word in name.split() if len(word) > 2 and word.isalnum()})
+        self.stores = store_names(spec)
+        prices = sorted(listing["price_current"] for listing in listings)
+        self.prices = prices or [0]
+
+
+def _price_range(rng, sample):
+    low = rng.choice(sample.prices)
+    return low, low * rng.uniform(1.2, 3.0)
+
+
+def _query(rng, sample):
+    # One or two words of a real product name
+    words = rng.choice(sample.names).split()
+    return " ".join(rng.sample(words, min(len(words), rng.choice([1, 1, 2]))))
+
+
+SCENARIOS: List[Scenario] = [
+    Scenario("search_text", 20, lambda rng, s: ("GET", "/products/search", {"q": _query(rng, s)}, None)),
+    Scenario("search_text_card_page", 8, lambda rng, s: (
+        "GET", "/products/search",
+        {"q": _query(rng, s), "fields": "card", "page": rng.randint(1, 5), "count_mode": "capped"}, None,
+    )),
+    Scenario("search_filters", 8, lambda rng, s: (
+        "GET", "/products/search",
+        dict(zip(("min_price", "max_price"), _price_range(rng, s)), store=rng.choice(s.stores), sort_by="price_desc"), None,
+    )),
+    Scenario("search_browse", 8, lambda rng, s: (
+        "GET", "/products/search", {"page": rng.randint(1, 20), "sort_by": rng.choice([None, "price_desc", "date_desc"])}, None,
+    )),
+    Scenario("facets", 4, lambda rng, s: ("GET", "/products/facets", {"q": _query(rng, s)}, None)),
+    Scenario("suggest", 20, lambda rng, s: ("GET", "/products/suggest", {"q": rng.choice(s.words)[:rng.randint(2, 5)]}, None)),
+    Scenario("stats", 4, lambda rng, s: ("GET", "/products/stats", None, None)),
+    Scenario("count", 2, lambda rng, s: ("GET", "/products/count", None, None)),
+    Scenario("list", 4, lambda rng, s: ("GET", "/products/", {"skip": rng.randint(0, 500), "limit": 20}, None)),
+    Scenario("compare", 8, lambda rng, s: ("GET", f"/products/{rng.choice(s.product_ids)}/compare", None, None)),
+    Scenario("history", 6, lambda rng, s: (
+        "GET", f"/products/{rng.choice(s.product_ids)}/history", {"resolution": rng.choice(["raw", "daily", "weekly"])}, None,
+    )),
+    Scenario("batch", 3, lambda rng, s: (
+        "POST", "/products/batch", None, {"product_ids": rng.sample(s.product_ids, min(20, len(s.product_ids)))},
+    )),
+    Scenario("sheets_search", 3, lambda rng, s: ("GET", "/sheets/search", {"q": _query(rng, s), "sort_by": "price_asc"}, None)),
+    Scenario("sheets_stats", 1, lambda rng, s: ("GET", "/sheets/stats", None, None)),
+    Scenario("sheets_history", 1, lambda rng, s: ("GET", f"/sheets/{rng.choice(s.product_ids)}/history", None, None)),
+]
+
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    # Nearest rank
+    if not sorted_values:
+        return 0.0
+    return sorted_values[max(0, math.ceil(fraction * len(sorted_values)) - 1)]
+
+
+def summarize(latencies: List[float], errors: int, elapsed: float) -> Dict:
+    latencies = sorted(latencies)
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "throughput_rps": round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        "mean_ms": round(sum(latencies) / len(latencies) * 1000, 3) if latencies else 0.0,
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 3),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 3),
+        "max_ms": round(latencies[-1] * 1000, 3) if latencies else 0.0,
+    }
+
+
+async def send(client: httpx.AsyncClient, scenario: Scenario, rng: random.Random, sample: CatalogSample) -> Tuple[float, Optional[int]]:
+    method, path, params, body = scenario.build(rng, sample)
+    if params:
+        params = {key: value for key, value in params.items() if value is not None}
+    start = time.perf_counter()
+    try:
+        response = await client.request(method, path, params=params, json=body)
+        status = response.status_code
+    except Exception:
+        status = None
+    return time.perf_counter() - start, status
+
+
+async def preflight(client: httpx.AsyncClient, scenarios: List[Scenario], sample: CatalogSample) -> Tuple[List[Scenario], Dict[str, str]]:
+    """
+    Runs every scenario a few times; the ones that fail on this target are skipped.
+    """
+    rng = random.Random(0)
+    usable, skipped = [], {}
+    for scenario in scenarios:
+        for _ in range(3):
+            _, status = await send(client, scenario, rng, sample)
+            if status is None or status >= 500:
+                skipped[scenario.name] = f"HTTP {status}" if status else "request failed"
+                break
+        else:
+            usable.append(scenario)
+    return usable, skipped
+
+
+async def drive(
+    client: httpx.AsyncClient,
+    scenarios: List[Scenario],
+    sample: CatalogSample,
+    concurrency: int,
+    duration: float,
+    max_requests: Optional[int],
+    seed: int,
+) -> Tuple[Dict[str, List[float]], Dict[str, int], float]:
+    """
+    `concurrency` workers send requests back to back, picking scenarios by
+    weight, until `duration` seconds or `max_requests` requests.
+    """
+    latencies: Dict[str, List[float]] = {scenario.name: [] for scenario in scenarios}
+    errors: Dict[str, int] = {scenario.name: 0 for scenario in scenarios}
+    weights = [scenario.weight for scenario in scenarios]
+    deadline = time.perf_counter() + duration
+    sent = 0
+
+    async def worker(number: int):
+        nonlocal sent
+        rng = random.Random(seed * 1000 + number)
+        while time.perf_counter() < deadline and (max_requests is None or sent < max_requests):
+            sent += 1
+            scenario = rng.choices(scenarios, weights)[0]
+            elapsed, status = await send(client, scenario, rng, sample)
+            if status is None or status >= 400:
+                errors[scenario.name] += 1
+            else:
+                latencies[scenario.name].append(elapsed)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker(number) for number in range(concurrency)))
+    return latencies, errors, time.perf_counter() - start
+
+
+def _git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except Exception:
+        return None
+
+
+async def _in_process_client(args, spec: CatalogSpec) -> httpx.AsyncClient:
+    """
+    The app with its dependencies pointed at the benchmark database and a fake sheet.
+    """
+    from app import dependencies
+    from app.main import app
+    from app.services.response_cache import response_cache
+    from app.services.sheets_service import AsyncGoogleSheetsService, GoogleSheetsService
+    from app.services.suggest import suggest_index, build_suggest_index
+    from app.database import MONGO_COLLECTION, MONGO_BEST_OFFERS_COLLECTION, MONGO_HISTORY_COLLECTION
+
+    if args.target == "fake":
+        try:
+            from mongomock_motor import AsyncMongoMockClient
+        except ImportError:
+            sys.exit("--target fake necesita mongomock-motor: pip install mongomock-motor")
+        db = AsyncMongoMockClient()[args.database]
+    else:
+        from app import database
+        db = database.connect()[args.database]
+
+    if not args.no_load:
+        started = time.perf_counter()
+        await load_catalog(db, spec, fake=args.target == "fake")
+        print(f"Catálogo cargado en {time.perf_counter() - started:.1f} s")
+    if args.load_only:
+        # The API reads MONGO_DATABASE, which the load above does not touch
+        print(f"Para probar un servidor: MONGO_DATABASE={args.database} uvicorn app.main:app --workers 4")
+        sys.exit(0)
+
+    await build_suggest_index(db[MONGO_COLLECTION], suggest_index)
+
+    class FakeSheet:
+        def __init__(self, rows):
+            self.rows = rows
+
+        def get_all_values(self):
+            return self.rows
+
+    sheets = AsyncGoogleSheetsService(GoogleSheetsService(sheet=FakeSheet(sheet_rows(spec))))
+
+    async def get_db():
+        return db
+
+    overrides = {
+        dependencies.get_db: get_db,
+        dependencies.get_product_collection: lambda: db[MONGO_COLLECTION],
+        dependencies.get_best_offer_collection: lambda: db[MONGO_BEST_OFFERS_COLLECTION],
+        dependencies.get_price_history_collection: lambda: db[MONGO_HISTORY_COLLECTION],
+        dependencies.get_sheets_service: lambda: sheets,
+    }
+    app.dependency_overrides.update(overrides)
+    response_cache.invalidate()
+    if args.no_cache:
+        # Nothing fits, so every request reaches MongoDB
+        response_cache.max_bytes = 0
+    return httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=app, raise_app_exceptions=False),
+        base_url="http://bench",
+        timeout=args.timeout,
+    )
+
+
+async def run(args) -> Dict:
+    spec = CatalogSpec(
+        stores=args.stores,
+        families=args.families,
+        products_per_family=args.products_per_family,
+        listings_per_product=args.listings_per_product,
+        history_days=args.history_days,
+        seed=args.seed,
+    )
+    if args.target.startswith("http"):
+        client = httpx.AsyncClient(
+            base_url=args.target,
+            timeout=args.timeout,
+            limits=httpx.Limits(max_connections=args.concurrency),
+        )
+    else:
+        client = await _in_process_client(args, spec)
+
+    sample = CatalogSample(spec)
+    scenarios = [scenario for scenario in SCENARIOS if not args.only or scenario.name in args.only]
+    async with client:
+        scenarios, skipped = await preflight(client, scenarios, sample)
+        for name, reason in skipped.items():
+            print(f"Escenario omitido: {name} ({reason})")
+        if not scenarios:
+            sys.exit("Ningún escenario funciona contra este destino")
+        if args.warmup:
+            await drive(client, scenarios, sample, args.concurrency, args.warmup, None, args.seed + 1)
+        latencies, errors, elapsed = await drive(
+            client, scenarios, sample, args.concurrency, args.duration, args.requests, args.seed,
+        )
+
+    all_latencies = [value for values in latencies.values() for value in values]
+    return {
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "git_revision": _git_revision(),
+        "python": platform.python_version(),
+        "target": args.target if args.target.startswith("http") or args.target == "fake" else "mongo",
+        "response_cache": not args.no_cache,
+        "concurrency": args.concurrency,
+        "duration_s": round(elapsed, 3),
+        "catalog": spec.describe(),
+        "skipped": skipped,
+        "total": summarize(all_latencies, sum(errors.values()), elapsed),
+        "scenarios": {
+            scenario.name: {"weight": scenario.weight, **summarize(latencies[scenario.name], errors[scenario.name], elapsed)}
+            for scenario in scenarios
+        },
+    }
+
+
+def print_report(report: Dict):
+    print(f"\n{'escenario':<24}{'pedidos':>9}{'errores':>9}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    rows = list(report["scenarios"].items()) + [("TOTAL", report["total"])]
+    for name, stats in rows:
+        print(
+            f"{name:<24}{stats['requests']:>9}{stats['errors']:>9}{stats['throughput_rps']:>10.1f}"
+            f"{stats['p50_ms']:>10.2f}{stats['p95_ms']:>10.2f}{stats['p99_ms']:>10.2f}"
+        )
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Prueba de carga con catálogo sintético")
+    parser.add_argument("--target", default="fake", help="fake, mongo o la URL de un servidor")
+    parser.add_argument("--database", default=os.getenv("BENCH_DATABASE", BENCH_DATABASE))
+    parser.add_argument("--stores", type=int, default=6)
+    parser.add_argument("--families", type=int, default=10)
+    parser.add_argument("--products-per-family", type=int, default=100)
+    parser.add_argument("--listings-per-product", type=int, default=3)
+    parser.add_argument("--history-days", type=int, default=30)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=30.0, help="segundos de medición")
+    parser.add_argument("--requests", type=int, default=None, help="cortar después de N pedidos")
+    parser.add_argument("--warmup", type=float, default=5.0, help="segundos sin medir antes de empezar")
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--only", nargs="*", help="escenarios a correr (por defecto todos)")
+    parser.add_argument("--no-cache", action="store_true", help="desactiva el caché de respuestas (en el proceso)")
+    parser.add_argument("--no-load", action="store_true", help="usa el catálogo ya cargado")
+    parser.add_argument("--load-only", action="store_true", help="sólo carga el catálogo")
+    parser.add_argument("--output", help="archivo JSON con los resultados")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    report = asyncio.run(run(args))
+    print_report(report)
+    if args.output:
+        os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+        with open(args.output, "w") as file:
+            json.dump(report, file, indent=2)
+        print(f"\nResultados en {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -12,13 +12,8 @@ def test_search():
         ["3", "Store A", "Laptop Air", "1200", "", "0", "http://a.com", "2023-01-03"]
     ]
     
-    service = GoogleSheetsService("dummy_path", "dummy_spreadsheet", "dummy_sheet")
-    service.sheet = mock_sheet
-    # Mock _parse_price to avoid issues if it uses something complex, though it's simple
-    # But wait, _parse_price is an instance method, so we should let it run or mock it if needed.
-    # It's better to let it run as it's part of the logic.
-    # We need to mock credentials loading though, which happens in __init__.
-    # So we should subclass or mock __init__.
+    # Passing the sheet skips the credentials loading in __init__
+    service = GoogleSheetsService(sheet=mock_sheet)
     
     print("Testing search_products...")
     
@@ -45,10 +40,5 @@ def test_search():
     
     print("All tests passed!")
 
-# We need to bypass __init__ to avoid real credentials
-GoogleSheetsService.__init__ = lambda self, a, b, c: None
-# We also need to set the mocked sheet manually after init
-# But wait, if we bypass init, we need to make sure we set attributes.
-
 if __name__ == "__main__":
     test_search()
@@ -0,0 +1,161 @@
+from datetime import datetime
+from unittest.mock import AsyncMock, MagicMock
+
+import mongomock
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.dependencies import get_price_history_collection, get_product_collection
+from app.queries import batch_pipeline
+from app.routers.products import MAX_BATCH_SIZE
+
+LISTINGS = [
+    {"product_id": "1", "product_name": "RTX 4060 ASUS", "canonical_key": "4060 asus rtx", "store_name": "Store 1", "price_current": 300, "product_url": "http://store.com/1"},
+    {"product_id": "2", "product_name": "ASUS RTX 4060", "canonical_key": "4060 asus rtx", "store_name": "Store 2", "price_current": 310, "product_url": "http://store.com/2"},
+    # Not backfilled yet: only its name identifies it
+    {"product_id": "3", "product_name": "Fuente 650W", "store_name": "Store 1", "price_current": 90, "product_url": "http://store.com/3"},
+    {"product_id": "4", "product_name": "Fuente 650W", "canonical_key": None, "store_name": "Store 2", "price_current": 95, "product_url": "http://store.com/4"},
+    {"product_id": "5", "product_name": "SSD 1TB", "store_name": "Store 1", "price_current": 60, "product_url": "http://store.com/5"},
+    # Loaded from a sheet row without a link
+    {"product_id": "6", "product_name": "Cooler X", "store_name": "Store 2", "price_current": 20, "product_url": None},
+]
+
+
+def bind(value, variables):
+    if isinstance(value, str) and value.startswith("$$") and value[2:] in variables:
+        return variables[value[2:]]
+    if isinstance(value, dict):
+        return {key: bind(item, variables) for key, item in value.items()}
+    if isinstance(value, list):
+        return [bind(item, variables) for item in value]
+    return value
+
+
+def run_pipeline(pipeline):
+    # mongomock has no $lookup with `let`: run the join pipeline once per document instead
+    collection = mongomock.MongoClient().db.products
+    collection.insert_many([dict(listing) for listing in LISTINGS])
+    *stages, lookup = pipeline
+    lookup = lookup["$lookup"]
+    for doc in collection.aggregate(stages):
+        variables = {name: doc.get(field[1:]) for name, field in lookup["let"].items()}
+        doc[lookup["as"]] = list(collection.aggregate(bind(lookup["pipeline"], variables)))
+        yield doc
+
+
+def run_batch(product_ids):
+    return {doc["_id"]: doc for doc in run_pipeline(batch_pipeline("products", product_ids))}
+
+
+def fake_products():
+    products = MagicMock()
+    products.name = "products"
+
+    async def aggregate(pipeline):
+        for doc in run_pipeline(pipeline):
+            yield doc
+
+    products.aggregate.side_effect = aggregate
+    return products
+
+
+def fake_history():
+    history = MagicMock()
+
+    def aggregate(pipeline):
+        product_ids = pipeline[0]["$match"]["meta.product_id"]["$in"]
+        result = MagicMock()
+        result.to_list = AsyncMock(return_value=[
+            {"product_id": product_id, "date": datetime(2024, 6, day), "price": 100 + day, "store": "Store 1"}
+            for day in (1, 2) for product_id in product_ids
+        ])
+        return result
+
+    history.aggregate.side_effect = aggregate
+    return history
+
+
+def post_batch(body, products=None, history=None):
+    app.dependency_overrides[get_product_collection] = lambda: products or fake_products()
+    app.dependency_overrides[get_price_history_collection] = lambda: history or fake_history()
+    try:
+        return TestClient(app).post("/products/batch", json=body)
+    finally:
+        app.dependency_overrides.pop(get_product_collection)
+        app.dependency_overrides.pop(get_price_history_collection)
+
+
+def stores(doc):
+    return sorted(listing["store_name"] for listing in doc["listings"])
+
+
+def test_batch_joins_listings_by_canonical_key():
+    found = run_batch(["1", "5"])
+
+    assert stores(found["1"]) == ["Store 1", "Store 2"]
+    assert stores(found["5"]) == ["Store 1"]
+    assert set(found["1"]["listings"][0]) == {"store_name", "price_current", "product_url"}
+
+
+def test_batch_listing_without_key_matches_by_name():
+    found = run_batch(["3"])
+
+    assert found["3"]["canonical_key"] is None
+    # Both listings of the name, and not every other listing without a key
+    assert stores(found["3"]) == ["Store 1", "Store 2"]
+
+
+def test_batch_rejects_more_ids_than_the_cap():
+    products = fake_products()
+    response = post_batch({"product_ids": [str(i) for i in range(MAX_BATCH_SIZE + 1)]}, products)
+
+    assert response.status_code == 400
+    products.aggregate.assert_not_called()
+
+
+def test_batch_counts_repeated_ids_once():
+    products = fake_products()
+    ids = ["1", "5", "1"] + ["5"] * MAX_BATCH_SIZE
+
+    response = post_batch({"product_ids": ids}, products)
+
+    assert response.status_code == 200
+    assert [item["product_id"] for item in response.json()["items"]] == ["1", "5"]
+    assert products.aggregate.call_args.args[0][0] == {"$match": {"product_id": {"$in": ["1", "5"]}}}
+
+
+def test_batch_reports_unknown_ids():
+    response = post_batch({"product_ids": ["missing", "5", "other"]})
+
+    body = response.json()
+    assert [item["product_id"] for item in body["items"]] == ["5"]
+    assert body["not_found"] == ["missing", "other"]
+
+
+def test_batch_history_is_fetched_once_and_grouped_per_id():
+    history = fake_history()
+
+    response = post_batch({"product_ids": ["1", "3", "missing"], "include_history": True}, history=history)
+
+    # One query for every found product, none for the unknown one
+    assert history.aggregate.call_count == 1
+    assert history.aggregate.call_args.args[0][0]["$match"]["meta.product_id"]["$in"] == ["1", "3"]
+    items = {item["product_id"]: item for item in response.json()["items"]}
+    assert [point["price"] for point in items["1"]["history"]] == [101, 102]
+    assert [point["date"] for point in items["3"]["history"]] == ["2024-06-01", "2024-06-02"]
+
+
+def test_batch_without_history_omits_it():
+    history = fake_history()
+
+    response = post_batch({"product_ids": ["1"]}, history=history)
+
+    assert response.json()["items"][0]["history"] is None
+    history.aggregate.assert_not_called()
+
+
+def test_batch_listing_without_link():
+    response = post_batch({"product_ids": ["6"]})
+
+    assert response.status_code == 200
+    assert response.json()["items"][0]["comparison"] == [{"store": "Store 2", "price": 20, "link": None}]
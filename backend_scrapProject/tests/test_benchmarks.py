@@ -0,0 +1,48 @@
+from benchmarks.catalog import CatalogSpec, best_offer_documents, generate_history, generate_listings, sheet_rows
+from benchmarks.compare import compare
+from benchmarks.load import percentile, summarize
+
+SPEC = CatalogSpec(stores=5, families=3, products_per_family=4, listings_per_product=3, history_days=2)
+
+
+def test_catalog_is_reproducible_and_sized_by_the_spec():
+    listings = list(generate_listings(SPEC))
+
+    assert listings == list(generate_listings(SPEC))
+    assert len(listings) == SPEC.listings == 36
+    assert len({(listing["product_id"], listing["store_name"]) for listing in listings}) == 36
+    assert len(list(generate_history(SPEC))) == SPEC.history_points
+    assert len(sheet_rows(SPEC)) == SPEC.history_points + 1
+
+
+def test_store_titles_of_a_product_share_its_canonical_key():
+    listings = list(generate_listings(SPEC))
+
+    documents = best_offer_documents(listings, refreshed_at=None)
+
+    assert len({listing["product_name"] for listing in listings}) > SPEC.products
+    assert len(documents) == SPEC.products
+    assert all(document["store_count"] == 3 for document in documents)
+    assert all(document["price_current"] == document["offers"][0]["price_current"] for document in documents)
+
+
+def test_summary_percentiles():
+    stats = summarize([i / 1000 for i in range(1, 101)], errors=2, elapsed=2.0)
+
+    assert percentile([], 0.5) == 0.0
+    assert (stats["p50_ms"], stats["p95_ms"], stats["p99_ms"]) == (50.0, 95.0, 99.0)
+    assert stats["throughput_rps"] == 50.0
+    assert stats["errors"] == 2
+
+
+def test_compare_reports_relative_change():
+    before = {"scenarios": {"search": {"throughput_rps": 100, "p50_ms": 10, "p95_ms": 20, "p99_ms": 40}},
+              "total": {"throughput_rps": 100, "p50_ms": 10, "p95_ms": 20, "p99_ms": 40}}
+    after = {"scenarios": {"search": {"throughput_rps": 80, "p50_ms": 10, "p95_ms": 30, "p99_ms": 40}},
+             "total": {"throughput_rps": 80, "p50_ms": 10, "p95_ms": 30, "p99_ms": 40}}
+
+    search, total = compare(before, after)
+
+    assert search["p95_ms"] == (20, 30, 50.0)
+    assert search["throughput_rps"][2] == -20.0
+    assert total["scenario"] == "TOTAL"
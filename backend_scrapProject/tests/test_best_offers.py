@@ -0,0 +1,208 @@
+import asyncio
+from datetime import datetime, timezone
+from unittest.mock import AsyncMock, MagicMock
+
+from pymongo.errors import OperationFailure
+
+from app.services import best_offers as best_offers_module
+from app.services import change_feed
+from app.services.best_offers import best_offers_pipeline, refresh_best_offers
+from app.services.canonical import canonical_key
+
+
+def fake_collections():
+    products = MagicMock()
+    products.aggregate.return_value.to_list = AsyncMock(return_value=[])
+    best_offers = MagicMock()
+    best_offers.name = "best_offers"
+    best_offers.delete_many = AsyncMock()
+    return products, best_offers
+
+
+def stage(pipeline, name):
+    return next(step[name] for step in pipeline if name in step)
+
+
+def test_pipeline_merges_cheapest_offers_by_canonical_key():
+    refreshed_at = datetime(2024, 6, 1, tzinfo=timezone.utc)
+    pipeline = best_offers_pipeline("best_offers", refreshed_at, match={"product_name": {"$in": ["GPU A"]}})
+
+    assert pipeline[0] == {"$match": {"product_name": {"$in": ["GPU A"]}}}
+    # Sorted by price before $first, so each store keeps its cheapest listing
+    assert pipeline[2] == {"$sort": {"canonical_key": 1, "price_current": 1}}
+    assert stage(pipeline, "$group")["_id"]["store_name"] == "$store_name"
+    product = stage(pipeline, "$replaceWith")["$mergeObjects"]
+    assert product[0] == {"$first": "$offers"}
+    assert product[1]["refreshed_at"] == refreshed_at
+    # Every title of the product, not only the cheapest offer's, is text searchable
+    assert product[1]["all_names"]["$reduce"]["input"] == "$names"
+    assert pipeline[-1] == {"$merge": {
+        "into": "best_offers", "on": "canonical_key", "whenMatched": "replace", "whenNotMatched": "insert",
+    }}
+
+
+def test_refresh_deletes_products_not_rewritten_in_scope():
+    products, best_offers = fake_collections()
+
+    asyncio.run(refresh_best_offers(products, best_offers, ["RTX4060 ASUS"]))
+
+    pipeline = products.aggregate.call_args.args[0]
+    refreshed_at = stage(pipeline, "$replaceWith")["$mergeObjects"][1]["refreshed_at"]
+    key = canonical_key("RTX4060 ASUS")
+    assert pipeline[0] == {"$match": {"$or": [
+        {"canonical_key": {"$in": [key]}}, {"product_name": {"$in": ["RTX4060 ASUS"]}},
+    ]}}
+    best_offers.delete_many.assert_awaited_once_with({
+        "refreshed_at": {"$lt": refreshed_at},
+        "$or": [{"canonical_key": {"$in": [key, "RTX4060 ASUS"]}}, {"product_name": {"$in": ["RTX4060 ASUS"]}}],
+    })
+
+
+def test_full_refresh_deletes_every_stale_product():
+    products, best_offers = fake_collections()
+
+    asyncio.run(refresh_best_offers(products, best_offers))
+
+    pipeline = products.aggregate.call_args.args[0]
+    assert "$or" not in pipeline[0]["$match"]
+    assert list(best_offers.delete_many.await_args.args[0]) == ["refreshed_at"]
+
+
+def test_refresh_is_chunked(monkeypatch):
+    monkeypatch.setattr(best_offers_module, "REFRESH_CHUNK_SIZE", 2)
+    products, best_offers = fake_collections()
+
+    asyncio.run(refresh_best_offers(products, best_offers, ["A", "B", "C"]))
+
+    assert products.aggregate.call_count == 2
+    assert best_offers.delete_many.await_count == 2
+
+
+class FakeStream:
+    def __init__(self, events, token="token"):
+        self.events = list(events)
+        self.resume_token = token
+        self.alive = True
+
+    async def next(self):
+        if not self.events:
+            self.alive = False
+            raise OperationFailure("stream closed", code=43)
+        return self.events.pop(0)
+
+    async def try_next(self):
+        return self.events.pop(0) if self.events else None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+
+def change(name):
+    return {"operationType": "update", "fullDocument": {"product_name": name}}
+
+
+def test_changes_are_batched():
+    stream = FakeStream([change("A"), change("B"), change("A")])
+    assert asyncio.run(change_feed._next_batch(stream, batch_window=0.05, max_batch=100)) == {"A", "B"}
+
+    # A change without names (a delete) makes the whole batch "anything changed"
+    stream = FakeStream([change("A"), {"operationType": "delete"}, change("B")])
+    assert asyncio.run(change_feed._next_batch(stream, batch_window=0.05, max_batch=100)) is None
+
+    stream = FakeStream([change("A"), change("B"), change("C")])
+    assert asyncio.run(change_feed._next_batch(stream, batch_window=5, max_batch=2)) == {"A", "B"}
+
+
+def test_deletes_with_pre_images_refresh_only_their_product():
+    delete = {"operationType": "delete", "fullDocumentBeforeChange": {"product_name": "B"}}
+
+    stream = FakeStream([change("A"), delete])
+    assert asyncio.run(change_feed._next_batch(stream, batch_window=0.05, max_batch=100)) == {"A", "B"}
+
+
+def test_pre_images_are_enabled_on_products():
+    db = MagicMock()
+    db.command = AsyncMock()
+    assert asyncio.run(change_feed.enable_pre_images(db, "products"))
+    db.command.assert_awaited_once_with({"collMod": "products", "changeStreamPreAndPostImages": {"enabled": True}})
+
+    # Servers before 6.0 reject the option: deletes keep meaning "anything changed"
+    db.command = AsyncMock(side_effect=OperationFailure("unknown option", code=72))
+    assert not asyncio.run(change_feed.enable_pre_images(db, "products"))
+
+
+def test_canonical_key_backfill_is_not_a_change():
+    backfill = {
+        "operationType": "update",
+        "fullDocument": {"product_name": "B"},
+        "updateDescription": {"updatedFields": {"canonical_key": "b"}, "removedFields": []},
+    }
+    price = {**change("C"), "updateDescription": {"updatedFields": {"price_current": 10, "canonical_key": "c"}}}
+
+    stream = FakeStream([backfill, change("A"), backfill, price])
+    assert asyncio.run(change_feed._next_batch(stream, batch_window=0.05, max_batch=100)) == {"A", "C"}
+
+
+def test_unavailable_stream_is_retried_with_backoff_and_resynced(monkeypatch):
+    collection = MagicMock()
+    collection.watch.side_effect = OperationFailure("replica sets only", code=40573)
+    resync = AsyncMock()
+    delays = []
+
+    async def sleep(delay):
+        delays.append(delay)
+        if len(delays) == 4:
+            raise asyncio.CancelledError
+
+    monkeypatch.setattr(change_feed.asyncio, "sleep", sleep)
+    try:
+        asyncio.run(change_feed.watch_products(collection, resync=resync, resync_interval=3600, max_retry_delay=4))
+    except asyncio.CancelledError:
+        pass
+
+    assert delays == [1.0, 2.0, 4, 4]
+    # Once right away, then every resync_interval
+    assert resync.await_count == 1
+
+
+def test_stream_resumes_after_the_last_notified_change(monkeypatch):
+    collection = MagicMock()
+    collection.watch.side_effect = [FakeStream([change("A")], token="after-A"), OperationFailure("down", code=91)]
+    notified = []
+
+    async def listener(names):
+        notified.append(names)
+
+    async def sleep(delay):
+        if collection.watch.call_count == 2:
+            raise asyncio.CancelledError
+
+    monkeypatch.setattr(change_feed, "_listeners", [listener])
+    monkeypatch.setattr(change_feed, "_shared_listeners", [])
+    monkeypatch.setattr(change_feed.asyncio, "sleep", sleep)
+    try:
+        asyncio.run(change_feed.watch_products(collection, batch_window=0))
+    except asyncio.CancelledError:
+        pass
+
+    assert notified == [{"A"}]
+    assert collection.watch.call_args_list[0].kwargs["resume_after"] is None
+    assert collection.watch.call_args_list[1].kwargs["resume_after"] == "after-A"
+
+
+def test_text_index_covers_every_store_title():
+    from app.indexes import BEST_OFFER_INDEXES, OBSOLETE_INDEXES
+
+    text_index = next(index.document for index in BEST_OFFER_INDEXES if index.document["name"] == "names_text")
+    assert dict(text_index["key"]) == {"product_name": "text", "all_names": "text"}
+    assert "product_name_text" in OBSOLETE_INDEXES["best_offers"]
+
+
+def test_products_have_no_text_index():
+    from app.indexes import OBSOLETE_INDEXES, PRODUCT_INDEXES
+
+    assert not any("text" in dict(index.document["key"]).values() for index in PRODUCT_INDEXES)
+    assert "product_name_text" in OBSOLETE_INDEXES["products"]
@@ -0,0 +1,67 @@
+import asyncio
+from unittest.mock import AsyncMock, MagicMock
+
+from app.services.best_offers import best_offers_pipeline
+from app.services.canonical import canonical_key, assign_canonical_keys, backfill_canonical_keys
+
+
+def test_same_product_with_different_titles_shares_key():
+    assert canonical_key("Placa de Video ASUS Dual GeForce RTX 4060 8GB") == canonical_key("ASUS DUAL RTX4060 8 GB GeForce")
+    assert canonical_key("Procesador Intel Core i5-13400F") == canonical_key("procesador intel core I5 13400f")
+    assert canonical_key("Teclado Mecánico Redragon") == canonical_key("teclado mecanico redragon")
+    assert canonical_key("RTX 4060") != canonical_key("RTX 4060 Ti")
+
+
+def test_key_of_only_stopwords_falls_back_to_name():
+    assert canonical_key("De La") == "de la"
+
+
+def test_assign_updates_names_without_the_right_key():
+    products = MagicMock()
+    products.bulk_write = AsyncMock(return_value=MagicMock(modified_count=3))
+
+    updated = asyncio.run(assign_canonical_keys(products, {"RTX4060 ASUS"}))
+
+    operation = products.bulk_write.await_args.args[0][0]
+    assert operation._filter == {"product_name": "RTX4060 ASUS", "canonical_key": {"$ne": "4060 asus rtx"}}
+    assert operation._doc == {"$set": {"canonical_key": "4060 asus rtx"}}
+    assert updated == 3
+    assert asyncio.run(assign_canonical_keys(products, None)) == 0
+
+
+class FakeCursor:
+    def __init__(self, docs):
+        self.docs = docs
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        for doc in self.docs:
+            yield doc
+
+
+def test_backfill_writes_only_missing_or_outdated_keys_in_batches():
+    docs = [
+        {"_id": 1, "product_name": "GPU A"},
+        {"_id": 2, "product_name": "GPU A", "canonical_key": "a gpu"},
+        {"_id": 3, "product_name": "GPU B", "canonical_key": "old"},
+        {"_id": 4, "product_name": "GPU C"},
+    ]
+    products = MagicMock()
+    products.find.return_value = FakeCursor(docs)
+    products.bulk_write = AsyncMock(side_effect=lambda ops, ordered: MagicMock(modified_count=len(ops)))
+
+    updated = asyncio.run(backfill_canonical_keys(products, batch_size=2))
+
+    batches = [[op._filter["_id"] for op in call.args[0]] for call in products.bulk_write.await_args_list]
+    assert batches == [[1, 3], [4]]
+    assert updated == 3
+
+
+def test_best_offers_grouped_and_merged_by_canonical_key():
+    pipeline = best_offers_pipeline("best_offers", refreshed_at=None)
+
+    first_group = next(stage["$group"] for stage in pipeline if "$group" in stage)
+    assert first_group["_id"]["canonical_key"] == {"$ifNull": ["$canonical_key", "$product_name"]}
+    assert pipeline[-1]["$merge"]["on"] == "canonical_key"
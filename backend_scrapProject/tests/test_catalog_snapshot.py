@@ -0,0 +1,89 @@
+from unittest.mock import MagicMock
+
+from app.services.catalog_snapshot import SharedSheetsService
+from tests.test_sheets_service import ROWS, make_service
+
+
+def make_shared(path, rows=ROWS) -> SharedSheetsService:
+    sheet = MagicMock()
+    sheet.get_all_values.return_value = rows
+    return SharedSheetsService(snapshot_path=str(path), sheet=sheet)
+
+
+def make_writer(path, rows=ROWS) -> SharedSheetsService:
+    writer = make_shared(path, rows)
+    assert writer.store.acquire_writer()
+    writer.publish()
+    return writer
+
+
+def test_mapped_catalog_answers_like_the_sheet(tmp_path):
+    path = tmp_path / "catalog.snap"
+    # Kept alive: a collected writer releases its lock and the reader would take over
+    writer = make_writer(path)
+    shared = make_shared(path)
+    local = make_service()
+
+    for params in ({"q": "gpu", "store": "store 1", "sort_by": "price_asc"},
+                   {"min_price": 95, "max_price": 150, "sort_by": "price_desc"},
+                   {"sort_by": "newest", "limit": 2, "page": 2},
+                   {"limit": 2, "page": 3}):
+        assert shared.search_products(**params) == local.search_products(**params)
+    assert shared.get_product_history("1") == local.get_product_history("1")
+    assert shared.get_product_comparison("1") == local.get_product_comparison("1")
+    assert shared.get_product_history("missing") is None
+    assert shared.get_global_stats() == local.get_global_stats()
+    assert shared.get_product_count() == local.get_product_count()
+    # Readers never download the sheet
+    shared.sheet.get_all_values.assert_not_called()
+    assert writer.sheet.get_all_values.call_count == 1
+
+
+def test_columns_are_views_on_the_mapped_file(tmp_path):
+    path = tmp_path / "catalog.snap"
+    writer = make_writer(path)
+
+    catalog = make_shared(path).get_indexes()
+
+    for array in (catalog.prices, catalog.name_codes, catalog.sort_orders["price_asc"], catalog.by_id_rows):
+        assert not array.flags.owndata
+        assert not array.flags.writeable
+
+
+def test_new_version_is_swapped_in_while_old_readers_keep_theirs(tmp_path):
+    path = tmp_path / "catalog.snap"
+    writer = make_writer(path)
+    reader = make_shared(path)
+    old = reader.get_indexes()
+
+    new_row = ["4", "Store 1", "SSD D", "300", "", "0", "http://store1.com", "2023-01-03"]
+    writer.sheet.batch_get.return_value = [[ROWS[0]], [ROWS[-1]], [new_row]]
+    writer.publish()
+    new = reader.store.current(force=True)
+
+    assert new is not old
+    assert len(new.source) == 6 and new.by_id.get("4")[0]["price"] == 300
+    assert len(old.source) == 5 and old.by_id.get("4") is None
+
+
+def test_unchanged_sheet_only_touches_the_file(tmp_path):
+    path = tmp_path / "catalog.snap"
+    writer = make_writer(path)
+    reader = make_shared(path)
+    first = reader.get_indexes()
+    writer.sheet.batch_get.return_value = [[ROWS[0]], [ROWS[-1]], []]
+
+    writer.publish()
+
+    assert reader.store.current(force=True) is first
+
+
+def test_single_writer_and_takeover(tmp_path):
+    path = tmp_path / "catalog.snap"
+    writer = make_writer(path)
+    other = make_shared(path)
+
+    assert not other.store.acquire_writer()
+    # The writer process exits: the OS releases its lock
+    writer.store._writer_lock_file.close()
+    assert other.store.acquire_writer()
@@ -0,0 +1,119 @@
+import gzip
+import json
+
+from bson import ObjectId
+
+from fastapi import FastAPI
+from fastapi.responses import JSONResponse, StreamingResponse
+from fastapi.testclient import TestClient
+
+from app import compression
+from app.compression import CompressionMiddleware, choose_encoding, decoded_etag, encoded_etag
+from app.main import app
+from app.dependencies import get_best_offer_collection
+from app.services.response_cache import ResponseCache, response_cache
+from tests.test_response_cache import fake_search_collection
+
+LARGE = {"data": [{"product_name": f"GPU {i}", "price_current": 100 + i} for i in range(200)]}
+
+
+def make_app():
+    test_app = FastAPI()
+
+    @test_app.get("/large")
+    async def large():
+        return JSONResponse(LARGE, headers={"ETag": '"abc"'})
+
+    @test_app.get("/small")
+    async def small():
+        return {"ok": True}
+
+    @test_app.get("/stream")
+    async def stream():
+        async def lines():
+            for item in LARGE["data"]:
+                yield json.dumps(item) + "\n"
+        return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+    test_app.add_middleware(CompressionMiddleware, minimum_size=1024)
+    return TestClient(test_app)
+
+
+def test_choose_encoding_honours_q_values():
+    assert choose_encoding(None) is None
+    assert choose_encoding("identity") is None
+    assert choose_encoding("gzip;q=0, deflate") is None
+    assert choose_encoding("deflate, gzip;q=0.5") == "gzip"
+    assert choose_encoding("*") == compression.available_encodings()[0]
+
+
+def test_etag_suffix_round_trips():
+    assert encoded_etag('"abc"', "gzip") == '"abc-gzip"'
+    assert decoded_etag('"abc-gzip"') == '"abc"'
+    assert decoded_etag('"abc"') == '"abc"'
+
+
+def test_large_json_is_gzipped_and_small_is_not():
+    client = make_app()
+
+    large = client.get("/large", headers={"Accept-Encoding": "gzip"})
+    small = client.get("/small", headers={"Accept-Encoding": "gzip"})
+    plain = client.get("/large", headers={"Accept-Encoding": "identity"})
+
+    assert large.headers["content-encoding"] == "gzip"
+    assert large.headers["etag"] == '"abc-gzip"'
+    assert "Accept-Encoding" in large.headers["vary"]
+    assert int(large.headers["content-length"]) < len(plain.content)
+    assert large.json() == LARGE
+    assert "content-encoding" not in small.headers
+    assert "content-encoding" not in plain.headers
+
+
+def test_streaming_export_is_compressed_chunk_by_chunk():
+    client = make_app()
+
+    with client.stream("GET", "/stream", headers={"Accept-Encoding": "gzip"}) as response:
+        raw = b"".join(response.iter_raw())
+
+    assert response.headers["content-encoding"] == "gzip"
+    lines = gzip.decompress(raw).decode().splitlines()
+    assert [json.loads(line) for line in lines] == LARGE["data"]
+
+
+def test_cached_entries_keep_their_compressed_body():
+    cache = ResponseCache(max_bytes=1024 * 1024, ttl=60)
+    body = json.dumps(LARGE).encode()
+    entry = cache.set_body("a", body, cache.version)
+
+    first = cache.encoded_body(entry, "gzip")
+    second = cache.encoded_body(entry, "gzip")
+
+    assert first is second
+    assert gzip.decompress(first) == body
+    assert cache.size == len(body) + len(first)
+
+
+def test_cached_search_is_compressed_once_and_revalidates_with_encoded_etag():
+    docs = [{"_id": ObjectId(), "product_id": str(i), "product_name": f"GPU {i}", "price_current": 90 + i, "store_name": "Store 1"}
+            for i in range(50)]
+    app.dependency_overrides[get_best_offer_collection] = lambda: fake_search_collection(docs, total=50)
+    response_cache.invalidate()
+    client = TestClient(app)
+    headers = {"Accept-Encoding": "gzip"}
+
+    try:
+        first = client.get("/products/search", params={"q": "gpu"}, headers=headers)
+        compressed = compression.input_bytes.value(encoding="gzip", source="cached")
+        second = client.get("/products/search", params={"q": "gpu"}, headers=headers)
+        revalidated = client.get("/products/search", params={"q": "gpu"},
+                                 headers={**headers, "If-None-Match": first.headers["etag"]})
+    finally:
+        app.dependency_overrides.pop(get_best_offer_collection)
+
+    assert first.headers["content-encoding"] == "gzip"
+    assert first.headers["etag"].endswith('-gzip"')
+    assert second.headers["x-cache"] == "HIT"
+    assert second.json() == first.json()
+    # The hit is served from the stored gzip body, not compressed again
+    assert compression.input_bytes.value(encoding="gzip", source="cached") == compressed
+    assert revalidated.status_code == 304
@@ -0,0 +1,79 @@
+from unittest.mock import AsyncMock, MagicMock
+
+from bson import ObjectId
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.dependencies import get_product_collection, get_best_offer_collection
+from app.routers.products import SEARCH_COUNT_CAP
+from app.services.response_cache import response_cache
+from tests.test_response_cache import fake_search_collection
+
+DOCS = [{"_id": ObjectId(), "product_id": str(i), "product_name": f"GPU {i}", "price_current": 100 + i} for i in range(3)]
+
+
+def test_count_is_estimated_unless_exact():
+    collection = MagicMock()
+    collection.estimated_document_count = AsyncMock(return_value=1000)
+    collection.count_documents = AsyncMock(return_value=998)
+    app.dependency_overrides[get_product_collection] = lambda: collection
+    try:
+        client = TestClient(app)
+        estimated = client.get("/products/count").json()
+        exact = client.get("/products/count", params={"exact": True}).json()
+    finally:
+        app.dependency_overrides.pop(get_product_collection)
+
+    assert estimated == {"total_products": 1000}
+    assert exact == {"total_products": 998}
+    collection.count_documents.assert_awaited_once_with({})
+
+
+def search(best_offers, *param_sets):
+    app.dependency_overrides[get_best_offer_collection] = lambda: best_offers
+    response_cache.invalidate()
+    try:
+        client = TestClient(app)
+        return [client.get("/products/search", params=params).json() for params in param_sets]
+    finally:
+        app.dependency_overrides.pop(get_best_offer_collection)
+
+
+def test_capped_count_reports_has_more():
+    best_offers = fake_search_collection(DOCS, total=SEARCH_COUNT_CAP + 1)
+
+    result, = search(best_offers, {"q": "gpu", "count_mode": "capped", "limit": 2})
+
+    assert result["total_results"] == SEARCH_COUNT_CAP
+    assert result["has_more"] is True
+    count_pipeline = next(
+        call.args[0] for call in best_offers.aggregate.call_args_list if "$count" in call.args[0][-1]
+    )
+    assert count_pipeline == [
+        {"$match": {"$text": {"$search": "gpu"}}}, {"$limit": SEARCH_COUNT_CAP + 1}, {"$count": "total"},
+    ]
+
+
+def test_count_is_cached_per_filter_across_pages():
+    best_offers = fake_search_collection(DOCS, total=40)
+
+    first, second, other = search(
+        best_offers, {"q": "gpu", "page": 1}, {"q": "gpu", "page": 2, "sort_by": "price_desc"}, {"q": "cpu"},
+    )
+
+    assert first["total_results"] == second["total_results"] == 40
+    assert first["has_more"] is False
+    count_calls = [call for call in best_offers.aggregate.call_args_list if "$count" in call.args[0][-1]]
+    # gpu is counted once for both pages, cpu once
+    assert len(count_calls) == 2
+
+
+def test_invalid_count_mode():
+    best_offers = fake_search_collection(DOCS, total=3)
+    app.dependency_overrides[get_best_offer_collection] = lambda: best_offers
+    try:
+        response = TestClient(app).get("/products/search", params={"count_mode": "approx"})
+    finally:
+        app.dependency_overrides.pop(get_best_offer_collection)
+
+    assert response.status_code == 400
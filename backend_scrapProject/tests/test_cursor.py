@@ -0,0 +1,81 @@
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+from bson import ObjectId
+from fastapi.testclient import TestClient
+from pymongo import ASCENDING, DESCENDING
+
+from app.main import app
+from app.dependencies import get_best_offer_collection, get_product_collection
+from app.pagination import encode_cursor, decode_cursor, keyset_match
+from app.routers.products import MAX_PAGE_SIZE
+
+
+def test_cursor_round_trip():
+    sort_stage = {"price_current": ASCENDING, "_id": ASCENDING}
+    doc = {"_id": ObjectId(), "price_current": 1500, "product_name": "GPU A"}
+
+    cursor = encode_cursor(sort_stage, doc)
+    after = decode_cursor(cursor, sort_stage)
+
+    assert after == {"price_current": 1500, "_id": doc["_id"]}
+
+
+def test_cursor_rejects_other_sort():
+    doc = {"_id": ObjectId(), "price_current": 1500}
+    cursor = encode_cursor({"price_current": ASCENDING, "_id": ASCENDING}, doc)
+
+    with pytest.raises(ValueError):
+        decode_cursor(cursor, {"price_current": DESCENDING, "_id": ASCENDING})
+    with pytest.raises(ValueError):
+        decode_cursor("not-a-cursor", {"_id": ASCENDING})
+
+
+def test_keyset_match_with_tiebreaker():
+    oid = ObjectId()
+    sort_stage = {"price_current": DESCENDING, "_id": ASCENDING}
+
+    assert keyset_match(sort_stage, {"price_current": 100, "_id": oid}) == {
+        "$or": [
+            {"price_current": {"$lt": 100}},
+            {"price_current": 100, "_id": {"$gt": oid}},
+        ]
+    }
+    assert keyset_match({"_id": DESCENDING}, {"_id": oid}) == {"_id": {"$lt": oid}}
+
+
+def test_keyset_match_null_sort_value():
+    oid = ObjectId()
+    sort_stage = {"price_current": ASCENDING, "_id": ASCENDING}
+
+    assert keyset_match(sort_stage, {"price_current": None, "_id": oid}) == {
+        "$or": [
+            {"price_current": {"$ne": None}},
+            {"price_current": None, "_id": {"$gt": oid}},
+        ]
+    }
+
+
+def test_page_size_is_bounded():
+    collection = MagicMock()
+    docs_cursor = collection.find.return_value.sort.return_value.skip.return_value.limit.return_value
+    docs_cursor.to_list = AsyncMock(return_value=[{"_id": ObjectId(), "product_id": "1", "product_name": "GPU A"}] * 2)
+    app.dependency_overrides[get_product_collection] = lambda: collection
+    app.dependency_overrides[get_best_offer_collection] = lambda: MagicMock()
+    client = TestClient(app)
+    try:
+        rejected = [
+            client.get("/products/", params={"limit": 0}),
+            client.get("/products/", params={"limit": MAX_PAGE_SIZE + 1}),
+            client.get("/products/", params={"skip": -1}),
+            client.get("/products/search", params={"limit": 0}),
+            client.get("/products/search", params={"page": 0}),
+        ]
+        smallest = client.get("/products/", params={"limit": 1})
+    finally:
+        app.dependency_overrides.pop(get_product_collection)
+        app.dependency_overrides.pop(get_best_offer_collection)
+
+    assert [response.status_code for response in rejected] == [422] * 5
+    assert len(smallest.json()) == 1
+    assert "x-next-cursor" in smallest.headers
@@ -0,0 +1,77 @@
+import json
+from unittest.mock import MagicMock
+
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.dependencies import get_product_collection
+from app.services.export import export_filter
+
+DOCS = [
+    {"product_id": str(i), "product_name": f"GPU {i}", "price_current": 100 * i, "store_name": "Store 1"}
+    for i in range(1, 6)
+]
+
+
+class FakeCursor:
+    def __init__(self, docs):
+        self.docs = docs
+
+    def sort(self, *args):
+        return self
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        for doc in self.docs:
+            yield doc
+
+
+def export(params, docs=DOCS):
+    collection = MagicMock()
+    collection.find.return_value = FakeCursor(docs)
+    app.dependency_overrides[get_product_collection] = lambda: collection
+    try:
+        return TestClient(app).get("/products/export", params=params), collection
+    finally:
+        app.dependency_overrides.pop(get_product_collection)
+
+
+def test_export_filter():
+    assert export_filter(store="Store 1", min_price=10, max_price=20) == {
+        "store_name": "Store 1", "price_current": {"$gte": 10, "$lte": 20},
+    }
+    assert export_filter() == {}
+
+
+def test_export_ndjson_streams_every_document():
+    response, collection = export({"store": "Store 1", "fields": "card"})
+
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert [line["product_id"] for line in lines] == ["1", "2", "3", "4", "5"]
+    match, projection = collection.find.call_args.args
+    assert match == {"store_name": "Store 1"}
+    assert projection["_id"] == 0 and "image_url" in projection
+    assert collection.find.call_args.kwargs["batch_size"] > 0
+
+
+def test_export_csv_with_header():
+    response, _ = export({"format": "csv", "fields": "product_name,price_current"})
+
+    assert response.headers["content-type"].startswith("text/csv")
+    rows = response.text.splitlines()
+    assert rows[0] == "product_id,product_name,price_current"
+    assert rows[1] == "1,GPU 1,100"
+    assert len(rows) == 6
+
+    empty, _ = export({"format": "csv", "fields": "price_current"}, docs=[])
+    assert empty.text.splitlines() == ["product_id,price_current"]
+
+
+def test_export_rejects_unknown_format():
+    response, _ = export({"format": "xml"})
+
+    assert response.status_code == 400
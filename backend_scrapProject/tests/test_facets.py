@@ -0,0 +1,51 @@
+from unittest.mock import MagicMock, AsyncMock
+
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.dependencies import get_best_offer_collection
+from app.services.response_cache import response_cache
+
+FACETS = {
+    "total": [{"total": 3}],
+    "stores": [{"_id": "Store 1", "count": 2}, {"_id": "Store 2", "count": 1}, {"_id": None, "count": 1}],
+    "categories": [{"_id": "GPU", "count": 3}],
+    "price_ranges": [{"_id": {"min": 90, "max": 150}, "count": 2}, {"_id": {"min": 150, "max": 300}, "count": 1}],
+}
+
+
+def get_facets(params):
+    best_offers = MagicMock()
+    best_offers.aggregate.return_value.to_list = AsyncMock(return_value=[FACETS])
+    app.dependency_overrides[get_best_offer_collection] = lambda: best_offers
+    response_cache.invalidate()
+    try:
+        client = TestClient(app)
+        return client.get("/products/facets", params=params), client.get("/products/facets", params=params), best_offers
+    finally:
+        app.dependency_overrides.pop(get_best_offer_collection)
+
+
+def test_facets_in_one_cached_aggregation():
+    first, second, best_offers = get_facets({"q": "gpu", "store": "Store 1", "max_price": 200})
+
+    assert first.json() == {
+        "total_results": 3,
+        "stores": [{"value": "Store 1", "count": 2}, {"value": "Store 2", "count": 1}],
+        "categories": [{"value": "GPU", "count": 3}],
+        "price_ranges": [
+            {"min_price": 90, "max_price": 150, "count": 2},
+            {"min_price": 150, "max_price": 300, "count": 1},
+        ],
+    }
+    assert second.headers["x-cache"] == "HIT"
+    assert best_offers.aggregate.call_count == 1
+
+    pipeline = best_offers.aggregate.call_args.args[0]
+    assert pipeline[0] == {"$match": {
+        "$text": {"$search": "gpu"},
+        "offers": {"$elemMatch": {"price_current": {"$lte": 200}, "store_name": "Store 1"}},
+    }}
+    facet = pipeline[-1]["$facet"]
+    assert {"$match": {"offers.price_current": {"$lte": 200}, "offers.store_name": "Store 1"}} in facet["stores"]
+    assert facet["price_ranges"][-1] == {"$bucketAuto": {"groupBy": "$price_current", "buckets": 5}}
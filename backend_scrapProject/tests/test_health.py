@@ -0,0 +1,72 @@
+from types import SimpleNamespace
+from unittest.mock import AsyncMock
+
+from fastapi.testclient import TestClient
+from pymongo.errors import ServerSelectionTimeoutError
+
+from app import database
+from app.database import PoolStats
+from app.main import app
+
+# No lifespan (and so no MongoDB connection) outside the `with` block
+client = TestClient(app)
+
+
+def test_ready_reports_rtt_and_pool(monkeypatch):
+    monkeypatch.setattr(database, "ping", AsyncMock(return_value=1.2345))
+
+    response = client.get("/health/ready")
+
+    assert response.status_code == 200
+    body = response.json()
+    assert body["status"] == "ok"
+    assert body["mongo_rtt_ms"] == 1.234
+    assert body["pool"]["max_size"] == database.MONGO_MAX_POOL_SIZE
+
+
+def test_ready_is_503_when_mongo_is_down(monkeypatch):
+    monkeypatch.setattr(database, "ping", AsyncMock(side_effect=ServerSelectionTimeoutError("no servers")))
+
+    response = client.get("/health/ready")
+
+    assert response.status_code == 503
+    assert response.json()["status"] == "unavailable"
+    assert "no servers" in response.json()["error"]
+
+
+def test_live_does_not_touch_mongo(monkeypatch):
+    ping = AsyncMock()
+    monkeypatch.setattr(database, "ping", ping)
+
+    assert client.get("/health/live").json() == {"status": "ok"}
+    ping.assert_not_called()
+
+
+def test_pool_stats_counts_events():
+    stats = PoolStats()
+    for _ in range(3):
+        stats.connection_created(SimpleNamespace())
+    stats.connection_checked_out(SimpleNamespace(duration=0.002))
+    stats.connection_checked_out(SimpleNamespace(duration=0.004))
+    stats.connection_checked_in(SimpleNamespace())
+    stats.connection_check_out_failed(SimpleNamespace())
+    stats.connection_closed(SimpleNamespace())
+
+    snapshot = stats.snapshot()
+    assert snapshot["open"] == 2
+    assert snapshot["in_use"] == 1
+    assert snapshot["available"] == 1
+    assert snapshot["checkouts"] == 2
+    assert abs(snapshot["avg_checkout_wait_ms"] - 3.0) < 1e-9
+    assert snapshot["checkout_failures"] == 1
+
+
+def test_client_is_created_with_pool_settings():
+    database.close()
+    try:
+        client = database.connect()
+        assert database.connect() is client
+        assert client.options.pool_options.max_pool_size == database.MONGO_MAX_POOL_SIZE
+        assert client.options.pool_options.min_pool_size == database.MONGO_MIN_POOL_SIZE
+    finally:
+        database.close()
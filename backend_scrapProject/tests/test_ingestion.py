@@ -0,0 +1,116 @@
+import asyncio
+from datetime import datetime, timezone
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+from mongomock_motor import AsyncMongoMockClient
+from pymongo.errors import BulkWriteError
+
+from app.indexes import dedupe_listings
+from app.services.ingestion import bulk_upsert, ingest_rows, iter_sheet_rows, listing_from_row, listing_upsert
+
+ROWS = [
+    ["1", "Store 1", "GPU A", "$ 1.100", "", "0", "http://store1.com", "2023-01-02"],
+    ["1", "Store 1", "GPU A", "$ 1.000", "", "0", "http://store1.com", "2023-01-01"],
+    ["2", "Store 2", "CPU B", "200"],
+    ["bad"],
+]
+
+
+def test_listing_from_row_uses_sheet_price_parsing():
+    listing = listing_from_row(ROWS[0])
+
+    assert listing == {
+        "product_id": "1",
+        "store_name": "Store 1",
+        "product_name": "GPU A",
+        "canonical_key": "a gpu",
+        "price_current": 1100,
+        "product_url": "http://store1.com",
+        "scraped_at": datetime(2023, 1, 2, tzinfo=timezone.utc),
+    }
+    assert listing_from_row(ROWS[3]) is None
+
+
+def test_rows_without_a_valid_link_are_stored_without_one():
+    assert listing_from_row(ROWS[2])["product_url"] is None
+    assert listing_from_row(["1", "Store 1", "GPU A", "100", "", "0", "store1.com/gpu"])["product_url"] is None
+
+
+def test_listing_upsert_is_keyed_on_product_and_store():
+    operation = listing_upsert(listing_from_row(ROWS[0]))
+
+    assert operation._filter == {"product_id": "1", "store_name": "Store 1"}
+    assert operation._upsert is True
+    assert set(operation._doc[0]["$set"]) == {"product_name", "canonical_key", "price_current", "product_url", "scraped_at"}
+
+
+def test_ingest_rows_writes_in_batches():
+    products = MagicMock()
+    products.bulk_write = AsyncMock(return_value=MagicMock(upserted_count=1, modified_count=0))
+    history = MagicMock()
+    history.insert_many = AsyncMock()
+
+    stats = asyncio.run(ingest_rows(iter(ROWS), products, history, batch_size=2, progress=False))
+
+    assert products.bulk_write.await_count == 2
+    assert [len(call.args[0]) for call in products.bulk_write.await_args_list] == [2, 1]
+    assert all(call.kwargs["ordered"] is False for call in products.bulk_write.await_args_list)
+    # The row without a date has no history point
+    assert stats.history_points == 2
+    assert stats.rows == 4
+    assert stats.skipped == 1
+
+
+def test_iter_sheet_rows_reads_by_range():
+    sheet = MagicMock(row_count=5)
+    sheet.get_values.side_effect = lambda range_name: [[range_name]]
+
+    assert list(iter_sheet_rows(sheet, chunk_size=2)) == [["A2:H3"], ["A4:H5"]]
+
+
+def duplicate_key_error(indexes, upserted=0):
+    return BulkWriteError({
+        "writeErrors": [{"index": index, "code": 11000, "errmsg": "E11000 duplicate key"} for index in indexes],
+        "nUpserted": upserted, "nModified": 0,
+    })
+
+
+def test_upserts_that_raced_another_batch_are_retried():
+    operations = [listing_upsert(listing_from_row(row)) for row in ROWS[:3]]
+    products = MagicMock()
+    products.bulk_write = AsyncMock(side_effect=[
+        duplicate_key_error([1], upserted=2),
+        MagicMock(upserted_count=0, modified_count=1),
+    ])
+
+    assert asyncio.run(bulk_upsert(products, operations)) == (2, 1)
+    assert products.bulk_write.await_args.args[0] == [operations[1]]
+
+
+def test_other_write_errors_are_not_retried():
+    products = MagicMock()
+    error = BulkWriteError({"writeErrors": [{"index": 0, "code": 2, "errmsg": "bad"}], "nUpserted": 0, "nModified": 0})
+    products.bulk_write = AsyncMock(side_effect=error)
+
+    with pytest.raises(BulkWriteError):
+        asyncio.run(bulk_upsert(products, [listing_upsert(listing_from_row(ROWS[0]))]))
+    assert products.bulk_write.await_count == 1
+
+
+def test_duplicate_listings_keep_the_newest_document():
+    products = AsyncMongoMockClient().db.products
+
+    async def run():
+        await products.insert_many([
+            {"product_id": "1", "store_name": "Store 1", "price_current": 100, "scraped_at": datetime(2023, 1, 1)},
+            {"product_id": "1", "store_name": "Store 1", "price_current": 90, "scraped_at": datetime(2023, 1, 2)},
+            {"product_id": "1", "store_name": "Store 2", "price_current": 95, "scraped_at": datetime(2023, 1, 1)},
+        ])
+        deleted = await dedupe_listings(products)
+        return deleted, await products.find({}, {"_id": 0, "store_name": 1, "price_current": 1}).to_list(length=None)
+
+    deleted, remaining = asyncio.run(run())
+
+    assert deleted == 1
+    assert sorted((doc["store_name"], doc["price_current"]) for doc in remaining) == [("Store 1", 90), ("Store 2", 95)]
@@ -0,0 +1,58 @@
+import asyncio
+import time
+from datetime import datetime, timedelta, timezone
+
+from mongomock_motor import AsyncMongoMockClient
+
+from app.services import change_feed
+from app.services.lease import Lease
+
+
+def test_one_holder_until_released_or_expired():
+    leases = AsyncMongoMockClient().db.leases
+    first, second = Lease(leases, "change_feed"), Lease(leases, "change_feed")
+
+    async def run():
+        taken = [await first.acquire(), await second.acquire(), await first.acquire()]
+        await first.release()
+        taken.append(await second.acquire())
+        # The holder died without releasing it: the lease is free once it expires
+        await leases.update_one({"_id": "change_feed"}, {"$set": {"expires_at": datetime.now(timezone.utc) - timedelta(seconds=1)}})
+        taken.append(await first.acquire())
+        return taken
+
+    assert asyncio.run(run()) == [True, False, True, True, True]
+    assert asyncio.run(leases.find_one({"_id": "change_feed"}))["owner"] == first.owner
+
+
+def test_holder_stops_acting_before_the_lease_expires():
+    lease = Lease(AsyncMongoMockClient().db.leases, "change_feed", ttl=0.3)
+
+    asyncio.run(lease.acquire())
+    assert lease.held
+    # Not renewed: given up after 2/3 of the ttl, before others can take it
+    time.sleep(0.2)
+    assert not lease.held
+
+
+def test_shared_listeners_run_only_in_the_lease_holder(monkeypatch):
+    calls = []
+
+    async def shared(names):
+        calls.append(("shared", names))
+
+    async def local(names):
+        calls.append(("local", names))
+
+    lease = Lease(AsyncMongoMockClient().db.leases, "change_feed")
+    monkeypatch.setattr(change_feed, "_shared_listeners", [shared])
+    monkeypatch.setattr(change_feed, "_listeners", [local])
+    monkeypatch.setattr(change_feed, "_lease", lease)
+
+    asyncio.run(change_feed.notify_products_changed({"A"}))
+    assert calls == [("local", {"A"})]
+
+    calls.clear()
+    asyncio.run(lease.acquire())
+    asyncio.run(change_feed.notify_products_changed({"B"}))
+    assert calls == [("shared", {"B"}), ("local", {"B"})]
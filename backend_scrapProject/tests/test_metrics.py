@@ -0,0 +1,79 @@
+from types import SimpleNamespace
+
+from bson import ObjectId
+from fastapi.testclient import TestClient
+
+from app import metrics
+from app.main import app
+from app.dependencies import get_best_offer_collection
+from app.metrics import CommandMetrics, Histogram
+from app.services.response_cache import response_cache
+from tests.test_response_cache import fake_search_collection
+
+DOCS = [{"_id": ObjectId(), "product_id": "1", "product_name": "GPU A", "price_current": 90}]
+
+
+def sample(text, line_start):
+    # Value of the first exposition line starting with `line_start`
+    for line in text.splitlines():
+        if line.startswith(line_start):
+            return float(line.rsplit(" ", 1)[1])
+    raise AssertionError(f"{line_start} not found")
+
+
+def test_histogram_buckets_are_cumulative():
+    histogram = Histogram("test_seconds", "Test.", ("route",), buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 0.5, 3.0):
+        histogram.observe(value, route="/x")
+
+    lines = histogram.render()
+
+    assert 'test_seconds_bucket{route="/x",le="0.1"} 1' in lines
+    assert 'test_seconds_bucket{route="/x",le="1.0"} 3' in lines
+    assert 'test_seconds_bucket{route="/x",le="+Inf"} 4' in lines
+    assert 'test_seconds_count{route="/x"} 4' in lines
+    assert 'test_seconds_sum{route="/x"} 4.05' in lines
+
+
+def test_search_latency_is_labelled_by_route_and_split_by_stage():
+    app.dependency_overrides[get_best_offer_collection] = lambda: fake_search_collection(DOCS, total=1)
+    response_cache.invalidate()
+    try:
+        client = TestClient(app)
+        client.get("/products/search", params={"q": "gpu"})
+        client.get("/products/search", params={"q": "gpu"})
+        text = client.get("/metrics").text
+    finally:
+        app.dependency_overrides.pop(get_best_offer_collection)
+
+    assert sample(text, 'http_request_duration_seconds_count{method="GET",route="/products/search",status="200"}') >= 2
+    # The second request is a cache hit: one aggregation, one serialization
+    assert sample(text, 'http_request_stage_seconds_count{route="/products/search",stage="aggregate"}') >= 1
+    assert sample(text, 'http_request_stage_seconds_count{route="/products/search",stage="serialize"}') >= 1
+    assert sample(text, 'response_cache_lookups_total{result="hit"}') >= 1
+    assert "mongodb_pool_connections" in text
+
+
+def test_unknown_paths_share_one_series():
+    client = TestClient(app)
+    client.get("/no/such/path/1")
+    client.get("/no/such/path/2")
+
+    text = client.get("/metrics").text
+
+    assert 'route="unmatched",status="404"' in text
+    assert "/no/such/path" not in text
+
+
+def test_command_listener_records_duration_and_documents():
+    listener = CommandMetrics()
+    before = metrics.command_documents.value(command="aggregate", collection="best_offers_test")
+    started = SimpleNamespace(connection_id=("h", 1), request_id=7, command_name="aggregate",
+                              command={"aggregate": "best_offers_test", "pipeline": []})
+    listener.started(started)
+    listener.succeeded(SimpleNamespace(connection_id=("h", 1), request_id=7, command_name="aggregate",
+                                       duration_micros=2500, reply={"cursor": {"firstBatch": [{}, {}, {}]}}))
+
+    assert metrics.command_documents.value(command="aggregate", collection="best_offers_test") == before + 3
+    assert metrics.command_duration.count(command="aggregate", collection="best_offers_test") >= 1
+    assert listener._collections == {}
@@ -0,0 +1,83 @@
+import asyncio
+from datetime import datetime, timezone
+
+from mongomock_motor import AsyncMongoMockClient
+
+from app.services.price_history import history_pipeline, history_point, snapshot_prices
+
+
+def test_history_point_skips_listings_without_price():
+    ts = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+    assert history_point({"product_id": "1", "price_current": None}, ts) is None
+    assert history_point({"product_id": "1", "store_name": "Store 1", "price_current": 90}, ts) == {
+        "ts": ts,
+        "meta": {"product_id": "1", "store_name": "Store 1", "product_name": None},
+        "price": 90,
+    }
+
+
+def test_weekly_pipeline_buckets_by_store_and_week():
+    start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    pipeline = history_pipeline("1", start=start, resolution="weekly")
+
+    assert pipeline[0] == {"$match": {"meta.product_id": "1", "ts": {"$gte": start}}}
+    group = pipeline[2]["$group"]
+    assert group["_id"]["date"] == {"$dateTrunc": {"date": "$ts", "unit": "week", "startOfWeek": "monday"}}
+    assert group["min_price"] == {"$min": "$price"}
+
+
+def test_raw_pipeline_has_no_grouping():
+    pipeline = history_pipeline("1", resolution="raw")
+
+    assert not any("$group" in stage for stage in pipeline)
+
+
+def test_snapshot_skips_listings_already_recorded_by_ingestion():
+    db = AsyncMongoMockClient().db
+    scraped_at = datetime(2024, 6, 1, 10, tzinfo=timezone.utc)
+
+    async def run():
+        await db.products.insert_many([
+            # Written by ingestion, with its dated point
+            {"product_id": "1", "store_name": "Store 1", "product_name": "GPU A", "price_current": 100, "scraped_at": scraped_at},
+            # Price changed by a scraper after ingestion
+            {"product_id": "2", "store_name": "Store 2", "product_name": "GPU A", "price_current": 80, "scraped_at": scraped_at},
+            # Written by a scraper, without scraped_at
+            {"product_id": "3", "store_name": "Store 3", "product_name": "GPU A", "price_current": 90},
+        ])
+        await db.history.insert_many([
+            history_point({"product_id": "1", "store_name": "Store 1", "product_name": "GPU A", "price_current": 100}, scraped_at),
+            history_point({"product_id": "2", "store_name": "Store 2", "product_name": "GPU A", "price_current": 95}, scraped_at),
+        ])
+        recorded = await snapshot_prices(db.products, db.history, {"GPU A"})
+        points = await db.history.find({}, {"_id": 0, "meta.product_id": 1}).to_list(length=None)
+        return recorded, sorted(point["meta"]["product_id"] for point in points)
+
+    recorded, product_ids = asyncio.run(run())
+
+    assert recorded == 2
+    assert product_ids == ["1", "2", "2", "3"]
+
+
+def test_snapshot_records_only_changed_prices():
+    db = AsyncMongoMockClient().db
+
+    async def run():
+        await db.products.insert_many([
+            {"product_id": "1", "store_name": "Store 1", "product_name": "GPU A", "price_current": 100},
+            {"product_id": "2", "store_name": "Store 2", "product_name": "GPU A", "price_current": 95},
+        ])
+        first = await snapshot_prices(db.products, db.history, {"GPU A"})
+        # Only Store 2 changed its price: Store 1 keeps a single point
+        await db.products.update_one({"product_id": "2"}, {"$set": {"price_current": 90}})
+        second = await snapshot_prices(db.products, db.history, {"GPU A"})
+        # The same change delivered again records nothing
+        third = await snapshot_prices(db.products, db.history, {"GPU A"})
+        points = await db.history.find({}, {"_id": 0, "meta.product_id": 1, "price": 1}).to_list(length=None)
+        return (first, second, third), sorted((point["meta"]["product_id"], point["price"]) for point in points)
+
+    recorded, points = asyncio.run(run())
+
+    assert recorded == (2, 1, 0)
+    assert points == [("1", 100), ("2", 90), ("2", 95)]
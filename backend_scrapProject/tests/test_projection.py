@@ -0,0 +1,72 @@
+from unittest.mock import MagicMock, AsyncMock
+
+import pytest
+from bson import ObjectId
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.dependencies import get_product_collection, get_best_offer_collection
+from app.projection import parse_fields, product_projection
+from app.services.response_cache import response_cache
+from tests.test_response_cache import fake_search_collection
+
+DOC = {
+    "_id": ObjectId(), "product_id": "1", "product_name": "GPU A", "price_current": 90,
+    "store_name": "Store 1", "image_url": "http://img/1.jpg", "product_url": "http://store1.com/1",
+}
+
+
+def test_parse_fields_expands_views():
+    assert parse_fields(None) is None
+    assert parse_fields("card,product_url") == [
+        "product_id", "product_name", "price_current", "store_name", "image_url", "product_url",
+    ]
+    assert parse_fields("price_current") == ["product_id", "price_current"]
+    with pytest.raises(ValueError):
+        parse_fields("offers")
+
+
+def test_projection_keeps_sort_keys():
+    projection = product_projection(["product_id", "product_name"], {"score": -1, "_id": 1})
+
+    assert projection == {"product_id": 1, "product_name": 1, "score": 1, "_id": 1}
+
+
+def test_listing_with_card_fields_projects_in_mongo():
+    collection = MagicMock()
+    docs_cursor = collection.find.return_value.sort.return_value.skip.return_value.limit.return_value
+    docs_cursor.to_list = AsyncMock(return_value=[DOC])
+    app.dependency_overrides[get_product_collection] = lambda: collection
+    try:
+        response = TestClient(app).get("/products/", params={"fields": "card"})
+        invalid = TestClient(app).get("/products/", params={"fields": "card,offers"})
+    finally:
+        app.dependency_overrides.pop(get_product_collection)
+
+    assert collection.find.call_args.args[1] == {
+        "product_id": 1, "product_name": 1, "price_current": 1, "store_name": 1, "image_url": 1, "_id": 1,
+    }
+    assert response.json() == [{
+        "product_id": "1", "product_name": "GPU A", "price_current": 90,
+        "store_name": "Store 1", "image_url": "http://img/1.jpg",
+    }]
+    assert invalid.status_code == 400
+
+
+def test_search_with_card_fields_returns_slim_items():
+    best_offers = fake_search_collection([DOC], total=1)
+    app.dependency_overrides[get_best_offer_collection] = lambda: best_offers
+    response_cache.invalidate()
+    try:
+        slim = TestClient(app).get("/products/search", params={"q": "gpu", "fields": "card"})
+        full = TestClient(app).get("/products/search", params={"q": "gpu"})
+    finally:
+        app.dependency_overrides.pop(get_best_offer_collection)
+
+    pipeline = best_offers.aggregate.call_args_list[0].args[0]
+    assert {"$project": product_projection(parse_fields("card"), {"price_current": 1, "_id": 1})} in pipeline
+    assert set(slim.json()["data"][0]) == {"product_id", "product_name", "price_current", "store_name", "image_url"}
+    # Without fields every Product field is returned, as before
+    assert full.json()["data"][0]["discount_percentage"] is None
+    # The count of the second search comes from the cache
+    assert best_offers.aggregate.call_count == 3
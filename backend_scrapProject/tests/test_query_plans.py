@@ -0,0 +1,57 @@
+from app.indexes import canonical_queries, summarize_plan
+
+
+def test_summarize_plan_index_scan():
+    explain = {
+        "queryPlanner": {
+            "winningPlan": {
+                "stage": "LIMIT",
+                "inputStage": {
+                    "stage": "FETCH",
+                    "inputStage": {"stage": "IXSCAN", "indexName": "product_id"},
+                },
+            },
+            "rejectedPlans": [{"stage": "COLLSCAN"}],
+        }
+    }
+
+    summary = summarize_plan(explain)
+
+    assert summary["stages"] == ["LIMIT", "FETCH", "IXSCAN"]
+    assert summary["indexes"] == ["product_id"]
+    assert summary["uses_index"] is True
+    assert summary["covered"] is False
+
+
+def test_summarize_plan_collection_scan_in_aggregate():
+    explain = {
+        "stages": [
+            {"$cursor": {"queryPlanner": {"winningPlan": {"stage": "COLLSCAN"}}}},
+            {"$sort": {"sortKey": {"price_current": 1}}},
+        ]
+    }
+
+    summary = summarize_plan(explain)
+
+    assert summary["uses_index"] is False
+    assert summary["indexes"] == []
+
+
+def test_canonical_queries_without_sample():
+    queries = canonical_queries({})
+
+    assert {"GET /products/stats", "GET /products/search?q="} <= {q["endpoint"] for q in queries}
+    assert all("find" in q["command"] or "aggregate" in q["command"] for q in queries)
+
+
+def test_canonical_queries_match_what_the_endpoints_send():
+    from tests.test_text_search import search_pipeline
+
+    sample = {"product_id": "1", "product_name": "RTX 4060 ASUS", "store_name": "Store 1", "canonical_key": "4060 asus rtx"}
+    commands = {q["endpoint"]: q["command"] for q in canonical_queries(sample)}
+
+    assert commands["GET /products/search?q="]["pipeline"] == search_pipeline({"q": "RTX"})
+    assert commands["GET /products/search?store=&min_price="]["pipeline"] == search_pipeline({"store": "Store 1", "min_price": 0})
+    assert commands["GET /products/{product_id}/compare"]["filter"] == {
+        "$or": [{"canonical_key": "4060 asus rtx"}, {"product_name": "RTX 4060 ASUS"}]
+    }
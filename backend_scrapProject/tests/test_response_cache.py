@@ -0,0 +1,90 @@
+from unittest.mock import MagicMock, AsyncMock
+
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.dependencies import get_best_offer_collection
+from app.schemas.product import GlobalStats, BestPriceProduct
+from app.services.response_cache import ResponseCache, response_cache
+
+
+def make_stats(name: str) -> GlobalStats:
+    return GlobalStats(best_prices=[BestPriceProduct(product_name=name, min_price=100, store="Store 1")])
+
+
+def test_make_key_normalizes_params():
+    key_a = ResponseCache.make_key("search", {"q": "RTX  4060", "page": 1, "store": None})
+    key_b = ResponseCache.make_key("search", {"page": 1, "q": "rtx 4060"})
+
+    assert key_a == key_b
+
+
+def test_lru_eviction_by_size():
+    body_size = len(make_stats("GPU A").model_dump_json())
+    cache = ResponseCache(max_bytes=body_size * 2, ttl=60)
+
+    cache.set("a", make_stats("GPU A"), cache.version)
+    cache.set("b", make_stats("GPU B"), cache.version)
+    cache.get("a")
+    cache.set("c", make_stats("GPU C"), cache.version)
+
+    assert cache.get("b") is None
+    assert cache.get("a") is not None
+    assert cache.get("c") is not None
+    assert cache.evictions == 1
+
+
+def test_expired_entries_are_misses():
+    cache = ResponseCache(max_bytes=1024 * 1024, ttl=0)
+    cache.set("a", make_stats("GPU A"), cache.version)
+
+    assert cache.get("a") is None
+    assert cache.stats()["misses"] == 1
+
+
+def test_invalidate_discards_results_computed_before():
+    cache = ResponseCache(max_bytes=1024 * 1024, ttl=60)
+    version = cache.version
+
+    cache.invalidate()
+    cache.set("a", make_stats("GPU A"), version)
+
+    assert cache.get("a") is None
+
+
+def fake_search_collection(docs, total):
+    # The page query and the count query (ending in $count) get different results
+    best_offers = MagicMock()
+
+    def aggregate(pipeline):
+        result = MagicMock()
+        result.to_list = AsyncMock(return_value=[{"total": total}] if "$count" in pipeline[-1] else docs)
+        return result
+
+    best_offers.aggregate.side_effect = aggregate
+    return best_offers
+
+
+def test_search_is_cached_and_revalidated_with_etag():
+    best_offers = fake_search_collection(
+        [{"product_id": "1", "product_name": "GPU A", "price_current": 90, "store_name": "Store 1"}], total=1
+    )
+    app.dependency_overrides[get_best_offer_collection] = lambda: best_offers
+    response_cache.invalidate()
+    client = TestClient(app)
+
+    try:
+        first = client.get("/products/search", params={"q": "GPU"})
+        second = client.get("/products/search", params={"q": "gpu"})
+        revalidated = client.get("/products/search", params={"q": "gpu"},
+                                 headers={"If-None-Match": first.headers["etag"]})
+    finally:
+        app.dependency_overrides.pop(get_best_offer_collection)
+
+    assert first.status_code == 200
+    assert first.headers["x-cache"] == "MISS"
+    assert second.headers["x-cache"] == "HIT"
+    assert second.json() == first.json()
+    assert revalidated.status_code == 304
+    # One page query and one count query
+    assert best_offers.aggregate.call_count == 2
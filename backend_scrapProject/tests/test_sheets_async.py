@@ -0,0 +1,79 @@
+import asyncio
+import time
+from unittest.mock import MagicMock
+
+import httpx
+
+from app.main import app
+from app.dependencies import get_sheets_service
+from app.services.sheets_service import GoogleSheetsService, AsyncGoogleSheetsService
+
+ROWS = [
+    ["product_id", "store", "product_name", "price", "null", "discount", "link", "date"],
+    ["1", "Store 1", "GPU A", "$ 100", "", "0", "http://store1.com", "2023-01-02"],
+    ["2", "Store 2", "CPU B", "200", "", "0", "http://store2.com", "2023-01-01"],
+]
+
+
+def make_slow_service(delay: float) -> GoogleSheetsService:
+    sheet = MagicMock()
+
+    def slow_get_all_values():
+        time.sleep(delay)
+        return ROWS
+
+    sheet.get_all_values.side_effect = slow_get_all_values
+    return GoogleSheetsService(sheet=sheet)
+
+
+async def request_all(sheets: AsyncGoogleSheetsService, paths):
+    app.dependency_overrides[get_sheets_service] = lambda: sheets
+    try:
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await paths(client)
+    finally:
+        app.dependency_overrides.pop(get_sheets_service)
+
+
+def test_slow_sheet_does_not_block_other_endpoints():
+    sheets = AsyncGoogleSheetsService(make_slow_service(delay=0.5))
+
+    async def paths(client):
+        slow = asyncio.create_task(client.get("/sheets/count"))
+        await asyncio.sleep(0.05)
+        start = time.perf_counter()
+        root = await client.get("/")
+        root_elapsed = time.perf_counter() - start
+        return await slow, root, root_elapsed
+
+    slow, root, root_elapsed = asyncio.run(request_all(sheets, paths))
+
+    assert root.status_code == 200
+    assert root_elapsed < 0.25
+    assert slow.json() == {"total_products": 2}
+
+
+def test_concurrent_loads_share_one_fetch():
+    service = make_slow_service(delay=0.2)
+    sheets = AsyncGoogleSheetsService(service)
+
+    async def paths(client):
+        return await asyncio.gather(*(client.get("/sheets/search", params={"q": "gpu"}) for _ in range(10)))
+
+    responses = asyncio.run(request_all(sheets, paths))
+
+    assert all(response.json()["total_results"] == 1 for response in responses)
+    assert service.sheet.get_all_values.call_count == 1
+
+
+def test_slow_sheet_times_out_with_504():
+    sheets = AsyncGoogleSheetsService(make_slow_service(delay=0.5), timeout=0.05)
+
+    async def paths(client):
+        return await client.get("/sheets/stats")
+
+    response = asyncio.run(request_all(sheets, paths))
+
+    assert response.status_code == 504
+    sheets.shutdown()
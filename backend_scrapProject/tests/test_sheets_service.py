@@ -0,0 +1,129 @@
+from unittest.mock import MagicMock
+
+from app.services.sheets_service import GoogleSheetsService
+
+ROWS = [
+    ["product_id", "store", "product_name", "price", "null", "discount", "link", "date"],
+    ["1", "Store 1", "GPU A", "$ 100", "", "0", "http://store1.com", "2023-01-02"],
+    ["1", "Store 1", "GPU A", "$ 90", "", "0", "http://store1.com", "2023-01-01"],
+    ["1", "Store 2", "GPU A", "95", "", "0", "http://store2.com", "2023-01-02"],
+    ["2", "Store 1", "CPU B", "200", "", "0", "http://store1.com", "2023-01-01"],
+    ["3", "Store 2", "Cable C", "0", "", "0", "http://store2.com", "2023-01-01"],
+]
+
+
+def make_service(rows=ROWS) -> GoogleSheetsService:
+    sheet = MagicMock()
+    sheet.get_all_values.return_value = rows
+    return GoogleSheetsService(sheet=sheet)
+
+
+def test_history_uses_rows_sorted_by_date():
+    history = make_service().get_product_history("1")
+
+    assert [item["date"] for item in history["history"]] == ["2023-01-01", "2023-01-02", "2023-01-02"]
+    assert history["history"][0]["price"] == 90
+
+
+def test_comparison_keeps_latest_price_per_store():
+    comparison = make_service().get_product_comparison("1")
+
+    assert {item["store"]: item["price"] for item in comparison["comparison"]} == {"Store 1": 100, "Store 2": 95}
+    assert make_service().get_product_comparison("missing") is None
+
+
+def test_global_stats_skip_invalid_prices():
+    stats = make_service().get_global_stats()
+
+    assert stats["best_prices"] == [
+        {"product_name": "GPU A", "min_price": 90, "store": "Store 1"},
+        {"product_name": "CPU B", "min_price": 200, "store": "Store 1"},
+    ]
+
+
+def test_indexes_are_built_once_per_sheet_load():
+    service = make_service()
+
+    indexes = service.get_indexes()
+    service.get_product_history("1")
+    service.get_global_stats()
+
+    assert service.get_indexes() is indexes
+    assert service.sheet.get_all_values.call_count == 1
+
+
+def test_search_filters_and_sorts():
+    service = make_service()
+
+    result = service.search_products(q="gpu", store="store 1", sort_by="price_asc")
+    assert result["total_results"] == 2
+    assert [item["price"] for item in result["data"]] == [90, 100]
+    assert type(result["data"][0]["price"]) is int
+    assert result["data"][0] == {
+        "product_id": "1", "store": "Store 1", "product_name": "GPU A",
+        "price": 90, "link": "http://store1.com", "date": "2023-01-01",
+    }
+
+    result = service.search_products(min_price=95, max_price=150, sort_by="price_desc")
+    assert [item["price"] for item in result["data"]] == [100, 95]
+
+
+def test_search_paginates():
+    service = make_service()
+
+    result = service.search_products(limit=2, page=3)
+    assert result["total_results"] == 5
+    assert result["total_pages"] == 3
+    assert [item["product_name"] for item in result["data"]] == ["Cable C"]
+    assert service.search_products(limit=2, page=4)["data"] == []
+
+
+def test_refresh_appends_only_new_rows():
+    service = make_service()
+    service.get_all_products()
+    new_row = ["4", "Store 1", "SSD D", "300", "", "0", "http://store1.com", "2023-01-03"]
+    service.sheet.batch_get.return_value = [[ROWS[0]], [ROWS[-1]], [new_row]]
+
+    service.refresh()
+
+    service.sheet.batch_get.assert_called_once_with(["1:1", "6:6", "A7:H"])
+    assert service.sheet.get_all_values.call_count == 1
+    assert service.get_product_count() == 6
+    assert service.get_product_history("4")["history"][0]["price"] == 300
+
+
+def test_refresh_reloads_everything_when_sheet_shrinks():
+    service = make_service()
+    service.get_all_products()
+    service.sheet.batch_get.return_value = [[ROWS[0]], [], []]
+    service.sheet.get_all_values.return_value = ROWS[:3]
+
+    service.refresh()
+
+    assert service.sheet.get_all_values.call_count == 2
+    assert service.get_product_count() == 2
+
+
+def test_stale_snapshot_is_served_while_refreshing():
+    service = make_service()
+    stale = service.get_all_products()
+    service._loaded_at -= 10_000
+    service.sheet.batch_get.return_value = [[ROWS[0]], [ROWS[-1]], []]
+
+    assert service.get_all_products() is stale
+    service._refresh_thread.join()
+
+    assert service.sheet.batch_get.call_count == 1
+    assert service.get_all_products() is stale
+
+
+def test_snapshot_reads_are_counted():
+    service = make_service()
+    service.get_all_products()
+    service.get_all_products()
+    service._loaded_at -= 10_000
+    service.sheet.batch_get.return_value = [[ROWS[0]], [ROWS[-1]], []]
+    service.get_all_products()
+    service._refresh_thread.join()
+
+    assert (service.snapshot_misses, service.snapshot_hits, service.snapshot_stale_hits) == (1, 1, 1)
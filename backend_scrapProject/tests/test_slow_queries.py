@@ -0,0 +1,108 @@
+import asyncio
+from unittest.mock import AsyncMock, MagicMock
+
+from bson import ObjectId
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app import dependencies
+from app.dependencies import get_best_offer_collection
+from app.indexes import summarize_execution
+from app.services.response_cache import response_cache
+from app.services.slow_queries import SlowQueryLog, slow_query_log
+from tests.test_response_cache import fake_search_collection
+
+# Shape of an aggregate explain("executionStats") on the classic engine
+EXPLAIN = {
+    "stages": [
+        {
+            "$cursor": {
+                "queryPlanner": {"winningPlan": {"stage": "FETCH", "inputStage": {"stage": "IXSCAN", "indexName": "price_current_1"}}},
+                "executionStats": {"nReturned": 120, "totalKeysExamined": 120, "totalDocsExamined": 120, "executionTimeMillis": 35},
+            },
+            "nReturned": 120,
+        },
+        {"$sort": {"sortKey": {"price_current": 1}}, "nReturned": 120},
+        {"$limit": 21, "nReturned": 21},
+    ],
+}
+
+
+def explained_collection():
+    collection = MagicMock()
+    collection.name = "best_offers"
+    collection.database.command = AsyncMock(return_value=EXPLAIN)
+    return collection
+
+
+def test_summarize_execution():
+    assert summarize_execution(EXPLAIN) == {
+        "docs_examined": 120, "keys_examined": 120, "returned": 21, "execution_ms": 35,
+    }
+
+
+def test_slow_pipelines_are_recorded_with_their_explain():
+    log = SlowQueryLog(threshold_ms=100, max_entries=2, explain_interval=60)
+    collection = explained_collection()
+    pipeline = [{"$match": {"_id": {"$gt": ObjectId("65a000000000000000000000")}}}, {"$limit": 21}]
+
+    async def run():
+        log.observe("/products/search", {"q": "rtx", "store": None}, collection, pipeline, 50)
+        for duration in (150, 300, 450):
+            log.observe("/products/search", {"q": "rtx", "store": None}, collection, pipeline, duration)
+        await asyncio.gather(*log._tasks)
+
+    asyncio.run(run())
+
+    entries = log.entries()
+    assert [entry["duration_ms"] for entry in entries] == [450, 300] # bounded, newest first
+    assert log.recorded == 3
+    assert entries[0]["params"] == {"q": "rtx"}
+    assert entries[0]["pipeline"][0] == {"$match": {"_id": {"$gt": {"$oid": "65a000000000000000000000"}}}}
+    # Explained once, then reused for the same pipeline
+    collection.database.command.assert_awaited_once()
+    command = collection.database.command.await_args.args[0]
+    assert command["verbosity"] == "executionStats"
+    assert command["explain"]["pipeline"] is pipeline
+    assert entries[-1]["explain"]["indexes"] == ["price_current_1"]
+    assert entries[-1]["explain"]["docs_examined"] == 120
+
+
+def test_admin_endpoint_lists_slow_searches(monkeypatch):
+    best_offers = fake_search_collection([{"_id": ObjectId(), "product_id": "1", "product_name": "GPU A", "price_current": 90}], total=1)
+    best_offers.name = "best_offers"
+    best_offers.database.command = AsyncMock(return_value=EXPLAIN)
+    monkeypatch.setattr(slow_query_log, "threshold_ms", 0)
+    monkeypatch.setattr(dependencies, "ADMIN_TOKEN", "secret")
+    slow_query_log.clear()
+    response_cache.invalidate()
+    app.dependency_overrides[get_best_offer_collection] = lambda: best_offers
+    try:
+        client = TestClient(app)
+        client.get("/products/search", params={"q": "gpu", "store": "Store 1"})
+        report = client.get("/admin/slow-queries", headers={"X-Admin-Token": "secret"}).json()
+        cleared = client.delete("/admin/slow-queries", headers={"X-Admin-Token": "secret"}).json()
+    finally:
+        app.dependency_overrides.pop(get_best_offer_collection)
+
+    routes = sorted(entry["route"] for entry in report["entries"])
+    assert routes == ["/products/search", "/products/search (count)"]
+    search = next(entry for entry in report["entries"] if entry["route"] == "/products/search")
+    assert search["params"]["q"] == "gpu"
+    assert search["params"]["store"] == "Store 1"
+    assert search["pipeline"][0] == {"$match": {"$text": {"$search": "gpu"}, "offers": {"$elemMatch": {"store_name": "Store 1"}}}}
+    assert cleared["entries"] == []
+
+
+def test_admin_endpoints_are_disabled_without_a_token(monkeypatch):
+    client = TestClient(app)
+
+    monkeypatch.setattr(dependencies, "ADMIN_TOKEN", None)
+    for method, path in (("GET", "/admin/slow-queries"), ("GET", "/admin/query-plans"), ("DELETE", "/admin/cache")):
+        response = client.request(method, path, headers={"X-Admin-Token": ""})
+        assert response.status_code == 403
+        assert "ADMIN_TOKEN" in response.json()["detail"]
+
+    monkeypatch.setattr(dependencies, "ADMIN_TOKEN", "secret")
+    assert client.get("/admin/slow-queries").status_code == 403
+    assert client.get("/admin/slow-queries", headers={"X-Admin-Token": "wrong"}).status_code == 403
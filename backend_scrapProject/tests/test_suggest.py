@@ -0,0 +1,79 @@
+import asyncio
+from unittest.mock import MagicMock
+
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.services.suggest import SuggestIndex, refresh_suggest_index, suggest_index
+
+LISTINGS = {
+    "ASUS Dual RTX 4060 8GB": 5,
+    "MSI Ventus RTX 4060 Ti": 2,
+    "Gigabyte RTX 4070 Gaming OC": 7,
+    "Teclado Mecánico Redragon Kumara": 3,
+}
+
+
+def make_index() -> SuggestIndex:
+    index = SuggestIndex()
+    index.build(LISTINGS)
+    return index
+
+
+def test_prefix_lookup_ranked_by_listings():
+    index = make_index()
+
+    assert index.lookup("rtx") == [
+        ("Gigabyte RTX 4070 Gaming OC", 7), ("ASUS Dual RTX 4060 8GB", 5), ("MSI Ventus RTX 4060 Ti", 2),
+    ]
+    assert index.lookup("rtx", limit=1) == [("Gigabyte RTX 4070 Gaming OC", 7)]
+    assert [name for name, _ in index.lookup("406")] == ["ASUS Dual RTX 4060 8GB", "MSI Ventus RTX 4060 Ti"]
+    assert index.lookup("zzz") == []
+
+
+def test_lookup_ignores_case_accents_and_word_order():
+    index = make_index()
+
+    assert index.lookup("MECANICO") == [("Teclado Mecánico Redragon Kumara", 3)]
+    assert [name for name, _ in index.lookup("4060 ms")] == ["MSI Ventus RTX 4060 Ti"]
+    assert index.lookup("rtx redragon") == []
+
+
+def test_update_adds_reranks_and_removes():
+    index = make_index()
+    assert index.lookup("rtx", limit=1)[0][0] == "Gigabyte RTX 4070 Gaming OC"
+
+    index.update({"MSI Ventus RTX 4060 Ti": 9, "Gigabyte RTX 4070 Gaming OC": 0, "Zotac RTX 4090": 1})
+
+    assert index.lookup("rtx") == [
+        ("MSI Ventus RTX 4060 Ti", 9), ("ASUS Dual RTX 4060 8GB", 5), ("Zotac RTX 4090", 1),
+    ]
+    assert index.lookup("gigabyte") == []
+
+
+def test_refresh_counts_only_changed_names():
+    index = make_index()
+    products = MagicMock()
+
+    async def aggregate_results():
+        yield {"_id": "ASUS Dual RTX 4060 8GB", "listings": 6}
+
+    products.aggregate.return_value = aggregate_results()
+    asyncio.run(refresh_suggest_index(products, index, {"ASUS Dual RTX 4060 8GB", "MSI Ventus RTX 4060 Ti"}))
+
+    assert products.aggregate.call_args.args[0][0]["$match"]["product_name"]["$in"]
+    assert index.lookup("4060") == [("ASUS Dual RTX 4060 8GB", 6)]
+
+
+def test_suggest_endpoint():
+    suggest_index.build(LISTINGS)
+
+    response = TestClient(app).get("/products/suggest", params={"q": "Rtx 40", "limit": 2})
+
+    assert response.json() == {
+        "query": "Rtx 40",
+        "suggestions": [
+            {"product_name": "Gigabyte RTX 4070 Gaming OC", "listings": 7},
+            {"product_name": "ASUS Dual RTX 4060 8GB", "listings": 5},
+        ],
+    }
@@ -0,0 +1,54 @@
+from bson import ObjectId
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.dependencies import get_best_offer_collection
+from app.services.response_cache import response_cache
+from tests.test_response_cache import fake_search_collection
+
+DOCS = [{"_id": ObjectId(), "product_id": "1", "product_name": "Fuente 650W", "price_current": 90, "store_name": "Store 1"}]
+
+
+def search_pipeline(params):
+    # The page pipeline /products/search sends for these params
+    best_offers = fake_search_collection(DOCS, total=1)
+    app.dependency_overrides[get_best_offer_collection] = lambda: best_offers
+    response_cache.invalidate()
+    try:
+        response = TestClient(app).get("/products/search", params=params)
+    finally:
+        app.dependency_overrides.pop(get_best_offer_collection)
+    assert response.status_code == 200
+    pipelines = [call.args[0] for call in best_offers.aggregate.call_args_list]
+    return next(pipeline for pipeline in pipelines if "$count" not in pipeline[-1])
+
+
+def stage(pipeline, name):
+    return next(step[name] for step in pipeline if name in step)
+
+
+def test_search_uses_the_text_index():
+    pipeline = search_pipeline({"q": "fuentes"})
+
+    assert pipeline[0] == {"$match": {"$text": {"$search": "fuentes"}}}
+    assert "score" not in stage(pipeline, "$sort")
+
+
+def test_relevance_sorts_by_text_score():
+    pipeline = search_pipeline({"q": "fuentes", "sort_by": "relevance"})
+
+    assert {"$addFields": {"score": {"$meta": "textScore"}}} in pipeline
+    assert list(stage(pipeline, "$sort").items()) == [("score", -1), ("price_current", 1), ("_id", 1)]
+    # The score survives the projection so it can be sorted and paginated on
+    assert stage(pipeline, "$project")["score"]
+
+
+def test_regex_mode_keeps_substring_matching():
+    pipeline = search_pipeline({"q": "650w", "search_mode": "regex", "sort_by": "relevance"})
+
+    regex = {"$regex": "650w", "$options": "i"}
+    # Any store's title, like the text index
+    assert pipeline[0] == {"$match": {"$or": [{"product_name": regex}, {"all_names": regex}]}}
+    # No text score without $text: relevance falls back to the price order
+    assert not any("$addFields" in step for step in pipeline)
+    assert list(stage(pipeline, "$sort")) == ["price_current", "_id"]
@@ -0,0 +1,171 @@
+import asyncio
+from datetime import datetime, timezone
+from unittest.mock import AsyncMock, MagicMock
+
+from bson import ObjectId
+from fastapi.testclient import TestClient
+from mongomock_motor import AsyncMongoMockClient
+
+from app.main import app
+from app.dependencies import get_product_collection, get_watchlist_rule_collection, get_price_alert_collection
+from app.services.ingestion import ingest_rows
+from app.services.watchlists import evaluate_price_updates
+from tests.test_canonical import FakeCursor
+
+LISTINGS = [
+    {"product_id": "s1-1", "store_name": "Store 1", "product_name": "GPU A", "canonical_key": "a gpu", "price_current": 980},
+    {"product_id": "s2-1", "store_name": "Store 2", "product_name": "A GPU", "canonical_key": "a gpu", "price_current": 940},
+    {"product_id": "s2-2", "store_name": "Store 2", "product_name": "CPU B", "canonical_key": "b cpu", "price_current": None},
+]
+
+
+def rule_collections(rules):
+    collection = MagicMock()
+    collection.find.return_value = FakeCursor(rules)
+    # Every conditional update matches, as without concurrent evaluations
+    collection.find_one_and_update = AsyncMock(side_effect=lambda query, update, **kwargs: {"_id": query["_id"]})
+    alerts = MagicMock()
+    alerts.insert_many = AsyncMock()
+    return collection, alerts
+
+
+def test_batch_is_matched_against_the_rules_of_its_products():
+    rules = [
+        # Any store: fires on the cheapest listing
+        {"_id": 1, "owner": "ana", "canonical_key": "a gpu", "target_price": 1000, "last_alert_price": None},
+        # Single listing above its target
+        {"_id": 2, "owner": "ana", "product_id": "s2-1", "target_price": 900},
+        # Already alerted at this price
+        {"_id": 3, "owner": "leo", "canonical_key": "a gpu", "store_name": "Store 2", "target_price": 950, "last_alert_price": 940},
+    ]
+    collection, alerts = rule_collections(rules)
+
+    count = asyncio.run(evaluate_price_updates(collection, alerts, LISTINGS))
+
+    assert count == 1
+    query = collection.find.call_args.args[0]
+    assert query["$or"] == [{"product_id": {"$in": ["s1-1", "s2-1"]}}, {"canonical_key": {"$in": ["a gpu"]}}]
+    assert query["target_price"] == {"$gte": 940}
+    alert, = alerts.insert_many.await_args.args[0]
+    assert (alert["rule_id"], alert["store_name"], alert["price"], alert["previous_alert_price"]) == (1, "Store 2", 940, None)
+    query, update = collection.find_one_and_update.await_args.args
+    assert query["_id"] == 1
+    assert update["$set"]["last_alert_price"] == 940
+
+
+def test_rule_fires_again_only_on_a_lower_price():
+    rule = {"_id": 1, "owner": "ana", "canonical_key": "a gpu", "target_price": 1000, "last_alert_price": 950}
+
+    collection, alerts = rule_collections([rule])
+    assert asyncio.run(evaluate_price_updates(collection, alerts, LISTINGS[:1])) == 0
+    collection, alerts = rule_collections([rule])
+    assert asyncio.run(evaluate_price_updates(collection, alerts, LISTINGS[1:2])) == 1
+
+
+def test_nothing_is_queried_without_priced_listings():
+    collection, alerts = rule_collections([])
+
+    assert asyncio.run(evaluate_price_updates(collection, alerts, LISTINGS[2:])) == 0
+    collection.find.assert_not_called()
+
+
+def test_concurrent_evaluations_alert_a_price_once():
+    db = AsyncMongoMockClient().db
+
+    async def evaluate_twice():
+        await db.rules.insert_one({"_id": 1, "owner": "ana", "canonical_key": "a gpu", "target_price": 1000, "last_alert_price": None})
+        # Both read the rule before either claims it
+        return await asyncio.gather(
+            evaluate_price_updates(db.rules, db.alerts, LISTINGS[1:2]),
+            evaluate_price_updates(db.rules, db.alerts, LISTINGS[1:2]),
+        )
+
+    assert sorted(asyncio.run(evaluate_twice())) == [0, 1]
+
+    async def stored():
+        return await db.alerts.count_documents({}), await db.rules.find_one({"_id": 1})
+
+    count, rule = asyncio.run(stored())
+    assert count == 1
+    assert rule["last_alert_price"] == 940
+
+
+def stored_products(docs):
+    products = MagicMock()
+    products.bulk_write = AsyncMock(return_value=MagicMock(upserted_count=1, modified_count=0))
+    products.find.return_value = FakeCursor(docs)
+    return products
+
+
+def stored_listing(price, day):
+    return {
+        "product_id": "1", "store_name": "Store 1", "product_name": "GPU A", "canonical_key": "a gpu",
+        "price_current": price, "product_url": "http://store1.com", "scraped_at": datetime(2023, 1, day),
+    }
+
+
+def test_ingestion_evaluates_the_newest_row_of_each_listing():
+    products = stored_products([stored_listing(1100, 2)])
+    rows = [
+        ["1", "Store 1", "GPU A", "$ 1.100", "", "0", "http://store1.com", "2023-01-02"],
+        ["1", "Store 1", "GPU A", "$ 1.000", "", "0", "http://store1.com", "2023-01-01"],
+    ]
+    collection, alerts = rule_collections([{"_id": 1, "owner": "ana", "canonical_key": "a gpu", "target_price": 1050}])
+
+    stats = asyncio.run(ingest_rows(rows, products, progress=False, rules=collection, alerts=alerts))
+
+    # The older, cheaper row is not the current price
+    assert stats.alerts == 0
+    alerts.insert_many.assert_not_awaited()
+
+
+def test_ingestion_skips_rows_older_than_the_stored_price():
+    rows = [["1", "Store 1", "GPU A", "$ 1.000", "", "0", "http://store1.com", "2023-01-01"]]
+    rule = {"_id": 1, "owner": "ana", "canonical_key": "a gpu", "target_price": 1050}
+
+    # A later batch (or an earlier run) already wrote a newer row, so the upsert kept it
+    collection, alerts = rule_collections([rule])
+    stats = asyncio.run(ingest_rows(rows, stored_products([stored_listing(1100, 5)]), progress=False, rules=collection, alerts=alerts))
+    assert stats.alerts == 0
+    collection.find.assert_not_called()
+
+    # The row became the current price
+    collection, alerts = rule_collections([rule])
+    stats = asyncio.run(ingest_rows(rows, stored_products([stored_listing(1000, 1)]), progress=False, rules=collection, alerts=alerts))
+    assert stats.alerts == 1
+    assert alerts.insert_many.await_args.args[0][0]["price"] == 1000
+
+
+def test_watchlist_api():
+    products = MagicMock()
+    products.find_one = AsyncMock(return_value=None)
+    rules = MagicMock()
+    rules.insert_one = AsyncMock(return_value=MagicMock(inserted_id=ObjectId()))
+    alerts = MagicMock()
+    created_at = datetime(2024, 5, 1, tzinfo=timezone.utc)
+    alerts.find.return_value.sort.return_value.limit.return_value = FakeCursor([{
+        "_id": ObjectId(), "rule_id": ObjectId(), "owner": "ana", "product_id": "s2-1", "product_name": "A GPU",
+        "store_name": "Store 2", "price": 940, "target_price": 1000, "previous_alert_price": None, "created_at": created_at,
+    }])
+    app.dependency_overrides.update({
+        get_product_collection: lambda: products,
+        get_watchlist_rule_collection: lambda: rules,
+        get_price_alert_collection: lambda: alerts,
+    })
+    try:
+        client = TestClient(app)
+        by_name = client.post("/watchlists/", json={"owner": "ana", "product_name": "Placa de Video GPU A", "target_price": 1000})
+        missing = client.post("/watchlists/", json={"owner": "ana", "product_id": "nope", "target_price": 1000})
+        neither = client.post("/watchlists/", json={"owner": "ana", "target_price": 1000})
+        listed = client.get("/watchlists/alerts", params={"owner": "ana"})
+    finally:
+        for dependency in (get_product_collection, get_watchlist_rule_collection, get_price_alert_collection):
+            app.dependency_overrides.pop(dependency)
+
+    assert by_name.status_code == 201
+    assert by_name.json()["canonical_key"] == "a gpu"
+    assert rules.insert_one.await_args.args[0]["canonical_key"] == "a gpu"
+    assert missing.status_code == 404
+    assert neither.status_code == 400
+    assert listed.json()[0]["price"] == 940
+    assert alerts.find.call_args.args[0] == {"owner": "ana"}
@@ -2,6 +2,7 @@
 
 import type React from "react"
 import { useState, useEffect } from "react"
+import { api } from "@/lib/api"
 
 export interface SearchFilters {
   query: string
@@ -37,6 +38,30 @@ export function SearchBar({ placeholder = "Buscar hardware...", onSearch }: Sear
   const [sortBy, setSortBy] = useState("")
   const [showFilters, setShowFilters] = useState(false)
   const [debouncedFilters, setDebouncedFilters] = useState<SearchFilters>({ query: "" })
+  const [suggestions, setSuggestions] = useState<string[]>([])
+
+  // Typeahead: answered from the backend in-memory index, so a short debounce is enough
+  useEffect(() => {
+    if (query.trim().length < 2) {
+      setSuggestions([])
+      return
+    }
+    let cancelled = false
+    const timer = setTimeout(() => {
+      api.suggestProducts(query)
+        .then((response) => {
+          if (!cancelled) setSuggestions(response.suggestions.map((s) => s.product_name))
+        })
+        .catch(() => {
+          if (!cancelled) setSuggestions([])
+        })
+    }, 100)
+
+    return () => {
+      cancelled = true
+      clearTimeout(timer)
+    }
+  }, [query])
 
   // Debounce all filters together
   useEffect(() => {
@@ -96,8 +121,14 @@ export function SearchBar({ placeholder = "Buscar hardware...", onSearch }: Sear
             value={query}
             onChange={(e) => setQuery(e.target.value)}
             placeholder={placeholder}
+            list="search-suggestions"
             className="w-full px-4 py-3 pl-12 bg-card border border-border rounded-lg focus:outline-none focus:ring-2 focus:ring-primary focus:border-transparent transition-all"
           />
+          <datalist id="search-suggestions">
+            {suggestions.map((name) => (
+              <option key={name} value={name} />
+            ))}
+          </datalist>
           <svg
             className="absolute left-4 top-1/2 -translate-y-1/2 w-5 h-5 text-muted-foreground"
             fill="none"
@@ -40,6 +40,18 @@ export interface ProductComparison {
     comparison: ProductComparisonItem[];
 }
 
+export interface ProductBatchItem {
+    product_id: string;
+    product_name: string;
+    comparison: ProductComparisonItem[];
+    history?: PriceHistoryItem[] | null;
+}
+
+export interface ProductBatchResponse {
+    items: ProductBatchItem[];
+    not_found: string[];
+}
+
 export interface BestPriceProduct {
     product_name: string;
     min_price: number;
@@ -56,12 +68,70 @@ export interface ProductSearchResponse {
     current_page: number;
     limit: number;
     data: Product[];
+    next_cursor?: string | null;
+    // count_mode "capped": total_results is a lower bound (show "1000+")
+    has_more?: boolean;
+}
+
+export interface FacetCount {
+    value: string;
+    count: number;
+}
+
+export interface PriceBucket {
+    min_price: number;
+    max_price: number;
+    count: number;
+}
+
+export interface ProductFacets {
+    total_results: number;
+    stores: FacetCount[];
+    categories: FacetCount[];
+    price_ranges: PriceBucket[];
+}
+
+export interface Suggestion {
+    product_name: string;
+    listings: number;
+}
+
+export interface SuggestResponse {
+    query: string;
+    suggestions: Suggestion[];
 }
 
 export interface ProductCount {
     total_products: number;
 }
 
+export interface WatchlistRule {
+    id: string;
+    owner: string;
+    product_id?: string | null;
+    product_name?: string | null;
+    canonical_key?: string | null;
+    store_name?: string | null;
+    target_price: number;
+    last_alert_price?: number | null;
+    last_alert_at?: string | null;
+    created_at: string;
+}
+
+export interface PriceAlert {
+    id: string;
+    rule_id: string;
+    owner: string;
+    product_id?: string | null;
+    product_name?: string | null;
+    store_name?: string | null;
+    product_url?: string | null;
+    price: number;
+    target_price: number;
+    previous_alert_price?: number | null;
+    created_at: string;
+}
+
 // --- API Client ---
 
 async function fetchJson<T>(endpoint: string, options?: RequestInit): Promise<T> {
@@ -90,6 +160,10 @@ export const api = {
         sort_by?: string;
         page?: number;
         limit?: number;
+        cursor?: string;
+        // e.g. "card" or "card,product_url": only those fields are returned
+        fields?: string;
+        count_mode?: "exact" | "capped";
     }) => {
         const searchParams = new URLSearchParams();
         if (params.q) searchParams.append("q", params.q);
@@ -99,6 +173,9 @@ export const api = {
         if (params.sort_by) searchParams.append("sort_by", params.sort_by);
         if (params.page) searchParams.append("page", params.page.toString());
         if (params.limit) searchParams.append("limit", params.limit.toString());
+        if (params.cursor) searchParams.append("cursor", params.cursor);
+        if (params.fields) searchParams.append("fields", params.fields);
+        if (params.count_mode) searchParams.append("count_mode", params.count_mode);
 
         return fetchJson<ProductSearchResponse>(`/products/search?${searchParams.toString()}`);
     },
@@ -108,4 +185,50 @@ export const api = {
 
     getProductComparison: (productId: string) =>
         fetchJson<ProductComparison>(`/products/${productId}/compare`),
+
+    // Comparison (and optionally history) for up to 50 products in one request
+    getProductsBatch: (productIds: string[], includeHistory = false) =>
+        fetchJson<ProductBatchResponse>("/products/batch", {
+            method: "POST",
+            headers: { "Content-Type": "application/json" },
+            body: JSON.stringify({ product_ids: productIds, include_history: includeHistory }),
+        }),
+
+    getSearchFacets: (params: { q?: string; min_price?: number; max_price?: number; store?: string }) => {
+        const searchParams = new URLSearchParams();
+        if (params.q) searchParams.append("q", params.q);
+        if (params.min_price) searchParams.append("min_price", params.min_price.toString());
+        if (params.max_price) searchParams.append("max_price", params.max_price.toString());
+        if (params.store) searchParams.append("store", params.store);
+
+        return fetchJson<ProductFacets>(`/products/facets?${searchParams.toString()}`);
+    },
+
+    suggestProducts: (q: string, limit = 8) =>
+        fetchJson<SuggestResponse>(`/products/suggest?q=${encodeURIComponent(q)}&limit=${limit}`),
+
+    // Either productId (one store's listing) or productName (the product at any store)
+    createWatchlistRule: (rule: { owner: string; target_price: number; product_id?: string; product_name?: string; store_name?: string }) =>
+        fetchJson<WatchlistRule>("/watchlists/", {
+            method: "POST",
+            headers: { "Content-Type": "application/json" },
+            body: JSON.stringify(rule),
+        }),
+
+    getWatchlistRules: (owner: string) =>
+        fetchJson<WatchlistRule[]>(`/watchlists/?owner=${encodeURIComponent(owner)}`),
+
+    deleteWatchlistRule: async (owner: string, ruleId: string) => {
+        const res = await fetch(`${API_BASE_URL}/watchlists/${ruleId}?owner=${encodeURIComponent(owner)}`, { method: "DELETE" });
+        if (!res.ok) {
+            throw new Error(`API Error: ${res.status} ${res.statusText}`);
+        }
+    },
+
+    // `since`: ISO date of the newest alert already seen
+    getPriceAlerts: (owner: string, since?: string) => {
+        const searchParams = new URLSearchParams({ owner });
+        if (since) searchParams.append("since", since);
+        return fetchJson<PriceAlert[]>(`/watchlists/alerts?${searchParams.toString()}`);
+    },
 };